@@ -0,0 +1,499 @@
+"""
+Accuracy rollups over the answer log, for ``/api/stats``.
+
+Every event from :mod:`event_log` is added once, in O(1), to running
+totals per country, region group, difficulty and code. It is added both
+for everyone (``"*"``) and for its learner. Time-windowed views come from
+:class:`BucketRing`: a fixed number of buckets per window, each holding
+the counts for its own slice of time, plus running sums over the live
+buckets. A bucket is subtracted from the sums and reused when its slice
+falls out of the window, so a read never merges buckets or goes back
+through the history. The shaped ``view`` is cached until the rollup or
+the window changes.
+
+The rollups are fed from the log files rather than from the request.
+That way every ``serve.py`` worker and every restart sees the same
+numbers. A background thread reads the bytes appended since its last
+pass every ``RECHECK_SECONDS``, and does the first catch-up when it is
+started (``start``), so a new answer shows up after about a second and a
+request never waits for a replay. Threads do not survive ``fork``, and a
+lock held by the tailer at that moment would stay locked in the child, so
+each process starts its own tailer and a forked child starts from empty
+rollups.
+
+At most ``MAX_LEARNER_ROLLUPS`` learners are kept, least recently used
+first out. A learner that was dropped is rebuilt from the log segments
+the next time it is asked for, reading only lines with its id. That scan
+runs without the lock, so the tailer and other views carry on meanwhile.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from event_log import EVENT_LOG_DIR, segments
+
+# navn -> (sekunder per bøtte, antall bøtter)
+WINDOWS: Dict[str, Tuple[int, int]] = {
+    "1h": (60, 60),
+    "24h": (900, 96),
+    "7d": (3600, 168),
+    "30d": (86400, 30),
+}
+RECHECK_SECONDS = 1.0
+READ_CHUNK = 1 << 18
+MAX_LEARNER_ROLLUPS = 1000
+MAX_CACHED_VIEWS = 256
+HARDEST_MIN_ASKED = 3
+DEFAULT_HARDEST = 10
+ALL_LEARNERS = "*"
+
+Key = tuple
+
+log = logging.getLogger(__name__)
+
+
+class Tally:
+    __slots__ = ("asked", "correct", "streak", "best_streak")
+
+    def __init__(self):
+        self.asked = 0
+        self.correct = 0
+        self.streak = 0
+        self.best_streak = 0
+
+    def add(self, correct: bool) -> None:
+        self.asked += 1
+        if correct:
+            self.correct += 1
+            self.streak += 1
+            if self.streak > self.best_streak:
+                self.best_streak = self.streak
+        else:
+            self.streak = 0
+
+
+class BucketRing:
+    """
+    ``count`` buckets of ``width`` seconds, each ``{key: [asked, correct]}``,
+    and ``sums`` over the buckets still inside the window.
+    """
+
+    def __init__(self, width: int, count: int):
+        self.width = width
+        self.count = count
+        self.span = width * count
+        self.sums: Dict[Key, List[int]] = {}
+        self._newest = -1
+        self._epochs = [-1] * count
+        self._buckets: List[Optional[Dict[Key, List[int]]]] = [None] * count
+
+    def add(self, ts: float, keys: Iterable[Key], correct: bool) -> None:
+        epoch = int(ts // self.width)
+        slot = epoch % self.count
+        if self._epochs[slot] != epoch:
+            if self._epochs[slot] > epoch:
+                return  # eldre enn vinduet
+            self._drop(slot)
+            self._epochs[slot] = epoch
+            self._buckets[slot] = {}
+        bucket = self._buckets[slot]
+        sums = self.sums
+        for key in keys:
+            counts = bucket.get(key)
+            if counts is None:
+                counts = bucket[key] = [0, 0]
+            counts[0] += 1
+            counts[1] += correct
+            total = sums.get(key)
+            if total is None:
+                total = sums[key] = [0, 0]
+            total[0] += 1
+            total[1] += correct
+
+    def advance(self, now: float) -> int:
+        """Drop buckets that have left the window at ``now``; returns the newest epoch."""
+        newest = int(now // self.width)
+        if newest != self._newest:
+            self._newest = newest
+            for slot, epoch in enumerate(self._epochs):
+                if epoch != -1 and epoch <= newest - self.count:
+                    self._drop(slot)
+        return newest
+
+    def totals(self, now: float) -> Dict[Key, List[int]]:
+        self.advance(now)
+        return self.sums
+
+    def _drop(self, slot: int) -> None:
+        bucket = self._buckets[slot]
+        self._epochs[slot] = -1
+        self._buckets[slot] = None
+        if not bucket:
+            return
+        sums = self.sums
+        for key, (asked, correct) in bucket.items():
+            total = sums[key]
+            total[0] -= asked
+            total[1] -= correct
+            if not total[0]:
+                del sums[key]
+
+
+class Rollup:
+    """Totals and windowed buckets for one learner (or everyone)."""
+
+    def __init__(self):
+        self.totals: Dict[Key, Tally] = {}
+        self.rings = {name: BucketRing(*shape) for name, shape in WINDOWS.items()}
+        self.version = 0  # økes for hver hendelse, så hurtigbufrede visninger kan sjekkes
+
+    def add(self, ts: float, keys: List[Key], correct: bool, now: float) -> None:
+        self.version += 1
+        for key in keys:
+            tally = self.totals.get(key)
+            if tally is None:
+                tally = self.totals[key] = Tally()
+            tally.add(correct)
+        age = now - ts
+        for ring in self.rings.values():
+            # gamle hendelser ved oppstart havner bare i totalene
+            if age < ring.span:
+                ring.add(ts, keys, correct)
+
+
+def event_keys(event: dict) -> List[Key]:
+    country = event.get("country") or "?"
+    keys: List[Key] = [("global",), ("country", country)]
+    if event.get("region_group"):
+        keys.append(("region_group", country, event["region_group"]))
+    if event.get("difficulty"):
+        keys.append(("difficulty", country, event["difficulty"]))
+    if event.get("code"):
+        keys.append(("code", country, str(event["code"])))
+    return keys
+
+
+class _Rebuild:
+    """A learner being read back from the log, and the events that came in meanwhile."""
+
+    __slots__ = ("offsets", "pending", "done", "rollup")
+
+    def __init__(self, offsets: Dict[str, int]):
+        self.offsets = offsets
+        self.pending: List[Tuple[float, List[Key], bool, float]] = []
+        self.done = threading.Event()
+        self.rollup: Optional[Rollup] = None
+
+
+class AnswerStats:
+    def __init__(self, directory: Path = EVENT_LOG_DIR, recheck: float = RECHECK_SECONDS):
+        self.directory = directory
+        self.recheck = recheck
+        self._everyone = Rollup()
+        self._learners: "OrderedDict[str, Rollup]" = OrderedDict()
+        self._dropped: set = set()  # læringsid-er som må bygges fra loggen igjen
+        self._rebuilding: Dict[str, _Rebuild] = {}
+        self._views: Dict[tuple, Tuple[tuple, dict]] = {}
+        self._offsets: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # én lesing av loggen om gangen
+        self._tailer_pid: Optional[int] = None
+        _instances.add(self)
+
+    def start(self) -> None:
+        """Start the background tailer; its first pass catches up on the log."""
+        if self._tailer_pid == os.getpid() or self.recheck <= 0:
+            return
+        with self._lock:
+            if self._tailer_pid == os.getpid():
+                return
+            self._tailer_pid = os.getpid()
+        threading.Thread(target=self._tail_forever, name="answer-stats", daemon=True).start()
+
+    def _after_fork(self) -> None:
+        # tailertråden fra forelderen finnes ikke her; det den var midt i
+        # (og låsen den kanskje holdt) kastes, og neste start() leser på nytt
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        if self._tailer_pid is not None:
+            self._everyone = Rollup()
+            self._learners = OrderedDict()
+            self._dropped = set()
+            self._rebuilding = {}
+            self._views = {}
+            self._offsets = {}
+            self._tailer_pid = None
+
+    def add(self, event: dict, now: float | None = None) -> None:
+        keys = event_keys(event)
+        ts = float(event.get("ts") or 0)
+        correct = bool(event.get("correct"))
+        now = time.time() if now is None else now
+        self._everyone.add(ts, keys, correct, now)
+        learner = event.get("learner")
+        if not learner:
+            return
+        if learner in self._dropped:
+            rebuild = self._rebuilding.get(learner)
+            if rebuild is not None:
+                rebuild.pending.append((ts, keys, correct, now))
+            return
+        rollup = self._learners.get(learner)
+        if rollup is None:
+            rollup = self._learners[learner] = Rollup()
+            if len(self._learners) > MAX_LEARNER_ROLLUPS:
+                dropped, _ = self._learners.popitem(last=False)
+                self._dropped.add(dropped)
+        else:
+            self._learners.move_to_end(learner)
+        rollup.add(ts, keys, correct, now)
+
+    def refresh(self) -> int:
+        """Add events appended to the log since the last call. Returns the count."""
+        with self._refresh_lock:
+            added = 0
+            for path in segments(self.directory):
+                added += self._read_new(path)
+            return added
+
+    def _tail_forever(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("Kunne ikke lese svarloggen")
+            time.sleep(self.recheck)
+
+    def _read_new(self, path: Path) -> int:
+        """
+        Read ``path`` from its offset in chunks of ``READ_CHUNK`` bytes. Lines
+        are parsed without the lock; only adding a chunk and moving the
+        offset holds it, so a view waits for one chunk, not a whole catch-up.
+        """
+        offset = self._offsets.get(path.name, 0)
+        try:
+            if os.stat(path).st_size <= offset:
+                return 0
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        added = 0
+        with f:
+            f.seek(offset)
+            while True:
+                # bare hele linjer; en halvskrevet siste linje leses neste gang
+                data = f.read(READ_CHUNK) + f.readline()
+                end = data.rfind(b"\n") + 1
+                if not end:
+                    return added
+                events = []
+                for line in data[:end].splitlines():
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        continue
+                now = time.time()
+                with self._lock:
+                    for event in events:
+                        self.add(event, now)
+                    offset += end
+                    self._offsets[path.name] = offset
+                added += len(events)
+                if end < len(data):
+                    return added
+
+    def _rollup(self, learner: Optional[str]) -> Optional[Rollup]:
+        if not learner:
+            return self._everyone
+        rollup = self._learners.get(learner)
+        if rollup is not None:
+            self._learners.move_to_end(learner)
+        return rollup
+
+    def _rebuild(self, learner: str) -> Optional[Rollup]:
+        """
+        Read a dropped learner's events back from the segments without
+        holding the lock, up to the offsets the tailer had reached. Events
+        the tailer reads meanwhile are queued and added when the result is
+        put in place. One scan per learner at a time; others wait for it.
+        """
+        with self._lock:
+            if learner not in self._dropped:
+                return None
+            rebuild = self._rebuilding.get(learner)
+            owner = rebuild is None
+            if owner:
+                rebuild = self._rebuilding[learner] = _Rebuild(dict(self._offsets))
+        if not owner:
+            rebuild.done.wait()
+            return rebuild.rollup
+        try:
+            rollup = self._scan(learner, rebuild.offsets)
+            with self._lock:
+                for ts, keys, correct, now in rebuild.pending:
+                    rollup.add(ts, keys, correct, now)
+                self._dropped.discard(learner)
+                self._learners[learner] = rollup
+                if len(self._learners) > MAX_LEARNER_ROLLUPS:
+                    dropped, _ = self._learners.popitem(last=False)
+                    self._dropped.add(dropped)
+                rebuild.rollup = rollup
+            return rollup
+        finally:
+            with self._lock:
+                self._rebuilding.pop(learner, None)
+            rebuild.done.set()
+
+    def _scan(self, learner: str, offsets: Dict[str, int]) -> Rollup:
+        # grovsortering på id-en slik event_log skriver den; feltet sjekkes etterpå
+        needle = json.dumps(learner, ensure_ascii=False).encode("utf-8")
+        rollup = Rollup()
+        now = time.time()
+        for path in segments(self.directory):
+            offset = offsets.get(path.name, 0)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read(offset)
+            except FileNotFoundError:
+                continue
+            if needle not in data:
+                continue
+            for line in data.splitlines():
+                if needle not in line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("learner") != learner:
+                    continue
+                ts = float(event.get("ts") or 0)
+                rollup.add(ts, event_keys(event), bool(event.get("correct")), now)
+        return rollup
+
+    def view(
+        self,
+        learner: Optional[str] = None,
+        window: Optional[str] = None,
+        country: Optional[str] = None,
+        hardest: int = DEFAULT_HARDEST,
+        now: float | None = None,
+    ) -> dict:
+        """
+        Accuracy for everyone or one learner, all time or within ``window``
+        (a key of ``WINDOWS``). With ``country`` the result is limited to
+        that dataset and lists every code.
+        """
+        self.start()
+        now = time.time() if now is None else now
+        # en læringsid som er skjøvet ut, leses inn igjen før låsen tas
+        rebuilt = self._rebuild(learner) if learner and learner in self._dropped else None
+        with self._lock:
+            rollup = self._rollup(learner)
+            if rollup is None:
+                rollup = rebuilt
+            if rollup is None:
+                return _shape({}, learner, window, country, hardest)
+            ring = rollup.rings[window] if window is not None else None
+            stamp = (id(rollup), rollup.version, ring.advance(now) if ring else None)
+            cache_key = (learner, window, country, hardest)
+            cached = self._views.get(cache_key)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            if ring is None:
+                counts: Dict[Key, tuple] = {
+                    key: (t.asked, t.correct, t.best_streak)
+                    for key, t in rollup.totals.items()
+                }
+            else:
+                counts = {
+                    key: (asked, correct, None)
+                    for key, (asked, correct) in ring.sums.items()
+                }
+            result = _shape(counts, learner, window, country, hardest)
+            if len(self._views) >= MAX_CACHED_VIEWS:
+                self._views.clear()
+            self._views[cache_key] = (stamp, result)
+            return result
+
+
+_instances: "weakref.WeakSet[AnswerStats]" = weakref.WeakSet()
+
+
+def _after_fork_in_child() -> None:
+    for stats in list(_instances):
+        stats._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _summary(counts: tuple) -> dict:
+    asked, correct, best_streak = counts
+    summary = {
+        "asked": asked,
+        "correct": correct,
+        "accuracy": round(correct / asked, 4) if asked else None,
+    }
+    if best_streak is not None:
+        summary["best_streak"] = best_streak
+    return summary
+
+
+def _shape(
+    counts: Dict[Key, tuple],
+    learner: Optional[str],
+    window: Optional[str],
+    only_country: Optional[str],
+    hardest: int,
+) -> dict:
+    countries: Dict[str, dict] = {}
+    codes: List[Tuple[str, str, tuple]] = []
+    for key, value in counts.items():
+        kind = key[0]
+        if kind == "global" or (only_country and key[1] != only_country):
+            continue
+        country = countries.setdefault(
+            key[1], {"country": key[1], "region_groups": {}, "difficulties": {}}
+        )
+        if kind == "country":
+            country.update(_summary(value))
+        elif kind == "region_group":
+            country["region_groups"][key[2]] = _summary(value)
+        elif kind == "difficulty":
+            country["difficulties"][key[2]] = _summary(value)
+        elif kind == "code":
+            codes.append((key[1], key[2], value))
+            if only_country:
+                country.setdefault("codes", {})[key[2]] = _summary(value)
+
+    # Laplace-glattet treffsikkerhet, så 0/1 ikke slår 2/10
+    candidates = (c for c in codes if c[2][0] >= HARDEST_MIN_ASKED)
+    worst = heapq.nsmallest(
+        max(0, hardest),
+        candidates,
+        key=lambda c: ((c[2][1] + 1) / (c[2][0] + 2), -c[2][0], c[0], c[1]),
+    )
+    return {
+        "learner": learner,
+        "window": window,
+        "global": _summary(counts.get(("global",), (0, 0, None if window else 0))),
+        "countries": sorted(
+            countries.values(), key=lambda c: (-c.get("asked", 0), c["country"])
+        ),
+        "hardest": [
+            {"country": country, "code": code, **_summary(value)}
+            for country, code, value in worst
+        ],
+    }
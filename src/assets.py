@@ -0,0 +1,284 @@
+"""
+Content-hashed, precompressed copies of ``static/`` for long-lived caching.
+
+``build`` copies every file under ``static/`` to ``build/static/`` with the
+first hex digits of its SHA-256 in the filename (``quiz.js`` becomes
+``quiz.3f9a0c1d2e.js``), writes ``.gz`` and, when the ``brotli`` package is
+installed, ``.br`` variants of text assets, and records everything in
+``manifest.json``. References to ``/static/...`` inside HTML, CSS and the
+web manifest are rewritten to the hashed names, so a page always loads the
+exact asset versions it was built with. HTML pages keep their names since
+their URLs are fixed.
+
+Files that are already hashed are not written again, and files from the
+previous build are kept for one more build so pages cached by clients
+still resolve.
+
+    python src/assets.py build
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from loader import file_signature
+
+try:  # valgfri avhengighet: pip install brotli
+    import brotli
+except ImportError:  # pragma: no cover - avhenger av miljøet
+    brotli = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+STATIC_DIR = PROJECT_ROOT / "static"
+ASSET_BUILD_DIR = PROJECT_ROOT / "build" / "static"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+HASH_LENGTH = 10
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+COMPRESSIBLE = {".css", ".html", ".js", ".json", ".svg", ".txt", ".webmanifest"}
+# Disse leses og skrives om slik at /static/-referanser peker på hashede navn.
+REWRITTEN = {".css", ".html", ".webmanifest"}
+# Sider har faste adresser og beholder navnet sitt.
+UNHASHED = {".html"}
+# Komprimerte varianter som ikke sparer minst så mye, droppes.
+MIN_SAVING = 0.05
+
+# Rekkefølgen serveren foretrekker når klienten godtar flere.
+ENCODING_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+_STATIC_REF = re.compile(r"/static/([A-Za-z0-9_./-]+)")
+
+
+class Asset(NamedTuple):
+    """One file served from the build directory."""
+
+    logical: str
+    stored: str
+    sha256: str
+    immutable: bool
+    encodings: Tuple[str, ...]
+
+
+def hashed_name(relative: str, digest: str) -> str:
+    path = Path(relative)
+    return str(path.with_name(f"{path.stem}.{digest[:HASH_LENGTH]}{path.suffix}"))
+
+
+def _rewrite_refs(text: str, files: Dict[str, dict]) -> str:
+    def replace(match):
+        record = files.get(match.group(1))
+        if record is None or record["hashed"] is None:
+            return match.group(0)
+        return f"/static/{record['hashed']}"
+
+    return _STATIC_REF.sub(replace, text)
+
+
+def _compressed_variants(data: bytes) -> Dict[str, bytes]:
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    limit = len(data) * (1 - MIN_SAVING)
+    return {name: body for name, body in variants.items() if len(body) <= limit}
+
+
+def _write_if_changed(path: Path, data: bytes, hashed: bool) -> bool:
+    # Et hashet navn betyr samme innhold, så da holder det at filen finnes.
+    if path.exists() and (hashed or path.read_bytes() == data):
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+    return True
+
+
+def _build_order(path: Path) -> int:
+    # Filer som refererer til andre må bygges etter dem: vanlige filer,
+    # så CSS og web-manifestet, og sidene til slutt.
+    if path.suffix in UNHASHED:
+        return 2
+    return 1 if path.suffix in REWRITTEN else 0
+
+
+def build_assets(source: Path = STATIC_DIR, target: Path = ASSET_BUILD_DIR) -> dict:
+    """Write hashed and compressed copies of ``source`` and return the manifest."""
+    previous = _read_manifest(target / MANIFEST_NAME) or {"files": {}}
+    files: Dict[str, dict] = {}
+    written = 0
+
+    paths = sorted(
+        (path for path in source.rglob("*") if path.is_file()),
+        key=lambda path: (_build_order(path), path.as_posix()),
+    )
+    for path in paths:
+        relative = path.relative_to(source).as_posix()
+        data = path.read_bytes()
+        if path.suffix in REWRITTEN:
+            data = _rewrite_refs(data.decode("utf-8"), files).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        hashed = None if path.suffix in UNHASHED else hashed_name(relative, digest)
+        stored = hashed or relative
+
+        written += _write_if_changed(target / stored, data, hashed is not None)
+        encodings = []
+        if path.suffix in COMPRESSIBLE:
+            variants = _compressed_variants(data)
+            for encoding, suffix in ENCODING_SUFFIXES:
+                if encoding in variants:
+                    written += _write_if_changed(
+                        target / (stored + suffix), variants[encoding], hashed is not None
+                    )
+                    encodings.append(encoding)
+
+        files[relative] = {
+            "hashed": hashed,
+            "sha256": digest,
+            "size": len(data),
+            "encodings": encodings,
+        }
+
+    manifest = {"version": MANIFEST_VERSION, "files": files}
+    removed = _prune(target, manifest, previous)
+    _write_manifest(target / MANIFEST_NAME, manifest)
+    print(
+        f"  {len(files)} filer, {written} skrevet, {removed} fjernet -> {target}"
+    )
+    if brotli is None:
+        print("  .br-filer er hoppet over fordi brotli ikke er installert (pip install brotli)")
+    return manifest
+
+
+def _stored_files(manifest: dict) -> set:
+    names = set()
+    for logical, record in manifest["files"].items():
+        stored = record["hashed"] or logical
+        names.add(stored)
+        for encoding, suffix in ENCODING_SUFFIXES:
+            if encoding in record["encodings"]:
+                names.add(stored + suffix)
+    return names
+
+
+def _prune(target: Path, manifest: dict, previous: dict) -> int:
+    keep = _stored_files(manifest) | _stored_files(previous) | {MANIFEST_NAME}
+    removed = 0
+    for path in list(target.rglob("*")):
+        if path.is_file() and path.relative_to(target).as_posix() not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def _read_manifest(path: Path) -> Optional[dict]:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _write_manifest(path: Path, manifest: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+class AssetManifest:
+    """
+    Lookup from request paths to built assets for the web server.
+
+    Both logical names (``quiz.js``) and hashed names (``quiz.<hash>.js``)
+    resolve; only hashed names are marked immutable. The manifest file is
+    re-read when it changes on disk, so a new build is picked up without a
+    restart.
+    """
+
+    def __init__(self, root: Path = ASSET_BUILD_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._signature = None
+        self._state: Tuple[Dict[str, Asset], Dict[str, str]] = ({}, {})
+
+    def lookup(self, path: str) -> Optional[Asset]:
+        return self._current()[0].get(path)
+
+    def source_is_newer(self, logical: str, source: Path = STATIC_DIR) -> bool:
+        """True when ``source/logical`` changed after the last ``build``."""
+        self._current()
+        if self._signature is None:
+            return False
+        try:
+            return (source / logical).stat().st_mtime_ns > self._signature[1]
+        except OSError:
+            return False
+
+    def url(self, logical: str) -> str:
+        """``/static/`` URL for ``logical``, hashed when it has been built."""
+        return self._current()[1].get(logical, f"/static/{logical}")
+
+    def _current(self) -> Tuple[Dict[str, Asset], Dict[str, str]]:
+        manifest_path = self.root / MANIFEST_NAME
+        try:
+            signature = file_signature(manifest_path)
+        except FileNotFoundError:
+            signature = None
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._load(manifest_path)
+                    self._signature = signature
+        return self._state
+
+    def _load(self, manifest_path: Path) -> None:
+        manifest = _read_manifest(manifest_path) or {"files": {}}
+        assets: Dict[str, Asset] = {}
+        urls: Dict[str, str] = {}
+        for logical, record in manifest["files"].items():
+            stored = record["hashed"] or logical
+            encodings = tuple(record["encodings"])
+            assets[logical] = Asset(logical, stored, record["sha256"], False, encodings)
+            if record["hashed"]:
+                assets[stored] = Asset(logical, stored, record["sha256"], True, encodings)
+                urls[logical] = f"/static/{stored}"
+        self._state = (assets, urls)
+
+
+def stored_path(root: Path, asset: Asset, encoding: Optional[str]) -> Path:
+    suffix = dict(ENCODING_SUFFIXES).get(encoding, "") if encoding else ""
+    return root / (asset.stored + suffix)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Bygg hashede og komprimerte kopier av static/."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="skriv build/static/ og manifest.json")
+    build.add_argument("--clean", action="store_true", help="slett build/static/ først")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if args.clean and ASSET_BUILD_DIR.exists():
+            shutil.rmtree(ASSET_BUILD_DIR)
+        print("--- Bygger statiske filer ---")
+        build_assets()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
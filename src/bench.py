@@ -0,0 +1,403 @@
+"""
+Microbenchmarks for the lookup, matching and catalog hot paths.
+
+``run`` measures ``expand_search_keys``, ``search.lookup_code``,
+``webapp._resolve_entry``, ``quiz.matches_any``, the bundle build
+(what ``get_country_bundle`` does on a cold miss) and
+``available_countries``. It runs them on the real ``Telefonnummer/``
+files and on synthetic datasets of the requested sizes, then writes the
+results to ``build/bench/<time>.json``. ``compare`` compares two such
+files and exits with status 1 when a case has become slower than
+``--threshold``. ``memory`` loads every dataset at once, as plain dicts,
+as compact entries and from snapshots, and prints bytes per entry for
+each.
+
+    python src/bench.py run [--sizes 10000,100000] [--only lookup_code] [--quick]
+    python src/bench.py compare build/bench/FØR.json build/bench/ETTER.json
+    python src/bench.py memory
+
+1M entries (``--sizes 1000000``) needs about 5 GB of memory and a few
+minutes for the build.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+import loader
+from bundle import compile_bundle
+from code_utils import expand_search_keys
+from compact import deep_size
+from loader import available_countries, country_data_path
+from quiz import matches_any
+from search import lookup_code
+from snapshot import read_snapshot, synthetic_source, write_snapshot
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = PROJECT_ROOT / "build" / "bench"
+RESULT_VERSION = 1
+DEFAULT_SIZES = (10_000, 100_000)
+DEFAULT_THRESHOLD = 0.10
+QUERY_COUNT = 2_000
+SEED = 1234
+# ett mål skal ta minst så lenge, så klokkeoppløsningen ikke betyr noe
+MIN_SAMPLE_SECONDS = 0.02
+
+
+class Case(NamedTuple):
+    name: str
+    dataset: str
+    size: int
+    func: Callable[[], object]
+    ops: int  # operasjoner per kall av func
+
+
+def measure(case: Case, repeat: int) -> dict:
+    """Time ``case.func`` (``case.ops`` operations per call), best and median per op."""
+    case.func()  # oppvarming
+    loops = 1
+    started = time.perf_counter()
+    case.func()
+    once = time.perf_counter() - started
+    if once < MIN_SAMPLE_SECONDS:
+        loops = max(1, int(MIN_SAMPLE_SECONDS / max(once, 1e-9)))
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            case.func()
+        samples.append((time.perf_counter() - started) / (loops * case.ops))
+    return _result(case, samples, case.ops * loops)
+
+
+def measure_build(case: Case, repeat: int) -> dict:
+    # store bygg måles uten oppvarming og løkker; hver måling er ett bygg
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case.func()
+        samples.append(time.perf_counter() - started)
+    return _result(case, samples, 1)
+
+
+def _result(case: Case, samples: List[float], ops: int) -> dict:
+    return {
+        "name": case.name,
+        "dataset": case.dataset,
+        "size": case.size,
+        "ops": ops,
+        "repeat": len(samples),
+        "best_ns": round(min(samples) * 1e9, 1),
+        "median_ns": round(statistics.median(samples) * 1e9, 1),
+    }
+
+
+def _queries(entries: List[dict], rng: random.Random) -> List[str]:
+    """Half exact codes, a quarter full numbers and numbers inside ranges, a quarter misses."""
+    codes = [code for entry in entries for code in entry["_codes"]]
+    queries = []
+    for index in range(QUERY_COUNT):
+        code = rng.choice(codes)
+        kind = index % 4
+        if kind == 3:
+            queries.append("9" * (len(code) + 6))
+        elif kind == 2:
+            digits = "".join(ch for ch in code.split("-")[0] if ch.isdigit())
+            queries.append(digits + "".join(rng.choice("0123456789") for _ in range(5)))
+        else:
+            queries.append(code)
+    return queries
+
+
+def _guesses(entries: List[dict], rng: random.Random) -> List[tuple]:
+    picked = [rng.choice(entries) for _ in range(QUERY_COUNT)]
+    pairs = []
+    for index, entry in enumerate(picked):
+        regions = entry.get("regions") or []
+        if index % 2 and regions:
+            guess = str(regions[0]).split()[-1]
+        else:
+            guess = "feilsvar"
+        pairs.append((guess, regions))
+    return pairs
+
+
+def dataset_cases(dataset: str, source: bytes, size: int, build_repeat: int) -> tuple:
+    """Build the bundle once (timed) and return the cases that use it."""
+    from webapp import _resolve_entry  # webapp drar inn Flask; bare når det trengs
+
+    build = Case(
+        "bundle_build",
+        dataset,
+        size,
+        lambda: compile_bundle(json.loads(source), dataset),
+        1,
+    )
+    build_result = measure_build(build, build_repeat)
+    bundle = compile_bundle(json.loads(source), dataset)
+    entries = bundle["entries"]
+    rng = random.Random(SEED)
+    queries = _queries(entries, rng)
+    guesses = _guesses(entries, rng)
+    code_lists = [entry["_codes"] for entry in entries[:QUERY_COUNT]]
+
+    def expand():
+        for codes in code_lists:
+            expand_search_keys(codes)
+
+    def lookups():
+        for query in queries:
+            lookup_code(query, bundle)
+
+    def resolves():
+        for query in queries:
+            _resolve_entry(bundle, query)
+
+    def matches():
+        for guess, regions in guesses:
+            matches_any(guess, regions)
+
+    cases = [
+        Case("expand_search_keys", dataset, size, expand, len(code_lists)),
+        Case("lookup_code", dataset, size, lookups, len(queries)),
+        Case("_resolve_entry", dataset, size, resolves, len(queries)),
+        Case("matches_any", dataset, size, matches, len(guesses)),
+    ]
+    return build_result, cases
+
+
+def catalog_cases() -> List[Case]:
+    count = len(available_countries())
+
+    def cold():
+        loader._catalog_cache.clear()
+        available_countries()
+
+    return [
+        Case("available_countries", "real", count, available_countries, 1),
+        Case("available_countries_cold", "real", count, cold, 1),
+    ]
+
+
+def run(sizes: Sequence[int], only: Optional[str], repeat: int) -> dict:
+    results: List[dict] = []
+
+    def keep(result: dict) -> None:
+        results.append(result)
+        print(
+            f"  {result['dataset']:<18} {result['name']:<26} "
+            f"{_format_ns(result['median_ns']):>12}  (beste {_format_ns(result['best_ns'])})"
+        )
+
+    def wanted(name: str) -> bool:
+        return only is None or name == only
+
+    print(f"--- Mikrobenchmark (median av {repeat}) ---")
+    datasets = [(info["filename"], info["count"]) for info in available_countries() if info["count"]]
+    for name, count in datasets:
+        source = country_data_path(name).read_bytes()
+        build, cases = dataset_cases(name, source, count, repeat)
+        if wanted(build["name"]):
+            keep(build)
+        for case in cases:
+            if wanted(case.name):
+                keep(measure(case, repeat))
+    for case in catalog_cases():
+        if wanted(case.name):
+            keep(measure(case, repeat))
+
+    for size in sizes:
+        source = synthetic_source(size)
+        build_repeat = 1 if size >= 100_000 else min(repeat, 3)
+        build, cases = dataset_cases(f"synthetic-{size}", source, size, build_repeat)
+        if wanted(build["name"]):
+            keep(build)
+        for case in cases:
+            if wanted(case.name):
+                keep(measure(case, repeat))
+
+    return {
+        "version": RESULT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(base: dict, new: dict, threshold: float) -> int:
+    """Print both runs side by side; returns the number of regressions."""
+    before = {(r["dataset"], r["name"]): r for r in base["results"]}
+    regressions = 0
+    print(f"--- {base.get('commit') or '?'} -> {new.get('commit') or '?'} (terskel {threshold:.0%}) ---")
+    for result in new["results"]:
+        key = (result["dataset"], result["name"])
+        old = before.pop(key, None)
+        label = f"{key[0]:<18} {key[1]:<26}"
+        if old is None:
+            print(f"  {label} {'':>12} -> {_format_ns(result['median_ns']):>12}  ny")
+            continue
+        ratio = result["median_ns"] / old["median_ns"] if old["median_ns"] else 1.0
+        if ratio > 1 + threshold:
+            verdict = "❌ tregere"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            verdict = "✅ raskere"
+        else:
+            verdict = ""
+        print(
+            f"  {label} {_format_ns(old['median_ns']):>12} -> "
+            f"{_format_ns(result['median_ns']):>12}  x{ratio:5.2f} {verdict}"
+        )
+    if before:
+        print(f"  ({len(before)} mål fra {base.get('commit') or 'før'} mangler i den nye målingen)")
+    print(f"\n  {regressions} regresjoner")
+    return regressions
+
+
+def memory_report() -> List[dict]:
+    """
+    Load every dataset with plain dict entries, with compact entries and
+    from snapshots (what the server does), and measure each set as a whole.
+    One ``seen`` set per variant, so a string shared between datasets
+    counts once.
+    """
+    datasets = [info["filename"] for info in available_countries() if info["count"]]
+    sources = {name: country_data_path(name).read_bytes() for name in datasets}
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshots = {name: Path(tmp) / f"{name}.snap" for name in datasets}
+        for name in datasets:
+            write_snapshot(compile_bundle(json.loads(sources[name]), name), sources[name], snapshots[name])
+        variants = (
+            ("dict", lambda name: compile_bundle(json.loads(sources[name]), name, compact=False)),
+            ("kompakt", lambda name: compile_bundle(json.loads(sources[name]), name)),
+            ("snapshot", lambda name: read_snapshot(snapshots[name], sources[name])),
+        )
+        for label, load in variants:
+            tracemalloc.start()
+            bundles = [load(name) for name in datasets]
+            traced, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            seen: set = set()
+            entries = [entry for bundle in bundles for entry in bundle["entries"]]
+            rows.append(
+                {
+                    "variant": label,
+                    "datasets": len(bundles),
+                    "entries": len(entries),
+                    "entry_bytes": sum(deep_size(entry, seen) for entry in entries),
+                    "by_code_bytes": sum(deep_size(bundle["by_code"], seen) for bundle in bundles),
+                    "bundle_bytes": traced,
+                }
+            )
+            del bundles, entries
+    return rows
+
+
+def print_memory(rows: List[dict]) -> None:
+    print(f"--- Minne, alle datasett lastet ({rows[0]['datasets']} stk, {rows[0]['entries']} oppføringer) ---")
+    print(f"  {'':<8} {'byte/oppføring':>15} {'by_code':>12} {'hele bundelen':>15}")
+    for row in rows:
+        print(
+            f"  {row['variant']:<8} {row['entry_bytes'] / row['entries']:>15.0f} "
+            f"{_format_bytes(row['by_code_bytes']):>12} {_format_bytes(row['bundle_bytes']):>15}"
+        )
+    before = rows[0]
+    print()
+    for row in rows[1:]:
+        print(f"  Oppføringer, {row['variant']}: {row['entry_bytes'] / before['entry_bytes']:.0%} av før")
+
+
+def _format_bytes(value: float) -> str:
+    if value >= 1 << 20:
+        return f"{value / (1 << 20):.1f} MiB"
+    return f"{value / 1024:.0f} KiB"
+
+
+def _format_ns(value: float) -> str:
+    if value >= 1e9:
+        return f"{value / 1e9:.2f} s"
+    if value >= 1e6:
+        return f"{value / 1e6:.2f} ms"
+    if value >= 1e3:
+        return f"{value / 1e3:.2f} µs"
+    return f"{value:.0f} ns"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _parse_sizes(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mål de varme kodestiene.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_cmd = sub.add_parser("run", help="kjør og lagre i build/bench/")
+    run_cmd.add_argument(
+        "--sizes",
+        type=_parse_sizes,
+        default=list(DEFAULT_SIZES),
+        help="syntetiske datasett, kommaseparert (0 = ingen). Standard: 10000,100000",
+    )
+    run_cmd.add_argument("--only", help="bare ett mål, f.eks. lookup_code")
+    run_cmd.add_argument("--repeat", type=int, default=7)
+    run_cmd.add_argument("--quick", action="store_true", help="3 gjentak og bare 10000")
+    run_cmd.add_argument("--out", type=Path, help="standard: build/bench/<tid>.json")
+    compare_cmd = sub.add_parser("compare", help="sammenlign to målinger")
+    compare_cmd.add_argument("base", type=Path)
+    compare_cmd.add_argument("new", type=Path)
+    compare_cmd.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="andel tregere som regnes som regresjon (standard 0.10)",
+    )
+    sub.add_parser("memory", help="byte per oppføring før og etter kompakte oppføringer")
+    args = parser.parse_args(argv)
+
+    if args.command == "memory":
+        print_memory(memory_report())
+        return 0
+    if args.command == "compare":
+        base = json.loads(args.base.read_text(encoding="utf-8"))
+        new = json.loads(args.new.read_text(encoding="utf-8"))
+        return 1 if compare(base, new, args.threshold) else 0
+
+    sizes = [10_000] if args.quick else [size for size in args.sizes if size > 0]
+    report = run(sizes, args.only, 3 if args.quick else args.repeat)
+    out = args.out or BENCH_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n  Lagret {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Compile a country dataset into the lookup bundle used by the CLI and web app."""
+
+from __future__ import annotations
+
+from typing import Dict, List
+
+from code_index import CodeIndex
+from code_utils import normalize_code_list
+from compact import compact_entry, compact_value
+from matcher import AnswerMatcher
+from region_images import gather_image_candidates
+from reverse_index import ReverseIndex
+from sampler import QuestionSampler
+from suggest import SuggestIndex
+
+# Øk når strukturen compile_bundle returnerer endres. Snapshots sjekker også
+# en hash av kildekoden (snapshot.BUNDLE_MODULES), så de blir utdaterte
+# også om dette glemmes.
+BUNDLE_FORMAT = 8
+
+
+class QuizEntry(Dict):
+    code: str
+    primary_cities: List[str]
+    regions: List[str]
+
+
+def compile_bundle(data: dict, country: str, compact: bool = True) -> dict:
+    """
+    Build the bundle for one parsed ``Telefonnummer/*.json`` file.
+
+    The bundle holds the dataset metadata, the working entries, the
+    ``by_code`` :class:`CodeIndex`, the question ``sampler``, the prefix
+    ``suggest`` index, the name -> entry ``reverse`` index, an answer
+    matcher per entry (``_matcher``) and the image filenames each entry
+    expects (``_images``, resolved per request by ``region_images``).
+    Entries are :class:`compact.Entry` records with tuples and interned
+    strings; ``compact=False`` keeps plain dicts with lists (used by
+    ``bench.py memory`` for comparison). Build it once per dataset and
+    reuse it for every lookup.
+    """
+    raw_entries: List[QuizEntry] = data.get("codes") or []
+    entries: List[QuizEntry] = []
+    shared: dict = {}
+
+    for entry in raw_entries:
+        codes = normalize_code_list(entry.get("code"))
+        working_entry = dict(entry)
+        working_entry.setdefault("primary_cities", entry.get("primary_cities", []))
+        working_entry.setdefault("regions", entry.get("regions", []))
+        working_entry["_codes"] = codes
+        working_entry["_primary_code"] = codes[0] if codes else ""
+        if compact:
+            # matcher og bildenavn bygges fra de internerte strengene
+            working_entry = compact_entry(working_entry, shared)
+            working_entry._matcher = AnswerMatcher.from_entry(working_entry)
+            working_entry._images = compact_value(
+                gather_image_candidates(working_entry), shared
+            )
+        else:
+            working_entry["_matcher"] = AnswerMatcher.from_entry(working_entry)
+            working_entry["_images"] = gather_image_candidates(working_entry)
+        entries.append(working_entry)
+
+    return {
+        "metadata": {
+            "country": data.get("country", country),
+            "country_code": data.get("country_code", ""),
+        },
+        "entries": entries,
+        "by_code": CodeIndex.build(entries, pack=compact),
+        "sampler": QuestionSampler(entries),
+        "suggest": SuggestIndex(entries),
+        "reverse": ReverseIndex(entries),
+        "answer_names": frozenset(
+            token for entry in entries for token in entry["_matcher"].tokens()
+        ),
+    }
@@ -0,0 +1,221 @@
+"""Range-aware code index shared by the lookup paths."""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from heapq import merge
+from typing import Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from code_utils import merge_entries, parse_code_range, split_search_keys
+
+
+class CodeIndex:
+    """
+    Map codes and search keys to entries without expanding ranges.
+
+    Raw codes and single-code keys live in a dict. Ranges are kept per key
+    width as a sorted array of elementary intervals, each holding the entries
+    that cover it, so a range lookup is one bisect. A key or interval with a
+    single entry stores that position as a bare ``int`` instead of a
+    one-element tuple (``pack=False`` keeps the tuples). ``get`` returns the same
+    entries, in the same order and with the same repeats (an entry is listed
+    once for its raw code and once for its key), as a dict with one key per
+    expanded value. The numeric exact keys are also kept sorted per width,
+    so a range typed by the user is answered by bisecting instead of
+    trying every value in it.
+    """
+
+    def __init__(
+        self,
+        entries: Sequence[dict],
+        exact: Dict[str, Tuple[int, ...]],
+        ranges: Dict[int, Tuple[List[int], List[Tuple[int, ...]]]],
+    ):
+        self.entries = list(entries)
+        self._exact = exact
+        self._ranges = ranges
+        numeric: Dict[int, List[int]] = {}
+        for key in exact:
+            if key.isascii() and key.isdigit():
+                numeric.setdefault(len(key), []).append(int(key))
+        self._numeric = {width: sorted(values) for width, values in numeric.items()}
+
+    @classmethod
+    def build(cls, entries: Sequence[dict], pack: bool = True) -> "CodeIndex":
+        """Index entries by their normalized ``_codes``."""
+        exact: Dict[str, List[int]] = {}
+        intervals: Dict[int, List[Tuple[int, int, int]]] = {}
+
+        for idx, entry in enumerate(entries):
+            codes = entry.get("_codes") or []
+            keys, ranges = split_search_keys(codes)
+            for code in codes:
+                exact.setdefault(code, []).append(idx)
+            for key in keys:
+                if not _covered(key, ranges):
+                    exact.setdefault(key, []).append(idx)
+            for width, start, end in ranges:
+                intervals.setdefault(width, []).append((start, end, idx))
+
+        shape = _pack if pack else tuple
+        ranges = {}
+        for width, items in intervals.items():
+            starts, covers = sweep_intervals(items)
+            ranges[width] = (starts, [shape(cover) for cover in covers])
+        return cls(
+            entries,
+            {key: shape(idxs) for key, idxs in exact.items()},
+            ranges,
+        )
+
+    def get(self, key: str, default=None):
+        """Return the entries indexed under ``key`` (dict-style)."""
+        idxs = self.positions(key)
+        if not idxs:
+            return default
+        return [self.entries[idx] for idx in idxs]
+
+    def resolve(self, raw_code: str):
+        """
+        Resolve user input to ``(matched_key, entry)``.
+
+        The raw code is tried first, then each search key it expands to, and
+        finally its digits. Several matching entries are merged into one.
+        ``entry`` is ``None`` when nothing matches.
+        """
+        if not raw_code:
+            return None, None
+
+        direct_matches = self.get(raw_code)
+        if direct_matches:
+            return raw_code, pick_or_merge(direct_matches)
+
+        digits_only = "".join(ch for ch in raw_code if ch.isdigit())
+        for key in self.candidate_keys(raw_code):
+            matches = self.get(key)
+            if matches:
+                return key, pick_or_merge(matches)
+
+        return digits_only or raw_code, None
+
+    def candidate_keys(self, raw_code: str) -> Iterator[str]:
+        """
+        Search keys tried for user input after the raw code itself, in
+        order. For a range only the keys that have entries are yielded.
+        """
+        digits_only = "".join(ch for ch in raw_code if ch.isdigit())
+        interval = parse_code_range(raw_code)
+        if interval is not None:
+            yield from self.range_keys(*interval)
+        if digits_only:
+            yield digits_only
+
+    def range_keys(self, width: int, start: int, end: int) -> Iterator[str]:
+        """
+        Keys ``str(value).zfill(width)`` for ``start <= value <= end`` that
+        have entries, ascending. Every key whose entries differ from the key
+        before it is included, so the first key per entry is never skipped.
+        """
+        numeric = self._numeric.get(width, [])
+        exact = numeric[bisect_left(numeric, start) : bisect_right(numeric, end)]
+        last = None
+        for value in merge(exact, self._range_starts(width, start, end)):
+            if value != last:
+                last = value
+                yield str(value).zfill(width)
+
+    def exact_keys(self) -> Iterable[str]:
+        """Raw codes and single-code keys (not the values inside ranges)."""
+        return self._exact.keys()
+
+    def key_widths(self) -> Tuple[Set[int], Set[int]]:
+        """Widths of the numeric exact keys, and widths that have ranges."""
+        return set(self._numeric), set(self._ranges)
+
+    def positions(self, key: str) -> Tuple[int, ...]:
+        """Positions in ``entries`` indexed under ``key``, in entry order."""
+        exact = self._exact.get(key, ())
+        if exact.__class__ is int:
+            exact = (exact,)
+        ranged = self._stab(key)
+        if not ranged:
+            return exact
+        if not exact:
+            return ranged
+        return tuple(sorted(exact + ranged))
+
+    def _stab(self, key: str) -> Tuple[int, ...]:
+        table = self._ranges.get(len(key))
+        if table is None or not (key.isascii() and key.isdigit()):
+            return ()
+        starts, covers = table
+        pos = bisect_right(starts, int(key)) - 1
+        if pos < 0:
+            return ()
+        cover = covers[pos]
+        return (cover,) if cover.__class__ is int else cover
+
+    def _range_starts(self, width: int, start: int, end: int) -> Iterator[int]:
+        """First value of each covered elementary interval within ``start..end``."""
+        table = self._ranges.get(width)
+        if table is None:
+            return
+        starts, covers = table
+        pos = max(bisect_right(starts, start) - 1, 0)
+        while pos < len(starts) and starts[pos] <= end:
+            cover = covers[pos]
+            if cover.__class__ is int or cover:
+                yield max(starts[pos], start)
+            pos += 1
+
+
+def _pack(idxs: Sequence[int]):
+    return idxs[0] if len(idxs) == 1 else tuple(idxs)
+
+
+def pick_or_merge(entries: Sequence[dict]):
+    if not entries:
+        return None
+    if len(entries) == 1:
+        return entries[0]
+    return merge_entries(entries)
+
+
+def _covered(key: str, ranges: List[Tuple[int, int, int]]) -> bool:
+    if not (key.isascii() and key.isdigit()):
+        return False
+    value = int(key)
+    return any(
+        width == len(key) and start <= value <= end
+        for width, start, end in ranges
+    )
+
+
+def sweep_intervals(
+    items: List[Tuple[int, int, int]],
+) -> Tuple[List[int], List[Tuple[int, ...]]]:
+    """
+    Turn possibly overlapping ``(start, end, idx)`` intervals into sorted
+    elementary intervals. ``covers[i]`` holds the entry indices that cover
+    ``starts[i] <= value < starts[i + 1]``.
+    """
+    events: Dict[int, List[Tuple[int, int]]] = {}
+    for start, end, idx in items:
+        events.setdefault(start, []).append((idx, 1))
+        events.setdefault(end + 1, []).append((idx, -1))
+
+    starts: List[int] = []
+    covers: List[Tuple[int, ...]] = []
+    active: Counter = Counter()
+    for point in sorted(events):
+        for idx, delta in events[point]:
+            active[idx] += delta
+            if not active[idx]:
+                del active[idx]
+        cover = tuple(sorted(active))
+        if covers and covers[-1] == cover:
+            continue
+        starts.append(point)
+        covers.append(cover)
+    return starts, covers
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import re
-from typing import Iterable, List, Sequence
+from typing import Iterable, Iterator, List, Sequence, Tuple
 
 
 _RANGE_PATTERN = re.compile(
@@ -47,23 +47,64 @@ def expand_search_keys(codes: Iterable[str]) -> List[str]:
     return keys
 
 
+def split_search_keys(
+    codes: Iterable[str],
+) -> Tuple[List[str], List[Tuple[int, int, int]]]:
+    """
+    Like :func:`expand_search_keys`, but keep ranges as intervals.
+
+    Returns ``(keys, ranges)`` where ``keys`` are the single-code keys and
+    ``ranges`` holds ``(width, start, end)`` tuples. A range covers exactly
+    the keys ``str(value).zfill(width)`` for ``start <= value <= end``.
+    """
+    keys: List[str] = []
+    ranges: List[Tuple[int, int, int]] = []
+    seen = set()
+    for code in codes:
+        interval = parse_code_range(code)
+        if interval is not None:
+            if interval not in seen:
+                seen.add(interval)
+                ranges.append(interval)
+            continue
+        digits = _digits_only(code)
+        if digits and digits not in seen:
+            seen.add(digits)
+            keys.append(digits)
+    return keys, ranges
+
+
+def iter_code_keys(code: str) -> Iterator[str]:
+    """Lazily yield the keys :func:`expand_search_keys` produces for one code."""
+    interval = parse_code_range(code)
+    if interval is not None:
+        width, start, end = interval
+        for value in range(start, end + 1):
+            yield str(value).zfill(width)
+        return
+
+    digits = _digits_only(code)
+    if digits:
+        yield digits
+
+
 def _expand_code_token(code: str) -> List[str]:
+    return list(iter_code_keys(code))
+
+
+def parse_code_range(code: str) -> Tuple[int, int, int] | None:
     normalized = _standardize_dashes(code.strip())
     match = _RANGE_PATTERN.match(normalized)
-    if match:
-        start_str = match.group("start")
-        end_str = match.group("end")
-        if not start_str or not end_str:
-            return []
-        start = int(start_str)
-        end = int(end_str)
-        if end < start:
-            start, end = end, start
-        width = max(len(start_str), len(end_str))
-        return [str(value).zfill(width) for value in range(start, end + 1)]
-
-    digits = _digits_only(code)
-    return [digits] if digits else []
+    if not match:
+        return None
+    start_str = match.group("start")
+    end_str = match.group("end")
+    start = int(start_str)
+    end = int(end_str)
+    if end < start:
+        start, end = end, start
+    width = max(len(start_str), len(end_str))
+    return width, start, end
 
 
 def _standardize_dashes(value: str) -> str:
@@ -89,6 +130,7 @@ def merge_entries(entries: Sequence[dict]) -> dict:
     merged_regions = _merge_str_lists(entries, "regions")
     merged_cities = _merge_str_lists(entries, "primary_cities")
     merged_images = _merge_str_lists(entries, "images")
+    merged_alt_names = _merge_str_lists(entries, "alt_names")
 
     if merged_regions is not None:
         merged["regions"] = merged_regions
@@ -96,6 +138,11 @@ def merge_entries(entries: Sequence[dict]) -> dict:
         merged["primary_cities"] = merged_cities
     if merged_images is not None:
         merged["images"] = merged_images
+    if merged_alt_names is not None:
+        merged["alt_names"] = merged_alt_names
+    # avledede felt fra bundle.compile_bundle gjelder bare første oppføring
+    merged.pop("_matcher", None)
+    merged.pop("_images", None)
 
     notes = [
         str(entry.get("notes")).strip()
@@ -0,0 +1,174 @@
+"""
+Compact, read-only entries for compiled bundles.
+
+A plain entry dict costs a hash table per entry and a list per name field,
+and the same region or city name is stored again in every entry and
+every dataset. :class:`Entry` keeps the known fields in ``__slots__``
+and turns lists into tuples. Strings are interned with ``sys.intern``,
+so equal names share one object across all datasets. Equal tuples
+(e.g. the same ``regions`` on several codes) are shared within a bundle.
+
+``Entry`` is a read-only :class:`~collections.abc.Mapping`, so
+``entry.get("regions", [])``, ``entry["_codes"]`` and ``dict(entry)``
+work as before. Fields that are not in ``FIELDS`` are kept in a small
+side dict.
+
+Unpickling does not keep ``sys.intern``, so a bundle read from a snapshot
+goes through :func:`recompact`, which interns the strings again and shares
+equal tuples the way the build did.
+
+Entries are pickled into snapshots. Snapshots carry a hash of this module
+(see ``snapshot.BUNDLE_MODULES``), so changing the fields here invalidates
+them without touching ``bundle.BUNDLE_FORMAT``.
+"""
+
+from __future__ import annotations
+
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# Kjente felt i Telefonnummer/*.json pluss de avledede fra compile_bundle.
+FIELDS = (
+    "code",
+    "primary_cities",
+    "regions",
+    "notes",
+    "region_group",
+    "difficulty",
+    "population_rank",
+    "images",
+    "alt_names",
+    "_codes",
+    "_primary_code",
+    "_matcher",
+    "_images",
+)
+_FIELD_SET = frozenset(FIELDS)
+
+
+class Entry(Mapping):
+    __slots__ = FIELDS + ("_extra",)
+
+    def __init__(self, fields: Dict[str, Any]):
+        extra = None
+        for key, value in fields.items():
+            if key in _FIELD_SET:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self._extra = extra
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        extra = self._extra
+        return default if extra is None else extra.get(key, default)
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __contains__(self, key) -> bool:
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Entry({dict(self)!r})"
+
+    # pickle (snapshots): bare feltene som er satt
+    def __getstate__(self):
+        return {key: getattr(self, key) for key in self.__slots__ if hasattr(self, key)}
+
+    def __setstate__(self, state):
+        self._extra = None
+        for key, value in state.items():
+            setattr(self, key, value)
+
+
+def compact_entry(entry: Dict[str, Any], shared: Optional[dict] = None) -> Entry:
+    """
+    Convert a working entry dict. ``shared`` is the table equal tuples are
+    shared through; pass the same dict for every entry of a bundle.
+    """
+    shared = {} if shared is None else shared
+    return Entry({key: compact_value(value, shared) for key, value in entry.items()})
+
+
+def recompact(entries: Iterable[Entry], shared: Optional[dict] = None) -> None:
+    """Intern the strings of unpickled entries again, sharing equal tuples."""
+    shared = {} if shared is None else shared
+    for entry in entries:
+        if not isinstance(entry, Entry):
+            continue
+        for key in FIELDS:
+            if key != "_matcher" and hasattr(entry, key):
+                setattr(entry, key, compact_value(getattr(entry, key), shared))
+        if entry._extra is not None:
+            entry._extra = compact_value(entry._extra, shared)
+
+
+def compact_value(value, shared: dict):
+    """Interned strings, and lists as tuples shared through ``shared``."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, (list, tuple)):
+        items = tuple(compact_value(item, shared) for item in value)
+        try:
+            return shared.setdefault(items, items)
+        except TypeError:  # uhashbart innhold, f.eks. en dict
+            return items
+    if isinstance(value, dict):
+        return {sys.intern(str(k)): compact_value(v, shared) for k, v in value.items()}
+    return value
+
+
+def deep_size(obj, seen: Optional[set] = None) -> int:
+    """
+    Bytes reachable from ``obj`` (``sys.getsizeof`` summed over containers,
+    slots and instance dicts). Objects in ``seen`` are not counted again, so
+    measuring several roots with one ``seen`` counts shared objects once.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, int, float, bool)) or item is None:
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            for cls in type(item).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if hasattr(item, name):
+                        stack.append(getattr(item, name))
+            if hasattr(item, "__dict__"):
+                stack.append(vars(item))
+    return total
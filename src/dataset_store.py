@@ -0,0 +1,187 @@
+"""Hot-reloading store for compiled country bundles."""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loader import file_signature
+from metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DatasetRecord:
+    name: str
+    bundle: dict
+    signature: Tuple[int, int]
+    generation: int
+    build_seconds: float
+    built_at: float
+
+
+class DatasetStore:
+    """
+    Keep one compiled bundle per dataset and rebuild it when its file changes.
+
+    A background thread polls the source files' (size, mtime) every
+    ``poll_interval`` seconds. Changed datasets are rebuilt on that thread and
+    swapped in with a single dict assignment, so a request either sees the
+    old bundle or the finished new one. A file that fails to build keeps
+    serving its last good bundle. A file that has never built (e.g. an
+    empty placeholder) raises ``ValueError`` from ``get`` and is not
+    parsed again until its signature changes.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[str], dict],
+        source_path: Callable[[str], Path],
+        poll_interval: float = 2.0,
+    ):
+        self._build = build
+        self._source_path = source_path
+        self.poll_interval = poll_interval
+        self._records: Dict[str, DatasetRecord] = {}
+        # navn -> (signatur, feilmelding) for filer som ikke lot seg bygge
+        self._failed: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._poller_pid: Optional[int] = None
+        _stores.add(self)
+
+    def get(self, name: str) -> dict:
+        """Return the current bundle, building it on first use."""
+        self._ensure_polling()
+        record = self._records.get(name)
+        if record is None:
+            REGISTRY.inc("geo_bundle_requests_total", ("miss",))
+            record = self._load_new(name)
+        else:
+            REGISTRY.inc("geo_bundle_requests_total", ("hit",))
+        return record.bundle
+
+    def warmup(self, names: List[str]) -> None:
+        for name in names:
+            try:
+                self.get(name)
+            except Exception:
+                log.exception("Kunne ikke bygge datasett %s", name)
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "name": record.name,
+                "generation": record.generation,
+                "build_ms": round(record.build_seconds * 1000, 3),
+                "built_at": record.built_at,
+                "entries": len(record.bundle.get("entries") or []),
+            }
+            for record in sorted(self._records.values(), key=lambda r: r.name)
+        ]
+
+    def check_for_changes(self) -> List[str]:
+        """Rebuild every dataset whose source file changed. Returns their names."""
+        reloaded = []
+        for name, record in list(self._records.items()):
+            try:
+                signature = file_signature(self._source_path(name))
+            except FileNotFoundError:
+                with self._lock:
+                    self._records.pop(name, None)
+                reloaded.append(name)
+                continue
+            failed = self._failed.get(name)
+            if signature == record.signature or (failed and signature == failed[0]):
+                continue
+            try:
+                self._load(name, previous=record)
+            except Exception as exc:
+                self._failed[name] = (signature, str(exc))
+                log.exception("Beholder forrige versjon av %s", name)
+                continue
+            reloaded.append(name)
+        return reloaded
+
+    def _load_new(self, name: str) -> DatasetRecord:
+        signature = file_signature(self._source_path(name))
+        failed = self._failed.get(name)
+        if failed is not None and failed[0] == signature:
+            raise ValueError(failed[1])
+        try:
+            return self._load(name)
+        except ValueError as exc:
+            self._failed[name] = (signature, str(exc))
+            raise
+
+    def _load(self, name: str, previous: DatasetRecord | None = None) -> DatasetRecord:
+        with self._lock:
+            build_lock = self._build_locks.setdefault(name, threading.Lock())
+        with build_lock:
+            current = self._records.get(name)
+            if current is not None and current is not previous:
+                return current
+
+            signature = file_signature(self._source_path(name))
+            started = time.perf_counter()
+            bundle = self._build(name)
+            elapsed = time.perf_counter() - started
+            REGISTRY.inc("geo_bundle_builds_total", (name,))
+            REGISTRY.observe("geo_bundle_build_duration_seconds", (name,), elapsed)
+
+            record = DatasetRecord(
+                name=name,
+                bundle=bundle,
+                signature=signature,
+                generation=(current.generation + 1) if current else 1,
+                build_seconds=elapsed,
+                built_at=time.time(),
+            )
+            self._records[name] = record
+            self._failed.pop(name, None)
+            return record
+
+    def _after_fork(self) -> None:
+        # En poller i forelderen kan holde låsene idet den forker; barnet
+        # får ferske. Bundlene som er ferdige, deles videre som de er.
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def _ensure_polling(self) -> None:
+        # Tråder overlever ikke fork, så hver prosess starter sin egen poller.
+        if self._poller_pid == os.getpid() or self.poll_interval <= 0:
+            return
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+        threading.Thread(
+            target=self._poll_forever, name="dataset-poller", daemon=True
+        ).start()
+
+    def _poll_forever(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.check_for_changes()
+            except Exception:
+                log.exception("Feil under sjekk av datafiler")
+
+
+_stores: "weakref.WeakSet[DatasetStore]" = weakref.WeakSet()
+
+
+def _after_fork_in_child() -> None:
+    for store in list(_stores):
+        store._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
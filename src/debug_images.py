@@ -1,45 +1,17 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import json
+import os
 from pathlib import Path
-import re
 import sys
-from typing import List, Optional, Tuple
+import time
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
+from images import image_size
+from loader import data_dir
+from region_images import MAPS_DIR, gather_image_candidates, image_folders
 
-def _region_to_filename(region_name: str) -> str:
-    """Samme slugging som i quiz.js: lager forventet bildefilnavn fra regionnavn."""
-    name = region_name.lower()
-    name = re.sub(r"[()\s,.'-]+", "_", name)
-    name = re.sub(r"_+", "_", name)
-    name = re.sub(r"^_+|_+$", "", name)
-    return f"{name}.png" if name else ""
-
-
-def _normalize_image_name(value: str) -> str:
-    """Trim + legg til .png dersom brukeren bare har gitt et slug."""
-    if not value:
-        return ""
-    trimmed = value.strip()
-    if not trimmed:
-        return ""
-    if re.search(r"\.[a-z0-9]{2,4}$", trimmed, re.IGNORECASE):
-        return trimmed
-    return f"{trimmed}.png"
-
-
-def gather_image_candidates(entry: dict) -> List[str]:
-    """
-    Returnerer alle filnavn vi forventer for en kode.
-    1) Bruk eksplisitt `images` hvis satt.
-    2) Ellers: slug alle regionnavn (kan være >1).
-    """
-    images = entry.get("images") or []
-    if images:
-        return [name for name in (_normalize_image_name(img) for img in images) if name]
-
-    regions = entry.get("regions") or []
-    return [
-        name for name in (_region_to_filename(region) for region in regions) if name
-    ]
+AUDIT_WORKERS = 8
 
 
 def _normalize_country_file(country_arg: Optional[str]) -> Tuple[str, Path]:
@@ -91,6 +63,7 @@ def check_region_images(country_arg="SouthAfrica"):
     missing = []
     checked_pairs = []
 
+    indexes = [folder_index(folder) for folder in image_dirs]
     for e in entries:
         regions = e.get("regions") or []
         image_files = gather_image_candidates(e)
@@ -99,7 +72,7 @@ def check_region_images(country_arg="SouthAfrica"):
             continue
 
         for idx, filename in enumerate(image_files):
-            exists = any((folder / filename).exists() for folder in image_dirs)
+            exists = any(filename in index for index in indexes)
             region_label = (
                 regions[idx] if idx < len(regions) else regions[0] if regions else ""
             )
@@ -108,7 +81,9 @@ def check_region_images(country_arg="SouthAfrica"):
                 missing.append(filename)
 
     print(f"\n🔍 Antall oppføringer i JSON: {len(entries)}")
-    total_png = sum(len(list(folder.glob("*.png"))) for folder in image_dirs)
+    total_png = sum(
+        1 for index in indexes for name in index if name.lower().endswith(".png")
+    )
     print(f"📸 Antall faktiske .png i kartmapper: {total_png}")
 
     # Vis en liste over hva vi forventer
@@ -127,6 +102,168 @@ def check_region_images(country_arg="SouthAfrica"):
     print("--- SLUTT DEBUG ---")
 
 
+def folder_index(folder: Path) -> FrozenSet[str]:
+    """Alle filnavn i en mappe, fra én scandir."""
+    try:
+        with os.scandir(folder) as it:
+            return frozenset(item.name for item in it if item.is_file())
+    except (FileNotFoundError, NotADirectoryError):
+        return frozenset()
+
+
+def _audit_dataset(
+    data_path: Path, indexes: Dict[str, FrozenSet[str]]
+) -> Tuple[dict, Dict[str, set]]:
+    """
+    Sjekk én datafil mot mappeindeksene. Returnerer rapporten for datasettet
+    og hvilke filer (per mappe) oppføringene faktisk bruker.
+    """
+    dataset = data_path.stem
+    folders = image_folders(dataset)
+    report = {"dataset": dataset, "folders": folders, "missing": [], "broken": []}
+    used: Dict[str, set] = {}
+    try:
+        entries = json.loads(data_path.read_bytes()).get("codes") or []
+    except ValueError:
+        report["error"] = "ugyldig eller tom JSON"
+        return report, used
+
+    expected = found = 0
+    for entry in entries:
+        regions = entry.get("regions") or []
+        for idx, filename in enumerate(gather_image_candidates(entry)):
+            if filename.startswith("/") or "://" in filename:
+                continue
+            expected += 1
+            folder = next((f for f in folders if filename in indexes.get(f, ())), None)
+            if folder is None:
+                report["missing"].append(
+                    {
+                        "code": entry.get("code"),
+                        "region": regions[idx] if idx < len(regions) else None,
+                        "file": filename,
+                    }
+                )
+                continue
+            found += 1
+            used.setdefault(folder, set()).add(filename)
+
+    for folder, names in used.items():
+        for name in sorted(names):
+            if image_size(MAPS_DIR / folder / name) is None:
+                report["broken"].append(f"{folder}/{name}")
+    report["entries"] = len(entries)
+    report["expected"] = expected
+    report["found"] = found
+    return report, used
+
+
+def audit_all(workers: int = AUDIT_WORKERS) -> dict:
+    """
+    Sjekk bildene til alle datasett i Telefonnummer/ samtidig.
+
+    Hver kartmappe leses med én scandir til en mengde filnavn, og alle
+    oppslag går mot den. Bilder som ingen oppføring bruker, rapporteres
+    som foreldreløse.
+    """
+    started = time.perf_counter()
+    data_files = sorted(data_dir().glob("*.json"))
+    folders = {item.name for item in MAPS_DIR.iterdir() if item.is_dir()}
+    for data_path in data_files:
+        folders.update(image_folders(data_path.stem))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        names = sorted(folders)
+        indexes = dict(zip(names, pool.map(lambda f: folder_index(MAPS_DIR / f), names)))
+        results = list(pool.map(lambda path: _audit_dataset(path, indexes), data_files))
+
+    used: Dict[str, set] = {}
+    for _, dataset_used in results:
+        for folder, files in dataset_used.items():
+            used.setdefault(folder, set()).update(files)
+    orphans = sorted(
+        f"{folder}/{name}"
+        for folder, index in indexes.items()
+        for name in index - used.get(folder, set())
+    )
+
+    datasets = [report for report, _ in results]
+    return {
+        "datasets": datasets,
+        "orphans": orphans,
+        "summary": {
+            "datasets": len(datasets),
+            "folders": sum(1 for folder in indexes if (MAPS_DIR / folder).is_dir()),
+            "images": sum(len(index) for index in indexes.values()),
+            "missing": sum(len(r["missing"]) for r in datasets),
+            "broken": sum(len(r["broken"]) for r in datasets),
+            "orphans": len(orphans),
+            "seconds": round(time.perf_counter() - started, 4),
+        },
+    }
+
+
+def print_audit(report: dict) -> None:
+    print("--- Bilderevisjon for alle datasett ---")
+    for dataset in report["datasets"]:
+        if "error" in dataset:
+            print(f"  {dataset['dataset']:<24} ⚠️ {dataset['error']}")
+            continue
+        status = "✅" if not dataset["missing"] and not dataset["broken"] else "❌"
+        print(
+            f"  {dataset['dataset']:<24} {status} {dataset['found']}/{dataset['expected']} "
+            f"bilder, {len(dataset['missing'])} mangler, {len(dataset['broken'])} ødelagte"
+        )
+        for path in dataset["broken"]:
+            print(f"      ødelagt: {path}")
+    if report["orphans"]:
+        print(f"\n  {len(report['orphans'])} bilder brukes ikke av noen oppføring:")
+        for path in report["orphans"]:
+            print(f"    - {path}")
+    summary = report["summary"]
+    print(
+        f"\n  {summary['images']} bilder i {summary['folders']} mapper sjekket "
+        f"på {summary['seconds'] * 1000:.1f} ms"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Sjekk at regionene har kartbilder.")
+    parser.add_argument("country", nargs="?", default="Russia")
+    parser.add_argument(
+        "--all", action="store_true", help="sjekk alle datasett samtidig"
+    )
+    parser.add_argument(
+        "--json", metavar="FIL", help="skriv rapporten som JSON ('-' for stdout)"
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="feil også ved manglende og foreldreløse bilder, ikke bare ødelagte",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.all:
+        check_region_images(args.country)
+        return 0
+
+    report = audit_all()
+    if args.json == "-":
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        print_audit(report)
+        if args.json:
+            Path(args.json).write_text(
+                json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8"
+            )
+
+    summary = report["summary"]
+    failed = summary["broken"] or (
+        args.strict and (summary["missing"] or summary["orphans"])
+    )
+    return 1 if failed else 0
+
+
 if __name__ == "__main__":
-    arg = sys.argv[1] if len(sys.argv) > 1 else "Russia"
-    check_region_images(arg)
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Append-only log of answer events, written behind the request path.
+
+Every evaluated answer becomes one JSON line (``ts``, ``country``,
+``code``, ``guess``, ``correct``, ``matched_on``, ``match_type``,
+``latency_ms`` and ``learner`` when known). :meth:`EventLog.append` only
+queues the event; a :class:`WriteBehind` thread writes the batch with a
+single ``write`` and ``fsync`` every ``FLUSH_SECONDS``.
+
+Each process writes its own segment files, named
+``answers.<start ms>.<pid>.ndjson``, and starts a new segment when the
+current one passes ``MAX_SEGMENT_BYTES``. That way several ``serve.py``
+workers never share a file. :func:`replay` merges all segments back into
+one stream ordered by ``ts``.
+
+    python src/event_log.py replay [--country Land] [--since SEK] [--summary]
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional
+
+from write_behind import WriteBehind
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+EVENT_LOG_DIR = PROJECT_ROOT / "var" / "events"
+FLUSH_SECONDS = 1.0
+MAX_SEGMENT_BYTES = 16 * 1024 * 1024
+SEGMENT_GLOB = "answers.*.ndjson"
+
+
+class EventLog:
+    def __init__(
+        self,
+        directory: Path = EVENT_LOG_DIR,
+        flush_interval: float = FLUSH_SECONDS,
+        max_segment_bytes: int = MAX_SEGMENT_BYTES,
+    ):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self._file: Optional[IO[bytes]] = None
+        self._file_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._writer = WriteBehind(
+            self._write, interval=flush_interval, max_batch=10_000, name="event-log-writer"
+        )
+
+    def append(self, event: dict) -> None:
+        self._writer.put(event)
+
+    def flush(self) -> int:
+        return self._writer.flush_now()
+
+    def _write(self, events: List[dict]) -> None:
+        data = "".join(
+            json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for event in events
+        ).encode("utf-8")
+        with self._lock:
+            f = self._segment()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            if f.tell() >= self.max_segment_bytes:
+                f.close()
+                self._file = None
+
+    def _segment(self) -> IO[bytes]:
+        # Etter fork tilhører den åpne filen forelderen.
+        if self._file is None or self._file_pid != os.getpid():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            name = f"answers.{int(time.time() * 1000):013d}.{os.getpid()}.ndjson"
+            self._file = open(self.directory / name, "ab")
+            self._file_pid = os.getpid()
+        return self._file
+
+
+def segments(directory: Path = EVENT_LOG_DIR) -> List[Path]:
+    return sorted(directory.glob(SEGMENT_GLOB))
+
+
+def _read_segment(path: Path) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                return  # siste linje ble avbrutt midt i en skriving
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def replay(
+    directory: Path = EVENT_LOG_DIR,
+    since: float | None = None,
+    country: str | None = None,
+) -> Iterator[dict]:
+    """All logged events in ``ts`` order, optionally filtered."""
+    merged = heapq.merge(
+        *(_read_segment(path) for path in segments(directory)),
+        key=lambda event: event.get("ts", 0),
+    )
+    for event in merged:
+        if since is not None and event.get("ts", 0) < since:
+            continue
+        if country is not None and event.get("country") != country:
+            continue
+        yield event
+
+
+def _print_summary(events: Iterator[dict]) -> None:
+    totals: Dict[str, List[int]] = {}
+    latencies: List[float] = []
+    for event in events:
+        asked_correct = totals.setdefault(event.get("country") or "?", [0, 0])
+        asked_correct[0] += 1
+        asked_correct[1] += bool(event.get("correct"))
+        if event.get("latency_ms") is not None:
+            latencies.append(event["latency_ms"])
+    for country, (asked, correct) in sorted(totals.items()):
+        print(f"  {country:<24} {asked:>8} svar  {correct / asked:6.1%} riktige")
+    if latencies:
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"  vurdering: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Les svarloggen.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("replay", help="skriv hendelsene som NDJSON i tidsrekkefølge")
+    cmd.add_argument("--dir", type=Path, default=EVENT_LOG_DIR)
+    cmd.add_argument("--country")
+    cmd.add_argument(
+        "--since", type=float, metavar="SEK", help="bare de siste SEK sekundene"
+    )
+    cmd.add_argument("--summary", action="store_true", help="bare tellinger per land")
+    args = parser.parse_args(argv)
+
+    since = time.time() - args.since if args.since is not None else None
+    events = replay(args.dir, since=since, country=args.country)
+    if args.summary:
+        _print_summary(events)
+        return 0
+    try:
+        for event in events:
+            sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+    except BrokenPipeError:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
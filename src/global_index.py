@@ -0,0 +1,142 @@
+"""Cross-country code resolver over every dataset."""
+
+from __future__ import annotations
+
+import logging
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from code_utils import parse_code_range
+
+log = logging.getLogger(__name__)
+
+# Betyr "alle datasett" i country-feltet.
+ALL_COUNTRIES = "*"
+
+
+class GlobalCodeIndex:
+    """
+    Which datasets claim a code, over the ``CodeIndex`` of every dataset.
+
+    Each dataset is a slice: its own ``by_code`` index plus its entries in a
+    shared directory from exact key to the datasets that have it, and from
+    key width to the datasets with ranges (or numeric keys) of that width.
+    ``resolve`` asks only the datasets the directory points at, and gets
+    from each the same ``(key, entry)`` as that dataset's own
+    ``CodeIndex.resolve``. ``update`` replaces the slices of the datasets
+    that changed and leaves the rest alone.
+    """
+
+    def __init__(self, bundles: Dict[str, dict]):
+        self.bundles: Dict[str, dict] = {}
+        self._claims: Dict[str, Tuple[str, ...]] = {}
+        self._ranged: Dict[int, Tuple[str, ...]] = {}
+        self._numeric: Dict[int, Tuple[str, ...]] = {}
+        self.update(bundles)
+
+    def update(self, bundles: Dict[str, dict]) -> List[str]:
+        """
+        Make ``bundles`` the indexed set. Only datasets that were added,
+        removed or whose bundle object changed are touched; their names are
+        returned. A reader running meanwhile sees the old or the new slice.
+        """
+        old = self.bundles
+        changed = [
+            name
+            for name in list(old) + [name for name in bundles if name not in old]
+            if old.get(name) is not bundles.get(name)
+        ]
+        # nye nøkler først og gamle til slutt, så et samtidig oppslag aldri
+        # mangler et datasett som finnes både før og etter
+        for name in changed:
+            if name in bundles:
+                self._add_slice(name, bundles[name])
+        self.bundles = dict(bundles)
+        for name in changed:
+            if name in old:
+                self._drop_slice(name, old[name], keep=name in bundles)
+        return changed
+
+    def resolve(self, raw_code: str) -> List[Tuple[str, str, dict]]:
+        """Return ``(dataset, matched_key, entry)`` for every matching dataset."""
+        if not raw_code:
+            return []
+        bundles = self.bundles
+        claimed = self._candidates(raw_code)
+        results = []
+        for dataset, bundle in bundles.items():
+            if dataset not in claimed:
+                continue
+            key, entry = bundle["by_code"].resolve(raw_code)
+            if entry is not None:
+                results.append((dataset, key, entry))
+        return results
+
+    def _candidates(self, raw_code: str) -> Set[str]:
+        claimed = set(self._claims.get(raw_code, ()))
+        digits_only = "".join(ch for ch in raw_code if ch.isdigit())
+        if digits_only:
+            claimed.update(self._claims.get(digits_only, ()))
+            claimed.update(self._ranged.get(len(digits_only), ()))
+        interval = parse_code_range(raw_code)
+        if interval is not None:
+            width = interval[0]
+            claimed.update(self._ranged.get(width, ()))
+            claimed.update(self._numeric.get(width, ()))
+        return claimed
+
+    def _add_slice(self, name: str, bundle: dict) -> None:
+        index = bundle["by_code"]
+        for key in index.exact_keys():
+            _add(self._claims, key, name)
+        numeric, ranged = index.key_widths()
+        for width in numeric:
+            _add(self._numeric, width, name)
+        for width in ranged:
+            _add(self._ranged, width, name)
+
+    def _drop_slice(self, name: str, bundle: dict, keep: bool) -> None:
+        """Remove what only the old bundle had (everything, unless ``keep``)."""
+        index = bundle["by_code"]
+        current = self.bundles[name]["by_code"] if keep else None
+        kept = set(current.exact_keys()) if current else set()
+        for key in index.exact_keys():
+            if key not in kept:
+                _remove(self._claims, key, name)
+        numeric, ranged = index.key_widths()
+        new_numeric, new_ranged = current.key_widths() if current else (set(), set())
+        for width in numeric - new_numeric:
+            _remove(self._numeric, width, name)
+        for width in ranged - new_ranged:
+            _remove(self._ranged, width, name)
+
+
+def _add(directory: dict, key, name: str) -> None:
+    names = directory.get(key, ())
+    if name not in names:
+        directory[key] = names + (name,)
+
+
+def _remove(directory: dict, key, name: str) -> None:
+    names = tuple(other for other in directory.get(key, ()) if other != name)
+    if names:
+        directory[key] = names
+    else:
+        directory.pop(key, None)
+
+
+def load_bundles(names: Iterable[str], load: Callable[[str], dict]) -> Dict[str, dict]:
+    """
+    Load many bundles, keeping the order of ``names``. Datasets that cannot
+    be read or parsed (e.g. empty files) are skipped.
+
+    The builds are pure Python and would only take turns on the GIL in a
+    thread pool; prebuilt snapshots (``python src/snapshot.py compile``)
+    are what makes this fast.
+    """
+    bundles = {}
+    for name in names:
+        try:
+            bundles[name] = load(name)
+        except (OSError, ValueError):
+            log.warning("Hopper over datasett %s", name, exc_info=True)
+    return bundles
@@ -0,0 +1,336 @@
+"""
+Resized and WebP variants of the region maps under ``static/maps/``.
+
+``build`` reads every image in every ``static/maps/<folder>/`` and writes,
+to ``build/maps/``, a WebP at full size plus a WebP and a copy in the
+source's own format (many ``.png`` files here are really JPEG) for each of
+``VARIANT_WIDTHS`` that is narrower than the source. Files Pillow cannot
+read are recorded with an ``error`` and get no variants. Variant filenames
+carry the source hash, and ``manifest.json`` records the size of every
+file. Images whose source hash matches the previous manifest are skipped,
+so a rebuild only encodes what changed.
+
+The web server uses the manifest to answer ``/static/maps/...?w=480``
+with the smallest variant at least that wide, as WebP when the browser
+accepts it.
+
+Requires Pillow (``pip install pillow``) to build; serving does not.
+
+    python src/images.py build [--workers N] [--force]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from loader import file_signature
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MAPS_DIR = PROJECT_ROOT / "static" / "maps"
+IMAGE_BUILD_DIR = PROJECT_ROOT / "build" / "maps"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+HASH_LENGTH = 10
+
+# quiz.css viser kartene med max-width 240px; 480 og 960 dekker 2x/4x-skjermer.
+VARIANT_WIDTHS = (240, 480, 960)
+SOURCE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+class Variant(NamedTuple):
+    file: str
+    width: int
+    height: int
+    format: str
+    bytes: int
+
+
+def _variant_name(relative: str, digest: str, width: int, fmt: str) -> str:
+    path = Path(relative)
+    return str(path.with_name(f"{path.stem}.{digest[:HASH_LENGTH]}.w{width}.{fmt}"))
+
+
+def _encode(image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+    elif fmt == "jpeg":
+        image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    else:
+        image.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _import_pillow():
+    # Valgfri avhengighet som bare trengs for å bygge; importeres først her
+    # så serveren og CLI-et slipper å laste den.
+    try:
+        from PIL import Image
+    except ImportError:  # pragma: no cover - avhenger av miljøet
+        return None
+    return Image
+
+
+def _build_image(Image, source: Path, relative: str, digest: str, target: Path) -> dict:
+    try:
+        image = Image.open(source)
+        image.load()
+    except OSError:
+        return {"sha256": digest, "error": "kan ikke leses som bilde", "variants": []}
+
+    with image:
+        width, height = image.size
+        fallback = "jpeg" if image.format == "JPEG" else "png"
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        variants: List[Variant] = []
+        plan = [(w, ("webp", fallback)) for w in VARIANT_WIDTHS if w < width]
+        plan.append((width, ("webp",)))
+        for variant_width, formats in plan:
+            if variant_width == width:
+                resized = image
+            else:
+                variant_height = max(1, round(height * variant_width / width))
+                resized = image.resize((variant_width, variant_height), Image.LANCZOS)
+            for fmt in formats:
+                data = _encode(resized, fmt)
+                name = _variant_name(relative, digest, variant_width, fmt)
+                path = target / name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(path.name + ".tmp")
+                tmp_path.write_bytes(data)
+                tmp_path.replace(path)
+                variants.append(
+                    Variant(name, resized.width, resized.height, fmt, len(data))
+                )
+
+    return {
+        "sha256": digest,
+        "format": fallback,
+        "width": width,
+        "height": height,
+        "bytes": source.stat().st_size,
+        "variants": [variant._asdict() for variant in variants],
+    }
+
+
+def _is_current(record: Optional[dict], digest: str, target: Path) -> bool:
+    return (
+        record is not None
+        and record["sha256"] == digest
+        and all((target / v["file"]).exists() for v in record["variants"])
+    )
+
+
+def build_images(
+    source: Path = MAPS_DIR,
+    target: Path = IMAGE_BUILD_DIR,
+    workers: int = os.cpu_count() or 2,
+    force: bool = False,
+) -> dict:
+    """Write variants for new or changed images and return the manifest."""
+    Image = _import_pillow()
+    if Image is None:
+        raise RuntimeError("Pillow mangler: pip install pillow")
+
+    previous = {} if force else (_read_manifest(target / MANIFEST_NAME) or {}).get("images", {})
+    sources = sorted(
+        path for path in source.rglob("*")
+        if path.is_file() and path.suffix.lower() in SOURCE_SUFFIXES
+    )
+
+    def process(path: Path) -> Tuple[str, dict, bool]:
+        relative = path.relative_to(source).as_posix()
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        record = previous.get(relative)
+        if _is_current(record, digest, target):
+            return relative, record, False
+        return relative, _build_image(Image, path, relative, digest, target), True
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(process, sources))
+
+    images = {relative: record for relative, record, _ in results}
+    built = sum(1 for _, _, changed in results if changed)
+    manifest = {"version": MANIFEST_VERSION, "widths": list(VARIANT_WIDTHS), "images": images}
+    removed = _prune(target, manifest)
+    _write_manifest(target / MANIFEST_NAME, manifest)
+
+    readable = [record for record in images.values() if record["variants"]]
+    original = sum(record["bytes"] for record in readable)
+    smallest = sum(min(v["bytes"] for v in record["variants"]) for record in readable)
+    print(
+        f"  {len(images)} bilder, {built} bygget, {len(images) - built} uendret, "
+        f"{removed} fjernet -> {target}"
+    )
+    for relative, record in images.items():
+        if "error" in record:
+            print(f"  ⚠️ {relative}: {record['error']}")
+    print(
+        f"  originaler {original / 1024:.0f} KiB, minste varianter {smallest / 1024:.0f} KiB"
+    )
+    return manifest
+
+
+def _prune(target: Path, manifest: dict) -> int:
+    keep = {MANIFEST_NAME}
+    for record in manifest["images"].values():
+        keep.update(variant["file"] for variant in record["variants"])
+    removed = 0
+    for path in list(target.rglob("*")):
+        if path.is_file() and path.relative_to(target).as_posix() not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def _read_manifest(path: Path) -> Optional[dict]:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _write_manifest(path: Path, manifest: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def pick_variant(
+    record: dict, width: Optional[int], accept_webp: bool
+) -> Optional[dict]:
+    """
+    Smallest variant at least ``width`` wide, in WebP when accepted.
+    ``width=None`` means full size. Returns ``None`` when the original is
+    the best choice.
+    """
+    if not record["variants"]:
+        return None
+    fallback = record["format"]
+    formats = ("webp", fallback) if accept_webp else (fallback,)
+    wanted = record["width"] if width is None else min(width, record["width"])
+    wide_enough = [
+        v for v in record["variants"] if v["format"] in formats and v["width"] >= wanted
+    ]
+    if not wide_enough:
+        return None
+    best = min(wide_enough, key=lambda v: (v["width"], v["bytes"]))
+    return best if best["bytes"] < record["bytes"] else None
+
+
+class ImageManifest:
+    """Reads ``build/maps/manifest.json`` and re-reads it when it changes."""
+
+    def __init__(self, root: Path = IMAGE_BUILD_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._signature = None
+        self._images: Dict[str, dict] = {}
+
+    def lookup(self, relative: str) -> Optional[dict]:
+        """Manifest record for a path relative to ``static/maps/``."""
+        return self.images().get(relative)
+
+    def images(self) -> Dict[str, dict]:
+        """All records; a new dict object every time the manifest changes."""
+        manifest_path = self.root / MANIFEST_NAME
+        try:
+            signature = file_signature(manifest_path)
+        except FileNotFoundError:
+            signature = None
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    manifest = _read_manifest(manifest_path) or {}
+                    self._images = manifest.get("images", {})
+                    self._signature = signature
+        return self._images
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG-markører med bildestørrelse (SOFn), unntatt DHT/JPG/DAC.
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """
+    ``(width, height)`` from the file header of a PNG, JPEG or GIF, without
+    Pillow. ``None`` if the file is not an image in one of those formats.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(24)
+            if head[:8] == _PNG_SIGNATURE and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head[:2] == b"\xff\xd8":
+                return _jpeg_size(f)
+    except OSError:
+        pass
+    return None
+
+
+def _jpeg_size(f) -> Optional[Tuple[int, int]]:
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        kind = byte[0]
+        if kind == 0x01 or 0xD0 <= kind <= 0xD9:
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        if kind in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">xHH", data)
+            return width, height
+        f.seek(struct.unpack(">H", length)[0] - 2, 1)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Lag nedskalerte og WebP-varianter av kartbildene."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="skriv build/maps/ og manifest.json")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    build.add_argument("--force", action="store_true", help="bygg alle bilder på nytt")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print("--- Bygger kartvarianter ---")
+        try:
+            build_images(workers=args.workers, force=args.force)
+        except RuntimeError as exc:
+            print(f"❌ {exc}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
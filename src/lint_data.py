@@ -0,0 +1,203 @@
+"""
+Lint every dataset in ``Telefonnummer/``.
+
+Errors (exit status 1):
+  - the file is not valid JSON or has no ``codes`` list
+  - an entry has no usable code, or no non-empty region
+  - a ``difficulty`` outside ``easy``/``medium``/``hard``
+  - the same code (or the same range) listed by two entries
+
+Warnings (errors with ``--strict``):
+  - overlapping ranges/codes in different entries; at runtime these are
+    silently merged by ``merge_entries``
+  - ``difficulty`` set on some entries of a dataset but not on others
+
+Overlaps are found with one sort-and-sweep pass per code width instead of
+comparing every pair of entries. Files are linted concurrently.
+
+    python src/lint_data.py [--strict] [Land ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from code_utils import normalize_code_list, split_search_keys
+from loader import country_data_path, data_dir
+
+DIFFICULTIES = ("easy", "medium", "hard")
+LINT_WORKERS = 8
+
+
+class Problem(NamedTuple):
+    dataset: str
+    severity: str  # "error" eller "warning"
+    kind: str
+    message: str
+
+
+class Interval(NamedTuple):
+    start: int
+    end: int
+    entry: int
+    code: str
+
+
+def find_overlaps(intervals: List[Interval]) -> List[Tuple[Interval, Interval]]:
+    """
+    All pairs of intervals from different entries that share a value.
+
+    Sorted by start; a heap keyed on end holds the intervals still open at
+    the current start, and each new interval overlaps exactly those. Runs
+    in O(n log n + k) for k overlapping pairs.
+    """
+    pairs = []
+    active: List[Tuple[int, int, Interval]] = []
+    for order, interval in enumerate(sorted(intervals)):
+        while active and active[0][0] < interval.start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            if other.entry != interval.entry:
+                pairs.append((other, interval))
+        heapq.heappush(active, (interval.end, order, interval))
+    return pairs
+
+
+def _intervals_by_width(entries: List[dict]) -> Dict[int, List[Interval]]:
+    by_width: Dict[int, List[Interval]] = {}
+    for idx, entry in enumerate(entries):
+        for code in normalize_code_list(entry.get("code")):
+            keys, ranges = split_search_keys([code])
+            for key in keys:
+                by_width.setdefault(len(key), []).append(
+                    Interval(int(key), int(key), idx, code)
+                )
+            for width, start, end in ranges:
+                by_width.setdefault(width, []).append(Interval(start, end, idx, code))
+    return by_width
+
+
+def _label(entries: List[dict], idx: int) -> str:
+    regions = [str(r) for r in entries[idx].get("regions") or [] if str(r).strip()]
+    return f"#{idx + 1} ({regions[0]})" if regions else f"#{idx + 1}"
+
+
+def lint_entries(dataset: str, entries: List[dict]) -> List[Problem]:
+    problems: List[Problem] = []
+
+    def report(severity: str, kind: str, message: str) -> None:
+        problems.append(Problem(dataset, severity, kind, message))
+
+    with_difficulty = []
+    for idx, entry in enumerate(entries):
+        label = _label(entries, idx)
+        codes = normalize_code_list(entry.get("code"))
+        keys, ranges = split_search_keys(codes)
+        if not keys and not ranges:
+            report("error", "no-code", f"{label} har ingen gyldig kode: {entry.get('code')!r}")
+        if not any(str(region).strip() for region in entry.get("regions") or []):
+            report("error", "empty-regions", f"{label} ({codes[:1]}) har ingen regioner")
+        if len(set(codes)) != len(codes):
+            report("warning", "duplicate-in-entry", f"{label} lister samme kode flere ganger")
+
+        difficulty = entry.get("difficulty")
+        if difficulty is not None:
+            with_difficulty.append(idx)
+            # som loader og sampler: store og små bokstaver er det samme
+            if str(difficulty).strip().lower() not in DIFFICULTIES:
+                report(
+                    "error",
+                    "difficulty",
+                    f"{label} har ukjent difficulty {difficulty!r} "
+                    f"(gyldige: {', '.join(DIFFICULTIES)})",
+                )
+    if with_difficulty and len(with_difficulty) != len(entries):
+        has_difficulty = set(with_difficulty)
+        missing = [
+            _label(entries, idx) for idx in range(len(entries)) if idx not in has_difficulty
+        ]
+        report(
+            "warning",
+            "difficulty",
+            f"difficulty mangler på {len(missing)} av {len(entries)} oppføringer: "
+            + ", ".join(missing[:5])
+            + (" …" if len(missing) > 5 else ""),
+        )
+
+    for width, intervals in sorted(_intervals_by_width(entries).items()):
+        for first, second in find_overlaps(intervals):
+            a, b = _label(entries, first.entry), _label(entries, second.entry)
+            if (first.start, first.end) == (second.start, second.end):
+                report("error", "duplicate", f"{first.code!r} finnes i både {a} og {b}")
+                continue
+            low, high = max(first.start, second.start), min(first.end, second.end)
+            shared = str(low).zfill(width)
+            if high != low:
+                shared += f"–{str(high).zfill(width)}"
+            report(
+                "warning",
+                "overlap",
+                f"{first.code!r} i {a} overlapper {second.code!r} i {b} ({shared})",
+            )
+    return problems
+
+
+def lint_file(path: Path) -> List[Problem]:
+    dataset = path.stem
+    try:
+        raw = path.read_bytes()
+    except OSError:
+        return [Problem(dataset, "error", "json", f"fant ikke {path}")]
+    if not raw.strip():
+        # tom plassholder (Brasil, Turkey, USA), som i loader._country_info
+        return []
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return [Problem(dataset, "error", "json", "ugyldig eller tom JSON")]
+    entries = data.get("codes") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        return [Problem(dataset, "error", "json", "mangler listen 'codes'")]
+    return lint_entries(dataset, entries)
+
+
+def lint_all(paths: List[Path], workers: int = LINT_WORKERS) -> List[Problem]:
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths) or 1))) as pool:
+        return [problem for problems in pool.map(lint_file, paths) for problem in problems]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Sjekk datafilene i Telefonnummer/.")
+    parser.add_argument("countries", nargs="*", help="standard: alle datasett")
+    parser.add_argument(
+        "--strict", action="store_true", help="behandle advarsler som feil"
+    )
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.countries:
+        paths = [country_data_path(Path(name).stem) for name in args.countries]
+    else:
+        paths = sorted(data_dir().glob("*.json"))
+    problems = lint_all(paths)
+    elapsed = time.perf_counter() - started
+
+    print(f"--- Lint av {len(paths)} datasett ---")
+    for problem in problems:
+        icon = "❌" if problem.severity == "error" else "⚠️"
+        print(f"  {icon} {problem.dataset}: [{problem.kind}] {problem.message}")
+    errors = sum(1 for p in problems if p.severity == "error")
+    warnings = len(problems) - errors
+    print(f"\n  {errors} feil, {warnings} advarsler på {elapsed * 1000:.1f} ms")
+    return 1 if errors or (args.strict and warnings) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,28 @@
+import hashlib
 import json
+import threading
 from pathlib import Path
 
 
 DEFAULT_DATASET_LABEL = "Telefonkoder"
 
+# Katalog-cache: filsti -> ((størrelse, mtime_ns), landinfo). Bare filer som
+# har endret seg siden forrige kall blir lest og parset på nytt.
+_catalog_lock = threading.Lock()
+_catalog_cache: dict[Path, tuple[tuple[int, int], dict]] = {}
+_catalog_response: tuple[tuple, bytes, str] | None = None
+
 
 def data_dir() -> Path:
     return Path(__file__).resolve().parent.parent / "Telefonnummer"
 
 
+def country_data_path(country_name: str) -> Path:
+    return data_dir() / f"{country_name}.json"
+
+
 def load_country_data(country_name: str):
-    data_path = data_dir() / f"{country_name}.json"
+    data_path = country_data_path(country_name)
     with open(data_path, "r", encoding="utf-8") as f:
         return json.load(f)
 
@@ -31,77 +43,123 @@ def _dataset_label(variant: str, data: dict) -> str:
 
 
 def available_countries():
+    _, countries = _catalog()
+    return [dict(info) for info in countries]
+
+
+def catalog_response() -> tuple[bytes, str]:
+    """
+    Return ``(body, etag)`` for ``/api/countries``.
+
+    The body is the JSON-serialized catalog and the ETag a strong hash of
+    it. Both are reused until a data file is added, removed or changed.
+    """
+    global _catalog_response
+    signature, countries = _catalog()
+    cached = _catalog_response
+    if cached is not None and cached[0] == signature:
+        return cached[1], cached[2]
+
+    body = json.dumps(countries, ensure_ascii=False).encode("utf-8")
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    _catalog_response = (signature, body, etag)
+    return body, etag
+
+
+def _catalog() -> tuple[tuple, list[dict]]:
+    files = sorted(data_dir().glob("*.json"))
+    signatures = []
     countries = []
-    for file in sorted(data_dir().glob("*.json")):
-        try:
-            with open(file, "r", encoding="utf-8") as f:
-                raw = f.read().strip()
-                if not raw:
-                    data = {"country": file.stem, "codes": []}
-                else:
-                    data = json.loads(raw)
-        except json.JSONDecodeError:
-            data = {"country": file.stem, "codes": []}
-
-        codes = data.get("codes") or []
-
-        code_values = []
-        code_lengths = []
-        region_groups = set()
-        difficulty_levels = set()
-
-        for entry in codes:
-            raw_code = entry.get("code")
-            if isinstance(raw_code, list):
-                normalized_codes = [
-                    str(code).strip() for code in raw_code if str(code).strip()
-                ]
-            elif raw_code is None:
-                normalized_codes = []
+    with _catalog_lock:
+        for file in files:
+            try:
+                stamp = file_signature(file)
+            except FileNotFoundError:
+                continue
+            cached = _catalog_cache.get(file)
+            if cached is None or cached[0] != stamp:
+                cached = (stamp, _country_info(file))
+                _catalog_cache[file] = cached
+            signatures.append((file.name, *stamp))
+            countries.append(cached[1])
+        for stale in set(_catalog_cache) - set(files):
+            del _catalog_cache[stale]
+    return tuple(signatures), countries
+
+
+def file_signature(path: Path) -> tuple[int, int]:
+    """(størrelse, mtime_ns) – billig endringsmarkør for en datafil."""
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _country_info(file: Path) -> dict:
+    try:
+        with open(file, "r", encoding="utf-8") as f:
+            raw = f.read().strip()
+            if not raw:
+                data = {"country": file.stem, "codes": []}
             else:
-                normalized_codes = [str(raw_code).strip()]
-
-            code_values.extend(normalized_codes)
-            code_lengths.extend(len(code) for code in normalized_codes if code)
-
-            region_group = entry.get("region_group")
-            if region_group:
-                region_groups.add(region_group)
-
-            difficulty = entry.get("difficulty")
-            if difficulty:
-                difficulty_levels.add(str(difficulty).lower())
-
-        base_name, variant = _parse_variant(file.stem)
-        dataset_label = _dataset_label(variant, data)
-        dataset_display_label = (
-            data.get("dataset_short_label")
-            or data.get("dataset_display_name")
-            or dataset_label
-        )
-        group_label = data.get("country", base_name)
-        is_default = variant == "default"
-        stats_key = (
-            group_label if is_default else f"{group_label} ({dataset_label})"
-        )
-
-        countries.append(
-            {
-                "filename": file.stem,
-                "display_name": group_label if is_default else stats_key,
-                "group_key": base_name,
-                "group_label": group_label,
-                "dataset_label": dataset_label,
-                "dataset_display_label": dataset_display_label,
-                "dataset_variant": variant,
-                "is_default_dataset": is_default,
-                "stats_key": stats_key,
-                "count": len(codes),
-                "code_hint": code_values[0] if code_values else "",
-                "code_length_min": min(code_lengths) if code_lengths else None,
-                "code_length_max": max(code_lengths) if code_lengths else None,
-                "region_groups": sorted(region_groups),
-                "difficulty_levels": sorted(difficulty_levels),
-            }
-        )
-    return countries
+                data = json.loads(raw)
+    except json.JSONDecodeError:
+        data = {"country": file.stem, "codes": []}
+
+    codes = data.get("codes") or []
+
+    code_values = []
+    code_lengths = []
+    region_groups = set()
+    difficulty_levels = set()
+
+    for entry in codes:
+        raw_code = entry.get("code")
+        if isinstance(raw_code, list):
+            normalized_codes = [
+                str(code).strip() for code in raw_code if str(code).strip()
+            ]
+        elif raw_code is None:
+            normalized_codes = []
+        else:
+            normalized_codes = [str(raw_code).strip()]
+
+        code_values.extend(normalized_codes)
+        code_lengths.extend(len(code) for code in normalized_codes if code)
+
+        region_group = entry.get("region_group")
+        if region_group:
+            region_groups.add(region_group)
+
+        difficulty = entry.get("difficulty")
+        if difficulty:
+            difficulty_levels.add(str(difficulty).lower())
+
+    base_name, variant = _parse_variant(file.stem)
+    dataset_label = _dataset_label(variant, data)
+    dataset_display_label = (
+        data.get("dataset_short_label")
+        or data.get("dataset_display_name")
+        or dataset_label
+    )
+    group_label = data.get("country", base_name)
+    is_default = variant == "default"
+    stats_key = (
+        group_label if is_default else f"{group_label} ({dataset_label})"
+    )
+
+    return {
+        "filename": file.stem,
+        "display_name": group_label if is_default else stats_key,
+        "group_key": base_name,
+        "group_label": group_label,
+        "dataset_label": dataset_label,
+        "dataset_display_label": dataset_display_label,
+        "dataset_variant": variant,
+        "is_default_dataset": is_default,
+        "stats_key": stats_key,
+        "count": len(codes),
+        "code_hint": code_values[0] if code_values else "",
+        "code_length_min": min(code_lengths) if code_lengths else None,
+        "code_length_max": max(code_lengths) if code_lengths else None,
+        "region_groups": sorted(region_groups),
+        "difficulty_levels": sorted(difficulty_levels),
+    }
@@ -0,0 +1,416 @@
+"""
+Load generator that plays quiz rounds and lookups against the whole API.
+
+Each virtual player runs in its own thread and keeps picking a scenario
+from the mix:
+
+- ``quiz``: ``/api/countries`` once, then ``QUIZ_ROUNDS`` rounds of
+  ``/api/question`` -> ``/api/answer``. About 60 % of the answers are
+  right, 30 % wrong and 10 % skipped.
+- ``lookup``: ``/api/suggest`` for the first digits, then
+  ``/api/lookup`` for a code from the dataset, a full number or a global
+  ``*`` lookup.
+
+With ``--replay`` the codes and guesses come from the answer log
+(``var/events/``) instead.
+
+Without ``--url`` the app runs in this process through Flask's test
+client, with the answer log pointed at a temporary folder so the real
+stats are left alone. With ``--url`` the requests go over HTTP to a
+running server (``serve.py`` or ``start_dev_server.py``), and its
+answer log gets the test answers.
+
+    python src/loadtest.py run [--url URL] [--concurrency 8] [--duration 10] [--mix quiz=3,lookup=1]
+    python src/loadtest.py ramp [--url URL] [--slo-ms 100] [--percentile 99] [--max 256]
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import http.client
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from code_utils import normalize_code_list
+from event_log import EVENT_LOG_DIR, EventLog, replay
+from loader import available_countries, load_country_data
+
+QUIZ_ROUNDS = 10
+DEFAULT_MIX = {"quiz": 3, "lookup": 1}
+PERCENTILES = (50, 95, 99)
+REPLAY_LIMIT = 100_000
+
+
+class Sample(NamedTuple):
+    endpoint: str
+    seconds: float
+    ok: bool
+
+
+class InProcessClient:
+    def __init__(self):
+        import webapp  # Flask lastes bare i denne modusen
+
+        self._client = webapp.app.test_client()
+
+    def request(self, method: str, path: str, body=None) -> Tuple[int, object]:
+        response = self._client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """One keep-alive connection per virtual player."""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self._host = parts.hostname or "127.0.0.1"
+        self._port = parts.port or 80
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def request(self, method: str, path: str, body=None) -> Tuple[int, object]:
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self._host, self._port, timeout=30)
+            try:
+                self._conn.request(method, path, body=payload, headers=headers)
+                response = self._conn.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                self._conn.close()
+                self._conn = None
+                if attempt == 2:
+                    raise
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+
+
+class Traffic:
+    """Datasets, codes and (with ``--replay``) recorded answers to draw from."""
+
+    def __init__(self, replay_dir: Optional[Path] = None):
+        self.codes: Dict[str, List[str]] = {}
+        for info in available_countries():
+            if not info["count"]:
+                continue
+            codes = [
+                code
+                for entry in load_country_data(info["filename"]).get("codes") or []
+                for code in normalize_code_list(entry.get("code"))
+            ]
+            if codes:
+                self.codes[info["filename"]] = codes
+        self.countries = sorted(self.codes)
+        self.answers: List[Tuple[str, str, str]] = []
+        if replay_dir is not None:
+            for event in replay(replay_dir):
+                if event.get("country") in self.codes and event.get("code"):
+                    self.answers.append((event["country"], str(event["code"]), event.get("guess") or ""))
+                    if len(self.answers) >= REPLAY_LIMIT:
+                        break
+            if not self.answers:
+                raise SystemExit(f"Fant ingen svar å spille av i {replay_dir}.")
+
+
+def _guess(question: dict, rng: random.Random) -> str:
+    roll = rng.random()
+    regions = question.get("regions") or []
+    if roll < 0.6 and regions:
+        return str(rng.choice(regions)).split()[-1]
+    if roll < 0.9:
+        return "feilsvar"
+    return ""
+
+
+def quiz_session(call, traffic: Traffic, rng: random.Random, alive: Callable[[], bool]) -> None:
+    call("GET", "/api/countries", endpoint="/api/countries")
+    country = rng.choice(traffic.countries)
+    for _ in range(QUIZ_ROUNDS):
+        if not alive():
+            return
+        if traffic.answers:
+            country, code, guess = rng.choice(traffic.answers)
+            path = f"/api/question?country={quote(country)}&force_code={quote(code)}"
+            call("GET", path, endpoint="/api/question")
+        else:
+            path = f"/api/question?country={quote(country)}"
+            question = call("GET", path, endpoint="/api/question")
+            if not isinstance(question, dict) or not question.get("id"):
+                continue
+            code, guess = question["id"], _guess(question, rng)
+        call(
+            "POST",
+            "/api/answer",
+            {"country": country, "code": code, "guess": guess},
+            endpoint="/api/answer",
+        )
+
+
+def lookup_session(call, traffic: Traffic, rng: random.Random, alive: Callable[[], bool]) -> None:
+    if traffic.answers:
+        country, code, _ = rng.choice(traffic.answers)
+    else:
+        country = rng.choice(traffic.countries)
+        code = rng.choice(traffic.codes[country])
+    digits = "".join(ch for ch in code if ch.isdigit()) or code
+    call(
+        "GET",
+        f"/api/suggest?country={quote(country)}&q={quote(digits[:2])}",
+        endpoint="/api/suggest",
+    )
+    roll = rng.random()
+    if roll < 0.2:
+        code = digits + "".join(rng.choice("0123456789") for _ in range(5))
+    elif roll < 0.3:
+        country = "*"
+    if alive():
+        call("POST", "/api/lookup", {"country": country, "code": code}, endpoint="/api/lookup")
+
+
+SCENARIOS = {"quiz": quiz_session, "lookup": lookup_session}
+
+
+def run_load(
+    make_client: Callable[[], object],
+    traffic: Traffic,
+    concurrency: int,
+    duration: float,
+    mix: Dict[str, int],
+    think: float = 0.0,
+    seed: int = 0,
+) -> Tuple[List[Sample], float]:
+    """Run ``concurrency`` players for ``duration`` seconds. Returns samples and wall time."""
+    deadline = time.perf_counter() + duration
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results: List[List[Sample]] = []
+    lock = threading.Lock()
+
+    def alive() -> bool:
+        return time.perf_counter() < deadline
+
+    def player(number: int) -> None:
+        client = make_client()
+        rng = random.Random(seed * 100_003 + number)
+        samples: List[Sample] = []
+
+        def call(method, path, body=None, endpoint=""):
+            started = time.perf_counter()
+            try:
+                status, data = client.request(method, path, body)
+            except Exception:
+                status, data = 0, None
+            samples.append(Sample(endpoint, time.perf_counter() - started, status < 500 and status != 0))
+            if think:
+                time.sleep(rng.expovariate(1 / think))
+            return data
+
+        while alive():
+            scenario = SCENARIOS[rng.choices(names, weights)[0]]
+            scenario(call, traffic, rng, alive)
+        with lock:
+            results.append(samples)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=player, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return [sample for samples in results for sample in samples], elapsed
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, dict]:
+    by_endpoint: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample.endpoint, []).append(sample)
+    by_endpoint["totalt"] = samples
+
+    report = {}
+    for endpoint, items in by_endpoint.items():
+        latencies = sorted(sample.seconds * 1000 for sample in items)
+        report[endpoint] = {
+            "count": len(items),
+            "errors": sum(1 for sample in items if not sample.ok),
+            "rps": round(len(items) / elapsed, 1) if elapsed else 0.0,
+            **{f"p{pct}_ms": round(percentile(latencies, pct), 3) for pct in PERCENTILES},
+            "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        }
+    return report
+
+
+def print_report(report: Dict[str, dict]) -> None:
+    print(
+        f"  {'endepunkt':<16} {'antall':>8} {'feil':>6} {'req/s':>9} "
+        + " ".join(f"{f'p{pct} ms':>9}" for pct in PERCENTILES)
+        + f" {'maks ms':>9}"
+    )
+    for endpoint, row in report.items():
+        print(
+            f"  {endpoint:<16} {row['count']:>8} {row['errors']:>6} {row['rps']:>9.1f} "
+            + " ".join(f"{row[f'p{pct}_ms']:>9.2f}" for pct in PERCENTILES)
+            + f" {row['max_ms']:>9.2f}"
+        )
+
+
+def ramp(
+    make_client: Callable[[], object],
+    traffic: Traffic,
+    mix: Dict[str, int],
+    start: int,
+    maximum: int,
+    step_seconds: float,
+    slo_ms: float,
+    pct: int,
+    max_error_rate: float,
+    think: float,
+) -> dict:
+    """
+    Double the number of players from ``start`` until the slowest endpoint's
+    ``pct`` percentile passes ``slo_ms`` or the error rate passes
+    ``max_error_rate``. Returns every step and the last one within the SLO.
+    """
+    steps = []
+    passing = None
+    concurrency = max(1, start)
+    print(f"--- Opptrapping til p{pct} > {slo_ms:g} ms ---")
+    while concurrency <= maximum:
+        samples, elapsed = run_load(make_client, traffic, concurrency, step_seconds, mix, think, seed=concurrency)
+        report = summarize(samples, elapsed)
+        total = report["totalt"]
+        worst = max(
+            ((endpoint, row[f"p{pct}_ms"]) for endpoint, row in report.items() if endpoint != "totalt"),
+            key=lambda item: item[1],
+            default=("-", 0.0),
+        )
+        error_rate = total["errors"] / total["count"] if total["count"] else 1.0
+        ok = worst[1] <= slo_ms and error_rate <= max_error_rate
+        steps.append(
+            {
+                "concurrency": concurrency,
+                "rps": total["rps"],
+                "worst_endpoint": worst[0],
+                f"worst_p{pct}_ms": worst[1],
+                "error_rate": round(error_rate, 4),
+                "ok": ok,
+                "endpoints": report,
+            }
+        )
+        print(
+            f"  {concurrency:>5} spillere {total['rps']:>9.1f} req/s   "
+            f"p{pct} {worst[1]:>8.2f} ms ({worst[0]})   feil {error_rate:6.2%}  "
+            + ("✅" if ok else "❌")
+        )
+        if not ok:
+            break
+        passing = steps[-1]
+        concurrency *= 2
+    if passing is None:
+        print(f"\n  SLO brutt allerede ved {max(1, start)} spillere.")
+    else:
+        print(
+            f"\n  Høyeste nivå innenfor SLO: {passing['concurrency']} spillere, "
+            f"{passing['rps']:.1f} req/s"
+        )
+    return {"slo_ms": slo_ms, "percentile": pct, "steps": steps, "max_passing": passing}
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"ukjent scenario {name!r} (bruk {', '.join(SCENARIOS)})")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Lasttest av API-et med quiz- og oppslagstrafikk.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--url", help="kjørende server, f.eks. http://127.0.0.1:8000 (standard: i prosessen)")
+    common.add_argument("--mix", type=_parse_mix, default=dict(DEFAULT_MIX), help="standard: quiz=3,lookup=1")
+    common.add_argument("--replay", nargs="?", const=EVENT_LOG_DIR, type=Path, metavar="DIR",
+                        help="spill av koder og svar fra svarloggen")
+    common.add_argument("--think-ms", type=float, default=0.0, help="snittpause mellom forespørsler")
+    common.add_argument("--warmup", type=float, default=1.0, help="sekunder som ikke telles")
+    common.add_argument("--json", type=Path, help="skriv resultatet til FILE")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_cmd = sub.add_parser("run", parents=[common], help="fast antall samtidige spillere")
+    run_cmd.add_argument("--concurrency", type=int, default=8)
+    run_cmd.add_argument("--duration", type=float, default=10.0)
+    ramp_cmd = sub.add_parser("ramp", parents=[common], help="doble spillere til SLO-en brytes")
+    ramp_cmd.add_argument("--start", type=int, default=1)
+    ramp_cmd.add_argument("--max", type=int, default=256)
+    ramp_cmd.add_argument("--step-seconds", type=float, default=5.0)
+    ramp_cmd.add_argument("--slo-ms", type=float, default=100.0)
+    ramp_cmd.add_argument("--percentile", type=int, default=99)
+    ramp_cmd.add_argument("--max-errors", type=float, default=0.01, help="høyeste feilandel")
+    args = parser.parse_args(argv)
+
+    traffic = Traffic(args.replay)
+    think = args.think_ms / 1000
+    temporary = None
+    if args.url:
+        make_client = functools.partial(HttpClient, args.url)
+    else:
+        import webapp
+
+        temporary = tempfile.TemporaryDirectory()
+        webapp.answer_log = EventLog(Path(temporary.name))
+        webapp.warmup()
+        webapp.start_background()
+        make_client = InProcessClient
+
+    try:
+        if args.warmup > 0:
+            run_load(make_client, traffic, 2, args.warmup, args.mix, think)
+        if args.command == "run":
+            print(
+                f"--- {args.concurrency} spillere i {args.duration:g} s "
+                f"({'HTTP ' + args.url if args.url else 'i prosessen'}) ---"
+            )
+            samples, elapsed = run_load(
+                make_client, traffic, args.concurrency, args.duration, args.mix, think
+            )
+            result = summarize(samples, elapsed)
+            print_report(result)
+        else:
+            result = ramp(
+                make_client, traffic, args.mix, args.start, args.max, args.step_seconds,
+                args.slo_ms, args.percentile, args.max_errors, think,
+            )
+    finally:
+        if temporary is not None:
+            webapp.answer_log.flush()
+            temporary.cleanup()
+
+    if args.json:
+        args.json.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
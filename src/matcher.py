@@ -0,0 +1,184 @@
+"""Precompiled answer matching for quiz guesses."""
+
+from __future__ import annotations
+
+import re
+import sys
+from typing import Container, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+MIN_ANSWER_LENGTH = 3
+# Grenser for typo-toleranse: gjetninger lengre enn dette sammenlignes bare
+# eksakt, og vi sjekker aldri flere enn MAX_FUZZY_TOKENS ord per svar.
+MAX_FUZZY_ANSWER_LENGTH = 40
+MAX_FUZZY_TOKENS = 64
+MIN_FUZZY_TOKEN_LENGTH = 4
+
+_LATIN_WORD = re.compile(r"[a-zæøå]+")
+_ANY_WORD = re.compile(r"[^\W\d_]+")
+
+# Rekkefølgen bestemmer hva som rapporteres når flere felt treffer.
+ANSWER_FIELDS = (
+    ("region", "regions", _LATIN_WORD),
+    ("city", "primary_cities", _LATIN_WORD),
+    ("alt_name", "alt_names", _ANY_WORD),
+)
+
+
+def normalize(s: str) -> str:
+    return re.sub(r"\s+", " ", s.strip().lower())
+
+
+def name_tokens(name: str, word_pattern=_LATIN_WORD) -> Set[str]:
+    """
+    Answers accepted for one name: its last word and every whole word in it,
+    so "yakutia" matches "Sakha (Yakutia) Republic".
+    """
+    normalized = normalize(name)
+    tokens = set(word_pattern.findall(normalized))
+    tokens.add(normalized.split(" ")[-1])
+    return tokens
+
+
+class AnswerMatch(NamedTuple):
+    matched_on: str
+    match_type: str
+    matched_name: str
+    distance: int = 0
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class AnswerMatcher:
+    """
+    Token sets for one entry's regions, cities and alt_names, built once.
+
+    ``match`` does one dict lookup for an exact answer. Otherwise it falls
+    back to edit distance (with transpositions) of at most 1, or 2 for words
+    of eight letters or more, against a bounded number of words.
+    """
+
+    __slots__ = ("_exact", "_fuzzy")
+
+    def __init__(
+        self,
+        exact: Dict[str, Tuple[str, str]],
+        fuzzy: List[Tuple[str, str, str]],
+    ):
+        self._exact = exact
+        self._fuzzy = fuzzy
+
+    @classmethod
+    def from_entry(cls, entry: dict) -> "AnswerMatcher":
+        exact: Dict[str, Tuple[str, str]] = {}
+        fuzzy: List[Tuple[str, str, str]] = []
+        for kind, field, word_pattern in ANSWER_FIELDS:
+            for name in entry.get(field) or []:
+                for token in sorted(name_tokens(str(name), word_pattern)):
+                    if token in exact:
+                        continue
+                    token = sys.intern(token)
+                    exact[token] = (kind, name)
+                    if (
+                        len(token) >= MIN_FUZZY_TOKEN_LENGTH
+                        and len(fuzzy) < MAX_FUZZY_TOKENS
+                    ):
+                        fuzzy.append((token, kind, name))
+        return cls(exact, fuzzy)
+
+    # pickle (snapshots) beholder ikke sys.intern, så tokenene interneres igjen
+    def __getstate__(self):
+        return self._exact, self._fuzzy
+
+    def __setstate__(self, state):
+        exact, fuzzy = state
+        self._exact = {
+            _intern(token): (_intern(kind), _intern(name))
+            for token, (kind, name) in exact.items()
+        }
+        self._fuzzy = [
+            (_intern(token), _intern(kind), _intern(name)) for token, kind, name in fuzzy
+        ]
+
+    def tokens(self) -> Iterable[str]:
+        return self._exact.keys()
+
+    def match(
+        self,
+        guess: str,
+        fuzzy: bool = True,
+        known_names: Container[str] = frozenset(),
+    ) -> Optional[AnswerMatch]:
+        """
+        Match a guess against this entry. ``known_names`` are exact answers
+        for other entries in the dataset; a guess that is one of them is
+        never accepted as a typo ("omsk" is not a typo of "tomsk").
+        """
+        answer = normalize(guess)
+        if len(answer) < MIN_ANSWER_LENGTH:
+            return None
+
+        hit = self._exact.get(answer)
+        if hit is not None:
+            return AnswerMatch(hit[0], "exact", hit[1])
+
+        if not fuzzy or answer in known_names:
+            return None
+        if not MIN_FUZZY_TOKEN_LENGTH <= len(answer) <= MAX_FUZZY_ANSWER_LENGTH:
+            return None
+
+        best: Optional[AnswerMatch] = None
+        for token, kind, name in self._fuzzy:
+            limit = _fuzzy_limit(token)
+            if best is not None:
+                limit = min(limit, best.distance - 1)
+            if limit < 1:
+                continue
+            distance = bounded_distance(answer, token, limit)
+            if distance is not None:
+                best = AnswerMatch(kind, "fuzzy", name, distance)
+        return best
+
+
+def _fuzzy_limit(token: str) -> int:
+    return 2 if len(token) >= 8 else 1
+
+
+def bounded_distance(a: str, b: str, limit: int) -> Optional[int]:
+    """
+    Optimal string alignment distance between ``a`` and ``b`` if it is at
+    most ``limit``, else ``None``. Only a band of width ``2 * limit + 1``
+    is computed, and it stops as soon as every cell in a row exceeds it.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return None
+    over = limit + 1
+    width = len(b) + 1
+    before: List[int] = []
+    previous = [j if j <= limit else over for j in range(width)]
+    for i in range(1, len(a) + 1):
+        current = [over] * width
+        if i <= limit:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return None
+        before, previous = previous, current
+    distance = previous[-1]
+    return distance if distance <= limit else None
+
+
+def matches_names(user_answer: str, names: Iterable[str]) -> bool:
+    """Exact-only check of one guess against a list of names."""
+    answer = normalize(user_answer)
+    if len(answer) < MIN_ANSWER_LENGTH:
+        return False
+    return any(answer in name_tokens(name) for name in names)
@@ -0,0 +1,181 @@
+"""
+In-process metrics in Prometheus text format, for ``/api/dev/metrics``.
+
+Every thread counts into its own dict, so an increment is a dict update
+without a lock. A scrape sums the dicts of all threads. Whenever a new
+thread registers its dict (and on every scrape), the dicts of finished
+threads are folded into a shared dict and dropped. The per-connection
+threads of the threaded servers thus never pile up, scraped or not.
+
+With ``serve.py`` each worker process has its own counts, and a scrape
+sees only the worker that answered it.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import weakref
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Tuple
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+BUILD_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Metric(NamedTuple):
+    kind: str  # "counter", "gauge" eller "histogram"
+    help: str
+    labels: Tuple[str, ...] = ()
+    buckets: Tuple[float, ...] = ()
+
+
+METRICS: Dict[str, Metric] = {
+    "geo_http_requests_total": Metric(
+        "counter", "Ferdige forespørsler.", ("endpoint", "status")
+    ),
+    "geo_http_request_duration_seconds": Metric(
+        "histogram", "Tid per forespørsel.", ("endpoint",), LATENCY_BUCKETS
+    ),
+    "geo_http_requests_in_flight": Metric(
+        "gauge", "Forespørsler som behandles nå.", ("endpoint",)
+    ),
+    "geo_bundle_requests_total": Metric(
+        "counter", "Oppslag i DatasetStore (hit = ferdig bygget).", ("result",)
+    ),
+    "geo_bundle_builds_total": Metric(
+        "counter", "Bygde datasett (første gang og etter endringer).", ("dataset",)
+    ),
+    "geo_bundle_build_duration_seconds": Metric(
+        "histogram", "Tid per bygging av et datasett.", ("dataset",), BUILD_BUCKETS
+    ),
+    "geo_answer_matches_total": Metric(
+        "counter", "Vurderte svar etter hva som matchet.", ("country", "match_type")
+    ),
+}
+
+class Registry:
+    def __init__(self, metrics: Dict[str, Metric] = METRICS):
+        self.metrics = metrics
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+        _registries.add(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_finished()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_finished(self) -> None:
+        """Fold the dicts of finished threads into ``_retired``. Hold ``_lock``."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._retired, shard)
+        self._shards = live
+
+    def inc(self, name: str, labels: Tuple[str, ...] = (), value: float = 1) -> None:
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name: str, labels: Tuple[str, ...], value: float) -> None:
+        """Add ``value`` to a histogram: ``[per-bucket counts..., +Inf, sum]``."""
+        shard = self._shard()
+        key = (name, labels)
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.metrics[name].buckets) + 2)
+        counts[bisect_left(self.metrics[name].buckets, value)] += 1
+        counts[-1] += value
+
+    def snapshot(self) -> dict:
+        """Sum over all threads; finished threads are folded in for good."""
+        with self._lock:
+            self._retire_finished()
+            total: dict = {}
+            _merge(total, self._retired)
+            for _, shard in self._shards:
+                _merge(total, shard.copy())
+        return total
+
+    def render(self) -> str:
+        values = self.snapshot()
+        by_name: Dict[str, List[Tuple[Tuple[str, ...], object]]] = {}
+        for (name, labels), value in values.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(by_name.get(name, []), key=lambda item: item[0]):
+                pairs = list(zip(metric.labels, labels))
+                if metric.kind != "histogram":
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), value):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(
+                        f"{name}_bucket{_labels(pairs + [('le', le)])} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(target: dict, source: dict) -> None:
+    for key, value in source.items():
+        current = target.get(key)
+        if current is None:
+            target[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                current[index] += item
+        else:
+            target[key] = current + value
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+_registries: "weakref.WeakSet[Registry]" = weakref.WeakSet()
+
+
+def _after_fork_in_child() -> None:
+    # en tråd i forelderen kan holde låsen idet den forker
+    for registry in list(_registries):
+        registry._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+REGISTRY = Registry()
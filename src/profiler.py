@@ -0,0 +1,179 @@
+"""
+Opt-in cProfile of single requests.
+
+When ``app.config["PROFILING"]`` is on, a request with the header
+``X-Profile: 1`` or the query parameter ``profile=1`` runs under
+``cProfile``. The result is written to ``var/profiles/`` as a ``.prof``
+file, which ``python -m pstats`` or snakeviz can open. Next to it goes a
+``.json`` summary with the top functions. Only the newest
+``MAX_PROFILES`` are kept. Only one request per process is profiled at a
+time; a request that asks while another is running gets
+``X-Profile: busy`` and runs normally.
+
+    python src/profiler.py list
+    python src/profiler.py show <navn> [--sort cumulative] [--limit 30]
+"""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PROFILE_DIR = PROJECT_ROOT / "var" / "profiles"
+MAX_PROFILES = 50
+TOP_FUNCTIONS = 15
+SORT_KEYS = ("tottime", "cumulative")
+
+
+class Profile:
+    def __init__(self, name: str, label: str):
+        self.name = name
+        self.label = label
+        self.started = time.time()
+        self._clock = time.perf_counter()
+        self.profile = cProfile.Profile()
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._clock) * 1000
+
+
+class RequestProfiler:
+    def __init__(self, directory: Path = PROFILE_DIR, keep: int = MAX_PROFILES):
+        self.directory = directory
+        self.keep = keep
+        self._busy = threading.Lock()
+        self._serial = itertools.count(1)
+
+    def start(self, label: str) -> Optional[Profile]:
+        """Start profiling the calling thread, or ``None`` if one is running."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        now = time.time()
+        name = (
+            f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}"
+            f".{int(now * 1000) % 1000:03d}-{os.getpid()}-{next(self._serial)}-{_slug(label)}"
+        )
+        profile = Profile(name, label)
+        try:
+            profile.profile.enable()
+        except ValueError:
+            # en annen profiler (f.eks. en debugger) er allerede aktiv
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile: Profile, **meta) -> dict:
+        profile.profile.disable()
+        elapsed_ms = profile.elapsed_ms
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profile.profile.dump_stats(self.directory / f"{profile.name}.prof")
+            summary = {
+                "name": profile.name,
+                "label": profile.label,
+                "started": profile.started,
+                "elapsed_ms": round(elapsed_ms, 3),
+                **meta,
+                "top": top_functions(pstats.Stats(profile.profile), "tottime"),
+            }
+            (self.directory / f"{profile.name}.json").write_text(
+                json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+            self._rotate()
+        finally:
+            self._busy.release()
+        return summary
+
+    def recent(self, limit: int = 20) -> List[dict]:
+        summaries = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True)[:limit]:
+            try:
+                summaries.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return summaries
+
+    def path(self, name: str) -> Optional[Path]:
+        path = self.directory / f"{name}.prof"
+        if path.parent != self.directory or not path.is_file():
+            return None
+        return path
+
+    def _rotate(self) -> None:
+        for path in sorted(self.directory.glob("*.json"), reverse=True)[self.keep :]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".prof").unlink(missing_ok=True)
+
+
+def top_functions(stats: pstats.Stats, sort: str, limit: int = TOP_FUNCTIONS) -> List[dict]:
+    index = 2 if sort == "tottime" else 3
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)
+    return [
+        {
+            "function": _function_label(func),
+            "calls": calls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for func, (_, calls, tottime, cumtime, _) in rows[:limit]
+    ]
+
+
+def _function_label(func) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name  # innebygd, f.eks. <built-in method builtins.sorted>
+    try:
+        filename = str(Path(filename).relative_to(PROJECT_ROOT))
+    except ValueError:
+        filename = Path(filename).name
+    return f"{filename}:{line}({name})"
+
+
+def _slug(label: str) -> str:
+    return "".join(ch if ch.isalnum() else "_" for ch in label)[:40].strip("_") or "request"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Vis profiler fra var/profiles/.")
+    parser.add_argument("--dir", type=Path, default=PROFILE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="nyeste profiler med tid og tregeste funksjon")
+    show = sub.add_parser("show", help="toppfunksjoner for én profil")
+    show.add_argument("name")
+    show.add_argument("--sort", choices=SORT_KEYS, default="tottime")
+    show.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    profiler = RequestProfiler(args.dir)
+    if args.command == "list":
+        for summary in profiler.recent():
+            top = summary["top"][0]["function"] if summary["top"] else "-"
+            print(f"  {summary['name']:<50} {summary['elapsed_ms']:>9.1f} ms  {top}")
+        return 0
+
+    path = profiler.path(args.name)
+    if path is None:
+        print(f"Fant ikke profilen {args.name}.")
+        return 1
+    for row in top_functions(pstats.Stats(str(path)), args.sort, args.limit):
+        print(
+            f"  {row['tottime_ms']:>10.3f} {row['cumtime_ms']:>10.3f} "
+            f"{row['calls']:>8}  {row['function']}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import random
-import re
 import sys
 from loader import load_country_data, available_countries
+from matcher import matches_names, normalize
 
 
 QUIT_COMMANDS = {"q", "quit", "exit"}
@@ -12,33 +12,8 @@ class ChangeCountryRequest(Exception):
     """Raised when the player wants to switch to another country."""
 
 
-def normalize(s: str) -> str:
-    return re.sub(r"\s+", " ", s.strip().lower())
-
-
 def matches_any(user_answer, correct_list):
-    ua = normalize(user_answer)
-
-    if ua == "":
-        return False
-    
-    if len(ua) < 3:
-        return False
-
-    for item in correct_list:
-        ci = normalize(item)
-
-        last_word = ci.split(" ")[-1]
-        if ua == last_word:
-            return True
-
-        # 3. eksakt likt et helt ord inni navnet
-        #    "yakutia" skal funke for "sakha (yakutia) republic"
-        words = re.findall(r"[a-zæøå]+", ci)
-        if ua in words:
-            return True
-
-    return False
+    return matches_names(user_answer, correct_list)
 
 
 def handle_control(user_input, allow_change=True):
@@ -0,0 +1,189 @@
+"""
+Server-side resolution of region images to URLs that are known to exist.
+
+Every dataset looks for its maps in ``static/maps/<dataset>/`` and then in
+the folder of its base country (``SouthAfrica-roads`` falls back to
+``SouthAfrica``). The expected filenames come from an entry's ``images``
+field, or from slugs of its region names. Instead of letting the browser
+try each folder in turn, the server lists each folder once and returns the
+URL that exists, with its size and the ``srcset`` of the variants from
+``python src/images.py build``.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from images import ImageManifest, image_size
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MAPS_DIR = PROJECT_ROOT / "static" / "maps"
+MAPS_URL = "/static/maps"
+VARIANTS_URL = "/static/map-variants"
+# Hvor lenge (sekunder) en mappeoppføring brukes før mappene stattes igjen.
+RECHECK_SECONDS = 1.0
+
+
+def _region_to_filename(region_name: str) -> str:
+    """Lager forventet bildefilnavn fra et regionnavn."""
+    name = region_name.lower()
+    name = re.sub(r"[()\s,.'-]+", "_", name)
+    name = re.sub(r"_+", "_", name)
+    name = re.sub(r"^_+|_+$", "", name)
+    return f"{name}.png" if name else ""
+
+
+def _normalize_image_name(value: str) -> str:
+    """Trim + legg til .png dersom brukeren bare har gitt et slug."""
+    if not value:
+        return ""
+    trimmed = value.strip()
+    if not trimmed:
+        return ""
+    if _is_url(trimmed):
+        return trimmed
+    if re.search(r"\.[a-z0-9]{2,4}$", trimmed, re.IGNORECASE):
+        return trimmed
+    return f"{trimmed}.png"
+
+
+def _is_url(value: str) -> bool:
+    return value.startswith("/") or re.match(r"https?://", value, re.IGNORECASE) is not None
+
+
+def gather_image_candidates(entry: dict) -> List[str]:
+    """
+    Returnerer alle filnavn vi forventer for en kode.
+    1) Bruk eksplisitt `images` hvis satt.
+    2) Ellers: slug alle regionnavn (kan være >1).
+    """
+    images = entry.get("images") or []
+    if images:
+        names = (_normalize_image_name(str(img)) for img in images)
+    else:
+        names = (_region_to_filename(str(region)) for region in entry.get("regions") or [])
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def image_folders(dataset: str) -> List[str]:
+    base = dataset.split("-", 1)[0]
+    return [dataset] if base == dataset else [dataset, base]
+
+
+class DatasetImages:
+    """Filename -> resolved image for one dataset, from one listing per folder."""
+
+    def __init__(self, dataset: str, maps_dir: Path, variants: Dict[str, dict]):
+        self.dataset = dataset
+        self._files: Dict[str, dict] = {}
+        for folder in image_folders(dataset):
+            for name, path in _list_images(maps_dir / folder):
+                if name in self._files:
+                    continue
+                image = _describe(f"{folder}/{name}", path, variants)
+                if image is not None:
+                    self._files[name] = image
+
+    def resolve(self, names: List[str], regions: List[str]) -> List[dict]:
+        images = []
+        for index, name in enumerate(names):
+            if _is_url(name):
+                image = {"url": name, "width": None, "height": None}
+            else:
+                image = self._files.get(name)
+                if image is None:
+                    continue
+            alt = regions[index] if index < len(regions) else (regions[0] if regions else "")
+            images.append({**image, "alt": alt or "Region"})
+        return images
+
+
+def _list_images(folder: Path) -> List[Tuple[str, Path]]:
+    try:
+        with os.scandir(folder) as it:
+            return sorted(
+                (item.name, Path(item.path)) for item in it if item.is_file()
+            )
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _describe(relative: str, path: Path, variants: Dict[str, dict]) -> Optional[dict]:
+    record = variants.get(relative)
+    if record is not None and record.get("variants"):
+        size = (record["width"], record["height"])
+    else:
+        record = None
+        size = image_size(path)
+    if size is None:
+        # ikke et bilde nettleseren kan vise (f.eks. en lagret HTML-side)
+        return None
+
+    image = {"url": f"{MAPS_URL}/{relative}", "width": size[0], "height": size[1]}
+    if record is not None:
+        fallback = [v for v in record["variants"] if v["format"] == record["format"]]
+        webp = [v for v in record["variants"] if v["format"] == "webp"]
+        image["srcset"] = _srcset(fallback, extra=(image["url"], size[0]))
+        image["webp_srcset"] = _srcset(webp)
+    return image
+
+
+def _srcset(variants: List[dict], extra: Optional[Tuple[str, int]] = None) -> str:
+    items = [(f"{VARIANTS_URL}/{v['file']}", v["width"]) for v in variants]
+    if extra is not None:
+        items.append(extra)
+    return ", ".join(f"{url} {width}w" for url, width in sorted(items, key=lambda i: i[1]))
+
+
+class RegionImages:
+    """
+    Per-dataset :class:`DatasetImages`, rebuilt when a map folder or the
+    variant manifest changes. Folders are checked at most once per
+    ``RECHECK_SECONDS``, so resolving images adds no filesystem calls to
+    most requests.
+    """
+
+    def __init__(self, variants: ImageManifest, maps_dir: Path = MAPS_DIR):
+        self.maps_dir = maps_dir
+        self.variants = variants
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[tuple, float, DatasetImages]] = {}
+
+    def for_entry(self, dataset: str, entry: dict) -> List[dict]:
+        names = entry.get("_images")
+        if names is None:
+            names = gather_image_candidates(entry)
+        if not names:
+            return []
+        return self.get(dataset).resolve(names, entry.get("regions") or [])
+
+    def get(self, dataset: str) -> DatasetImages:
+        now = time.monotonic()
+        cached = self._cache.get(dataset)
+        if cached is not None and now - cached[1] < RECHECK_SECONDS:
+            return cached[2]
+
+        variants = self.variants.images()
+        signature = (variants, *self._folder_signature(dataset))
+        with self._lock:
+            cached = self._cache.get(dataset)
+            if cached is not None and cached[0] == signature:
+                images = cached[2]
+            else:
+                images = DatasetImages(dataset, self.maps_dir, variants)
+            self._cache[dataset] = (signature, now, images)
+        return images
+
+    def _folder_signature(self, dataset: str) -> List[Optional[int]]:
+        signature = []
+        for folder in image_folders(dataset):
+            try:
+                signature.append((self.maps_dir / folder).stat().st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return signature
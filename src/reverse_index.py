@@ -0,0 +1,95 @@
+"""Inverted index from place names to entries (reverse lookup)."""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Sequence, Set, Tuple
+
+from matcher import normalize
+
+DEFAULT_REVERSE_RESULTS = 10
+
+_WORD = re.compile(r"[^\W_]+")
+_NAME_FIELDS = ("primary_cities", "regions", "alt_names")
+
+
+def name_words(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+
+class ReverseIndex:
+    """
+    Posting lists from normalized name words to entry indices.
+
+    A query is split into words and their posting lists are intersected,
+    shortest first. If no entry has every word, entries are ranked by how
+    many of the words they contain. An entry with a name equal to the whole
+    query ranks first.
+    """
+
+    def __init__(self, entries: Sequence[dict]):
+        self.entries = entries
+        postings: Dict[str, List[int]] = {}
+        full_names: Dict[str, List[int]] = {}
+        for idx, entry in enumerate(entries):
+            for field in _NAME_FIELDS:
+                for name in entry.get(field) or []:
+                    words = name_words(str(name))
+                    key = " ".join(words)
+                    if key:
+                        _append_once(full_names.setdefault(key, []), idx)
+                    for word in words:
+                        _append_once(postings.setdefault(word, []), idx)
+        self._postings = {word: tuple(idxs) for word, idxs in postings.items()}
+        self._full_names = {key: frozenset(idxs) for key, idxs in full_names.items()}
+
+    def search(self, query: str, limit: int = DEFAULT_REVERSE_RESULTS) -> List[dict]:
+        words = list(dict.fromkeys(name_words(query)))
+        if not words:
+            return []
+
+        lists = sorted(
+            (self._postings.get(word, ()) for word in words), key=len
+        )
+        exact = self._full_names.get(" ".join(words), frozenset())
+
+        ranked: List[Tuple[int, int, int]]
+        if lists[0]:
+            common: Set[int] = set(lists[0])
+            for posting in lists[1:]:
+                common.intersection_update(posting)
+                if not common:
+                    break
+        else:
+            common = set()
+
+        if common:
+            ranked = [(len(words), idx in exact, idx) for idx in common]
+        else:
+            counts: Dict[int, int] = {}
+            for posting in lists:
+                for idx in posting:
+                    counts[idx] = counts.get(idx, 0) + 1
+            ranked = [(count, idx in exact, idx) for idx, count in counts.items()]
+
+        ranked.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [
+            self._describe(idx, matched, len(words))
+            for matched, _, idx in ranked[: max(1, limit)]
+        ]
+
+    def _describe(self, idx: int, matched: int, total: int) -> dict:
+        entry = self.entries[idx]
+        return {
+            "codes": list(entry.get("_codes") or []),
+            "primary_cities": entry.get("primary_cities", []),
+            "regions": entry.get("regions", []),
+            "alt_names": entry.get("alt_names", []),
+            "matched_words": matched,
+            "query_words": total,
+        }
+
+
+def _append_once(bucket: List[int], idx: int) -> None:
+    if not bucket or bucket[-1] != idx:
+        bucket.append(idx)
@@ -0,0 +1,164 @@
+"""Constant-time question selection over precomputed facet buckets."""
+
+from __future__ import annotations
+
+import math
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Innebygde vektprofiler: felt -> {verdi: vekt}. Ukjente verdier får vekt 1.
+WEIGHT_PROFILES: Dict[str, Dict[str, float]] = {
+    "population_rank": {"high": 3.0, "medium": 2.0, "low": 1.0},
+}
+MAX_CACHED_TABLES = 256
+
+FacetKey = Tuple[Optional[str], Optional[str]]
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, O(1) per weighted draw."""
+
+    __slots__ = ("items", "prob", "alias")
+
+    def __init__(self, items: Sequence[int], weights: Sequence[float]):
+        count = len(items)
+        total = sum(weights)
+        scaled = [weight * count / total for weight in weights]
+        prob = [1.0] * count
+        alias = list(range(count))
+        small = [idx for idx, value in enumerate(scaled) if value < 1.0]
+        large = [idx for idx, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        self.items = tuple(items)
+        self.prob = prob
+        self.alias = alias
+
+    def sample(self, rng=random) -> int:
+        slot = rng.randrange(len(self.items))
+        if rng.random() >= self.prob[slot]:
+            slot = self.alias[slot]
+        return self.items[slot]
+
+
+def parse_weight_profile(spec: str) -> Tuple[Tuple[str, float], ...]:
+    """Parse ``"high:5,medium:2,low:1"`` into a hashable profile."""
+    profile = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        value, sep, weight = part.partition(":")
+        if not sep:
+            raise ValueError(f"Mangler vekt for {value.strip()!r}.")
+        number = float(weight)
+        if not math.isfinite(number) or number < 0:
+            raise ValueError(f"Ugyldig vekt {weight.strip()!r}.")
+        profile[value.strip().lower()] = number
+    return tuple(sorted(profile.items()))
+
+
+def _facet_value(entry: dict, field: str) -> str:
+    return str(entry.get(field) or "").strip().lower()
+
+
+class QuestionSampler:
+    """
+    Pick entries by (difficulty, region_group) without scanning the dataset.
+
+    Entry indices are bucketed once for every combination of the two facets,
+    with ``None`` meaning "any". Lookups apply the same fallback as before:
+    a filter that matches nothing is ignored. Weighted draws use alias tables
+    that are built once per bucket and profile.
+    """
+
+    def __init__(self, entries: Sequence[dict]):
+        self.entries = entries
+        buckets: Dict[FacetKey, List[int]] = {}
+        for idx, entry in enumerate(entries):
+            difficulty = _facet_value(entry, "difficulty")
+            group = _facet_value(entry, "region_group")
+            for key in (
+                (None, None),
+                (difficulty, None),
+                (None, group),
+                (difficulty, group),
+            ):
+                buckets.setdefault(key, []).append(idx)
+        self._buckets: Dict[FacetKey, Tuple[int, ...]] = {
+            key: tuple(idxs) for key, idxs in buckets.items()
+        }
+        # Tabeller for de innebygde profilene bygges nå og beholdes;
+        # klientprofiler bygges ved første bruk og holdes i en begrenset cache.
+        self._tables: Dict[tuple, Optional[AliasTable]] = {
+            (key, field, None): self._build_table(key, field, None)
+            for field in WEIGHT_PROFILES
+            for key in self._buckets
+        }
+        self._custom_tables: Dict[tuple, Optional[AliasTable]] = {}
+
+    def bucket_key(
+        self, difficulty: str | None = None, region_group: str | None = None
+    ) -> FacetKey:
+        wanted_difficulty = difficulty.strip().lower() if difficulty else None
+        wanted_group = region_group.strip().lower() if region_group else None
+        if (wanted_difficulty, None) not in self._buckets:
+            wanted_difficulty = None
+        if (wanted_difficulty, wanted_group) not in self._buckets:
+            wanted_group = None
+        return wanted_difficulty, wanted_group
+
+    def pick(
+        self,
+        difficulty: str | None = None,
+        region_group: str | None = None,
+        weight_by: str | None = None,
+        weights: Tuple[Tuple[str, float], ...] | None = None,
+        rng=random,
+    ) -> Optional[dict]:
+        key = self.bucket_key(difficulty, region_group)
+        bucket = self._buckets.get(key)
+        if not bucket:
+            return None
+
+        table = None
+        if weight_by:
+            table = self._alias_table(key, weight_by, weights)
+        if table is None:
+            return self.entries[bucket[rng.randrange(len(bucket))]]
+        return self.entries[table.sample(rng)]
+
+    def _alias_table(
+        self, key: FacetKey, field: str, weights: Tuple[Tuple[str, float], ...] | None
+    ) -> Optional[AliasTable]:
+        cache_key = (key, field, weights)
+        if cache_key in self._tables:
+            return self._tables[cache_key]
+        if cache_key in self._custom_tables:
+            return self._custom_tables[cache_key]
+
+        table = self._build_table(key, field, weights)
+        if len(self._custom_tables) >= MAX_CACHED_TABLES:
+            self._custom_tables.pop(next(iter(self._custom_tables)), None)
+        self._custom_tables[cache_key] = table
+        return table
+
+    def _build_table(
+        self, key: FacetKey, field: str, weights: Tuple[Tuple[str, float], ...] | None
+    ) -> Optional[AliasTable]:
+        profile = dict(weights) if weights else WEIGHT_PROFILES.get(field)
+        if not profile:
+            return None
+        bucket = self._buckets[key]
+        bucket_weights = [
+            profile.get(_facet_value(self.entries[idx], field), 1.0)
+            for idx in bucket
+        ]
+        if not any(bucket_weights):
+            return None
+        return AliasTable(bucket, bucket_weights)
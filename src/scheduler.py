@@ -0,0 +1,321 @@
+"""
+Server-side spaced repetition (SM-2 style) with one due-queue per learner.
+
+Each learner has, per dataset, a heap of ``(due, version, code)``. The
+next question is the top of the heap when it is due, popped in
+O(log n); answering pushes the card back with its new due time. Old heap
+items are skipped lazily by comparing versions, so nothing is ever
+removed from the middle of a heap.
+
+SQLite is the source of truth. An answer is reviewed in memory right away
+(for the response and this process's heap), and the review itself, not
+the resulting card, is queued on a :class:`WriteBehind`. Once a second a
+background thread applies the queued reviews in one ``BEGIN IMMEDIATE``
+transaction: each card row is read inside it, reviewed, and written back
+only if its ``updated`` is still what was read (compare-and-set). Reviews
+of one card from several ``serve.py`` workers are therefore all applied,
+one after the other, to the latest stored state.
+
+A learner is loaded from SQLite on first use, and the writer thread drops
+it from memory after ``IDLE_SECONDS`` without activity once its reviews
+are written. Each process caches its own decks, so a card is re-read by
+primary key before it is reviewed or handed out; a card added by another
+worker shows up here when the deck is loaded again.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from write_behind import WriteBehind
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+DAY = 86400.0
+# Et feil svar kommer tilbake i samme økt i stedet for om en dag.
+RELEARN_SECONDS = 60.0
+# En kode som er hentet men ikke besvart, kan komme igjen etter dette.
+REQUEUE_SECONDS = 30.0
+IDLE_SECONDS = 600.0
+FLUSH_SECONDS = 1.0
+MAX_LEARNER_ID = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    learner TEXT NOT NULL,
+    country TEXT NOT NULL,
+    code TEXT NOT NULL,
+    ease REAL NOT NULL,
+    interval REAL NOT NULL,
+    repetitions INTEGER NOT NULL,
+    lapses INTEGER NOT NULL,
+    due REAL NOT NULL,
+    updated REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (learner, country, code)
+)
+"""
+_COLUMNS = "code, ease, interval, repetitions, lapses, due, updated"
+
+
+@dataclass
+class Card:
+    code: str
+    ease: float = DEFAULT_EASE
+    interval: float = 0.0  # sekunder
+    repetitions: int = 0
+    lapses: int = 0
+    due: float = 0.0
+    updated: float = 0.0  # tidspunktet for siste vurdering
+    version: int = 0
+
+    def review(self, quality: int, now: float) -> None:
+        """SM-2: ``quality`` 0-5, where 3 and above counts as remembered."""
+        if quality < 3:
+            self.repetitions = 0
+            self.lapses += 1
+            self.interval = RELEARN_SECONDS
+        else:
+            if self.repetitions == 0:
+                self.interval = DAY
+            elif self.repetitions == 1:
+                self.interval = 6 * DAY
+            else:
+                self.interval = max(DAY, self.interval) * self.ease
+            self.repetitions += 1
+        self.ease = max(
+            MIN_EASE, self.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+        )
+        self.due = now + self.interval
+        self.updated = now
+        self.version += 1
+
+    def adopt(self, row: tuple) -> bool:
+        """
+        Take the database row (``_COLUMNS``) unless this card has a review
+        that is not written yet; True if anything changed.
+        """
+        stored = (self.ease, self.interval, self.repetitions, self.lapses, self.due, self.updated)
+        if row[6] < self.updated or tuple(row[1:]) == stored:
+            return False
+        _, self.ease, self.interval, self.repetitions, self.lapses, self.due, self.updated = row
+        self.version += 1
+        return True
+
+    def as_row(self, learner: str, country: str) -> tuple:
+        return (learner, country, self.code, self.ease, self.interval,
+                self.repetitions, self.lapses, self.due, self.updated)
+
+    def describe(self) -> dict:
+        return {
+            "code": self.code,
+            "due": self.due,
+            "interval_seconds": round(self.interval, 3),
+            "ease": round(self.ease, 3),
+            "repetitions": self.repetitions,
+            "lapses": self.lapses,
+        }
+
+
+@dataclass
+class Deck:
+    cards: Dict[str, Card] = field(default_factory=dict)
+    heap: List[Tuple[float, int, str]] = field(default_factory=list)
+    touched: float = 0.0
+
+    def push(self, card: Card) -> None:
+        heapq.heappush(self.heap, (card.due, card.version, card.code))
+
+    def pop_due(self, now: float) -> Optional[Card]:
+        while self.heap:
+            due, version, code = self.heap[0]
+            card = self.cards.get(code)
+            if card is None or card.version != version:
+                heapq.heappop(self.heap)  # utdatert element
+                continue
+            if due > now:
+                return None
+            heapq.heappop(self.heap)
+            return card
+        return None
+
+
+def answer_quality(correct: bool, match_type: Optional[str], skipped: bool) -> int:
+    if skipped:
+        return 0
+    if not correct:
+        return 1
+    return 5 if match_type == "exact" else 4
+
+
+def valid_learner(learner) -> bool:
+    return isinstance(learner, str) and 0 < len(learner) <= MAX_LEARNER_ID and all(
+        ch.isalnum() or ch in "-_" for ch in learner
+    )
+
+
+class Scheduler:
+    def __init__(self, path: Path, flush_interval: float = FLUSH_SECONDS):
+        self.path = path
+        self._decks: Dict[Tuple[str, str], Deck] = {}
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._reader: Optional[sqlite3.Connection] = None
+        self._reader_pid: Optional[int] = None
+        self._serial = itertools.count()
+        self._writer = WriteBehind(
+            self._write,
+            interval=flush_interval,
+            name="scheduler-writer",
+            tick=self._evict_idle,
+        )
+
+    def next_due(self, learner: str, country: str, now: float | None = None) -> Optional[Card]:
+        """Pop the learner's most overdue card, or ``None`` if nothing is due."""
+        now = time.time() if now is None else now
+        with self._lock:
+            deck = self._deck(learner, country, now)
+            while True:
+                card = deck.pop_due(now)
+                if card is None:
+                    return None
+                if self._refresh(learner, country, card) and card.due > now:
+                    # en annen arbeider har vurdert den siden vi leste kortstokken
+                    deck.push(card)
+                    continue
+                # Blir den ikke besvart, kommer den tilbake litt senere.
+                card.due = now + REQUEUE_SECONDS
+                card.version += 1
+                deck.push(card)
+                return card
+
+    def record(
+        self, learner: str, country: str, code: str, quality: int, now: float | None = None
+    ) -> Card:
+        now = time.time() if now is None else now
+        with self._lock:
+            deck = self._deck(learner, country, now)
+            card = deck.cards.get(code)
+            if card is None:
+                card = deck.cards[code] = Card(code)
+            self._refresh(learner, country, card)
+            card.review(quality, now)
+            deck.push(card)
+            # hver vurdering for seg, så ingen slås sammen før de er lagret
+            self._writer.put(
+                (learner, country, code, quality, now),
+                key=(learner, country, code, next(self._serial)),
+            )
+            return card
+
+    def flush(self) -> int:
+        return self._writer.flush_now()
+
+    def _deck(self, learner: str, country: str, now: float) -> Deck:
+        key = (learner, country)
+        deck = self._decks.get(key)
+        if deck is None:
+            self._writer.start()  # evicter ledige kortstokker, også uten svar
+            deck = self._decks[key] = self._read_deck(learner, country)
+        deck.touched = now
+        return deck
+
+    def _refresh(self, learner: str, country: str, card: Card) -> bool:
+        """Re-read ``card`` from SQLite; True if another process had a newer review."""
+        row = self._read_conn().execute(
+            f"SELECT {_COLUMNS} FROM cards WHERE learner = ? AND country = ? AND code = ?",
+            (learner, country, card.code),
+        ).fetchone()
+        return row is not None and card.adopt(row)
+
+    def _evict_idle(self, now: float | None = None) -> None:
+        """Runs on the writer thread, right after a flush."""
+        now = time.time() if now is None else now
+        with self._lock:
+            # kort som fortsatt venter på å bli skrevet, må ikke glemmes
+            unsaved = {(learner, country) for learner, country, *_ in self._writer.pending_keys()}
+            idle = [
+                key
+                for key, deck in self._decks.items()
+                if now - deck.touched > IDLE_SECONDS and key not in unsaved
+            ]
+            for key in idle:
+                del self._decks[key]
+
+    def _connect(self, shared: bool = False) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=not shared)
+        # WAL + NORMAL: en commit venter ikke på fsync av hele databasen.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cards)")}
+            if "updated" not in columns:  # databaser fra før kolonnen fantes
+                conn.execute("ALTER TABLE cards ADD COLUMN updated REAL NOT NULL DEFAULT 0")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _read_conn(self) -> sqlite3.Connection:
+        # Brukes bare med self._lock holdt. En tilkobling overlever ikke fork.
+        if self._reader_pid != os.getpid():
+            self._reader = self._connect(shared=True)
+            self._reader_pid = os.getpid()
+        return self._reader
+
+    def _read_deck(self, learner: str, country: str) -> Deck:
+        deck = Deck()
+        rows = self._read_conn().execute(
+            f"SELECT {_COLUMNS} FROM cards WHERE learner = ? AND country = ?",
+            (learner, country),
+        ).fetchall()
+        for row in rows:
+            card = deck.cards[row[0]] = Card(*row)
+            deck.push(card)
+        return deck
+
+    def _write(self, reviews: List[tuple]) -> None:
+        """Apply ``(learner, country, code, quality, now)`` reviews to the stored cards."""
+        with closing(self._connect()) as conn:
+            # skrivelåsen tas før første lesing, så ingen annen prosess kan
+            # endre et kort mellom SELECT og UPDATE
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for learner, country, code, quality, now in sorted(reviews, key=lambda r: r[4]):
+                    _apply_review(conn, learner, country, code, quality, now)
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+
+def _apply_review(
+    conn: sqlite3.Connection, learner: str, country: str, code: str, quality: int, now: float
+) -> None:
+    row = conn.execute(
+        f"SELECT {_COLUMNS} FROM cards WHERE learner = ? AND country = ? AND code = ?",
+        (learner, country, code),
+    ).fetchone()
+    card = Card(*row) if row is not None else Card(code)
+    card.review(quality, now)
+    if row is None:
+        conn.execute("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", card.as_row(learner, country))
+        return
+    changed = conn.execute(
+        "UPDATE cards SET ease = ?, interval = ?, repetitions = ?, lapses = ?, due = ?, updated = ? "
+        "WHERE learner = ? AND country = ? AND code = ? AND updated = ?",
+        (card.ease, card.interval, card.repetitions, card.lapses, card.due, card.updated,
+         learner, country, code, row[6]),
+    ).rowcount
+    if changed != 1:
+        # WriteBehind beholder partiet og prøver igjen ved neste runde
+        raise sqlite3.OperationalError(f"kortet {learner}/{country}/{code} ble endret under skrivingen")
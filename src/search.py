@@ -1,38 +1,23 @@
+from __future__ import annotations
+
 import sys
-from code_utils import expand_search_keys, merge_entries, normalize_code_list
-from loader import load_country_data, available_countries
+from global_index import ALL_COUNTRIES, GlobalCodeIndex, load_bundles
+from loader import available_countries
+from snapshot import load_compiled_bundle
 
 DEFAULT_COUNTRY = "Russia"
 
 
-def lookup_code(code: str, db: dict):
+def lookup_code(code: str, bundle: dict):
+    """Slå opp en kode i et kompilert datasett (se ``bundle.compile_bundle``)."""
     if not code:
         return None
+    _, entry = bundle["by_code"].resolve(code)
+    return entry
 
-    search_keys = list(expand_search_keys([code]))
-    digits_only = "".join(ch for ch in code if ch.isdigit())
-    if digits_only and digits_only not in search_keys:
-        search_keys.append(digits_only)
-    if not search_keys:
-        return None
-
-    search_key_set = set(search_keys)
-
-    matches = []
-    for entry in db["codes"]:
-        codes = normalize_code_list(entry.get("code"))
-        if code in codes:
-            matches.append(entry)
-            continue
-        entry_keys = set(expand_search_keys(codes))
-        if entry_keys & search_key_set:
-            matches.append(entry)
 
-    if not matches:
-        return None
-    if len(matches) == 1:
-        return matches[0]
-    return merge_entries(matches)
+def load_bundle(country: str) -> dict:
+    return load_compiled_bundle(country)
 
 
 def pretty_print_result(code, entry, country_prefix=""):
@@ -41,7 +26,9 @@ def pretty_print_result(code, entry, country_prefix=""):
         return
 
     prefix = country_prefix.strip()
-    dial_segment = f"{prefix} {entry['code']}".strip() if prefix else entry["code"]
+    # code kan være én kode eller flere (tuppel i kompakte oppføringer)
+    codes = [entry["code"]] if isinstance(entry["code"], str) else entry["code"]
+    dial_segment = ", ".join(f"{prefix} {code}".strip() for code in codes)
     notes = entry.get("notes") or "Ingen notat."
 
     print(f"{dial_segment}:")
@@ -51,6 +38,44 @@ def pretty_print_result(code, entry, country_prefix=""):
     print()  # blank linje etterpå for lesbarhet
 
 
+def load_global_index() -> GlobalCodeIndex:
+    names = [info["filename"] for info in available_countries() if info["count"]]
+    return GlobalCodeIndex(load_bundles(names, load_bundle))
+
+
+def print_global_lookup(code: str, index: GlobalCodeIndex | None = None):
+    index = index or load_global_index()
+    matches = index.resolve(code)
+    if not matches:
+        print(f"Fant ikke kode {code} i noen datasett.\n")
+        return
+    for dataset, _, entry in matches:
+        print(f"[{dataset}]", end=" ")
+        pretty_print_result(code, entry, index.bundles[dataset]["metadata"]["country_code"])
+
+
+def reverse_lookup(query: str, bundle: dict):
+    """Finn koder for et stedsnavn (by, region eller alternativt navn)."""
+    return bundle["reverse"].search(query)
+
+
+def pretty_print_reverse(query, results, country_prefix=""):
+    if not results:
+        print(f"Fant ingen koder for «{query}».\n")
+        return
+
+    prefix = country_prefix.strip()
+    for result in results:
+        codes = ", ".join(f"{prefix} {code}".strip() for code in result["codes"])
+        places = result["primary_cities"] or result["regions"]
+        partial = ""
+        if result["matched_words"] < result["query_words"]:
+            partial = f" (treff på {result['matched_words']}/{result['query_words']} ord)"
+        print(f"{codes}: {', '.join(places)}{partial}")
+        print("  Region(er):", ", ".join(result["regions"]))
+    print()
+
+
 def select_country(current=None, *, allow_keep=True, heading=None):
     countries = available_countries()
     if not countries:
@@ -96,13 +121,14 @@ def interactive_mode(initial_country=None):
         return
 
     try:
-        db = load_country_data(country)
+        bundle = load_bundle(country)
     except FileNotFoundError:
         print(f"Fant ikke datafil for {country}.")
         return
 
     print("📞 Interaktiv søk.")
     print("   - Skriv telefonkoden for å slå opp.")
+    print("   - Skriv '?' og et stedsnavn for å finne kodene (f.eks. ?Novosibirsk).")
     print("   - Skriv '0' eller 'land' for å bytte land via nummerlisten.")
     print("   - Skriv 'q' for å avslutte.")
 
@@ -120,7 +146,7 @@ def interactive_mode(initial_country=None):
             )
             if new_country and new_country != country:
                 try:
-                    db = load_country_data(new_country)
+                    bundle = load_bundle(new_country)
                     country = new_country
                     print(f"Byttet til {country}.")
                 except FileNotFoundError:
@@ -128,8 +154,16 @@ def interactive_mode(initial_country=None):
             continue
         if code == "":
             continue
-        entry = lookup_code(code, db)
-        pretty_print_result(code, entry, db.get("country_code", ""))
+        if code.startswith("?"):
+            query = code[1:].strip()
+            pretty_print_reverse(
+                query,
+                reverse_lookup(query, bundle),
+                bundle["metadata"]["country_code"],
+            )
+            continue
+        entry = lookup_code(code, bundle)
+        pretty_print_result(code, entry, bundle["metadata"]["country_code"])
 
 
 def main():
@@ -144,6 +178,13 @@ def main():
 
     3) python src/search.py France 02
        -> Søker etter kode 02 i Frankrike
+
+    3b) python src/search.py '*' 812
+       -> Søker etter 812 i alle datasett
+
+    4) python src/search.py -r Novosibirsk
+       python src/search.py -r France Saint Germain
+       -> Omvendt søk: finner kodene for et stedsnavn
     """
 
     args = sys.argv[1:]
@@ -151,6 +192,10 @@ def main():
         interactive_mode()
         return
 
+    if args[0] in {"-r", "--reverse"}:
+        reverse_main(args[1:])
+        return
+
     if len(args) == 1:
         country = DEFAULT_COUNTRY
         code = args[0]
@@ -158,14 +203,40 @@ def main():
         country = args[0]
         code = args[1]
 
+    if country == ALL_COUNTRIES:
+        print_global_lookup(code)
+        return
+
+    try:
+        bundle = load_bundle(country)
+    except FileNotFoundError:
+        print(f"Fant ikke datafil for {country}.")
+        return
+
+    entry = lookup_code(code, bundle)
+    pretty_print_result(code, entry, bundle["metadata"]["country_code"])
+
+
+def reverse_main(args):
+    if not args:
+        print("Oppgi et stedsnavn etter -r.")
+        return
+
+    country = DEFAULT_COUNTRY
+    datasets = {info["filename"] for info in available_countries()}
+    if len(args) > 1 and args[0] in datasets:
+        country, args = args[0], args[1:]
+    query = " ".join(args)
+
     try:
-        db = load_country_data(country)
+        bundle = load_bundle(country)
     except FileNotFoundError:
         print(f"Fant ikke datafil for {country}.")
         return
 
-    entry = lookup_code(code, db)
-    pretty_print_result(code, entry, db.get("country_code", ""))
+    pretty_print_reverse(
+        query, reverse_lookup(query, bundle), bundle["metadata"]["country_code"]
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Production entry point: preload every bundle once, then fork workers.
+
+The parent process builds all country bundles and the global code index,
+freezes the garbage collector so those objects are not touched again, and
+forks ``--workers`` processes that share them copy-on-write. Each worker
+runs a threaded Werkzeug server on the listening socket it inherits, and
+starts its own background threads (``webapp.start_background``); the
+parent starts none that could hold a lock across the fork.
+
+Signals to the parent:
+  SIGHUP           graceful restart: reload changed datasets, fork new
+                   workers, then let the old ones finish in-flight requests
+  SIGTERM/SIGINT   graceful shutdown
+
+    python src/serve.py --workers 4 --port 8000
+    python src/serve.py --workers 4 --memory-report [--no-preload]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from werkzeug.serving import make_server
+
+import webapp
+
+log = logging.getLogger("serve")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Kjør webappen med forhåndslastede arbeidsprosesser."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=30.0,
+        help="sekunder gamle arbeidere får til å fullføre før de drepes",
+    )
+    parser.add_argument(
+        "--no-preload",
+        action="store_true",
+        help="la hver arbeider bygge sine egne datasett (til sammenligning)",
+    )
+    parser.add_argument(
+        "--profiling",
+        action="store_true",
+        help="tillat profilering av enkeltforespørsler (X-Profile: 1)",
+    )
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="skriv minnebruk per arbeider når de er klare, og avslutt",
+    )
+    return parser.parse_args(argv)
+
+
+class Master:
+    def __init__(self, args):
+        self.args = args
+        self.sock: socket.socket | None = None
+        self.workers: Dict[int, float] = {}
+        self.retiring: Dict[int, float] = {}
+        self.stopping = False
+        self.restart_requested = False
+
+    def run(self) -> int:
+        self.sock = socket.create_server(
+            (self.args.host, self.args.port), backlog=self.args.backlog
+        )
+        self.sock.set_inheritable(True)
+        if not self.args.no_preload:
+            self.preload()
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+
+        for _ in range(self.args.workers):
+            self.spawn_worker()
+        host, port = self.sock.getsockname()[:2]
+        log.info(
+            "Lytter på http://%s:%s med %d arbeidere", host, port, len(self.workers)
+        )
+
+        if self.args.memory_report:
+            time.sleep(1.0)
+            print_memory_report(list(self.workers))
+            self.stopping = True
+
+        while not self.stopping:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.graceful_restart()
+            self.reap(respawn=True)
+            self.kill_overdue()
+            time.sleep(0.2)
+
+        self.shutdown()
+        return 0
+
+    def preload(self) -> None:
+        started = time.perf_counter()
+        webapp.datasets.check_for_changes()
+        webapp.warmup()
+        # Objekter som finnes nå skal aldri flyttes av GC, ellers skrives
+        # sidene og deles ikke lenger copy-on-write med arbeiderne.
+        gc.collect()
+        gc.freeze()
+        log.info(
+            "Forhåndslastet %d datasett på %.1f ms",
+            len(webapp.datasets.stats()),
+            (time.perf_counter() - started) * 1000,
+        )
+
+    def spawn_worker(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(self.sock, preload=not self.args.no_preload)
+            except Exception:
+                log.exception("Arbeider %d krasjet", os.getpid())
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def graceful_restart(self) -> None:
+        log.info("Omstart: laster endrede datasett og starter nye arbeidere")
+        if not self.args.no_preload:
+            gc.unfreeze()
+            self.preload()
+        old = list(self.workers)
+        for _ in range(self.args.workers):
+            self.spawn_worker()
+        deadline = time.monotonic() + self.args.graceful_timeout
+        for pid in old:
+            self.workers.pop(pid, None)
+            self.retiring[pid] = deadline
+            _signal(pid, signal.SIGTERM)
+
+    def reap(self, respawn: bool) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.retiring.pop(pid, None)
+            if pid in self.workers:
+                del self.workers[pid]
+                if respawn and not self.stopping:
+                    log.warning("Arbeider %d stoppet (status %s), starter ny", pid, status)
+                    self.spawn_worker()
+
+    def kill_overdue(self) -> None:
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                _signal(pid, signal.SIGKILL)
+
+    def shutdown(self) -> None:
+        deadline = time.monotonic() + self.args.graceful_timeout
+        for pid in list(self.workers):
+            self.retiring[pid] = deadline
+            _signal(pid, signal.SIGTERM)
+        self.workers.clear()
+        while self.retiring:
+            self.reap(respawn=False)
+            self.kill_overdue()
+            time.sleep(0.1)
+        if self.sock is not None:
+            self.sock.close()
+
+    def _on_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _on_restart(self, signum, frame) -> None:
+        self.restart_requested = True
+
+
+def run_worker(sock: socket.socket, preload: bool) -> int:
+    for signum in (signal.SIGHUP, signal.SIGINT):
+        signal.signal(signum, signal.SIG_IGN)
+    if not preload:
+        webapp.warmup()
+    webapp.start_background()
+
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, webapp.app, threaded=True, fd=sock.fileno())
+    # Vent på aktive forespørsler ved avslutning i stedet for å kutte dem.
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    server.serve_forever()
+    server.server_close()
+    # os._exit hopper over atexit, så ventende skrivinger må ut her.
+    webapp.flush_pending()
+    return 0
+
+
+def _signal(pid: int, signum: int) -> None:
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def process_memory(pid: int) -> Dict[str, int]:
+    """RSS/PSS and shared/private pages in KiB from /proc (Linux only)."""
+    fields = {}
+    path = Path(f"/proc/{pid}/smaps_rollup")
+    if not path.exists():
+        path = Path(f"/proc/{pid}/status")
+    for line in path.read_text().splitlines():
+        name, _, value = line.partition(":")
+        parts = value.split()
+        if parts and parts[-1] == "kB":
+            fields[name.strip()] = int(parts[0])
+    return {
+        "rss": fields.get("Rss", fields.get("VmRSS", 0)),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def print_memory_report(pids: List[int]) -> None:
+    print(f"{'pid':>8} {'RSS KiB':>10} {'PSS KiB':>10} {'delt KiB':>10} {'privat KiB':>11}")
+    totals = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    for pid in pids:
+        memory = process_memory(pid)
+        for key in totals:
+            totals[key] += memory[key]
+        print(
+            f"{pid:>8} {memory['rss']:>10} {memory['pss']:>10} "
+            f"{memory['shared']:>10} {memory['private']:>11}"
+        )
+    print(
+        f"{'sum':>8} {totals['rss']:>10} {totals['pss']:>10} "
+        f"{totals['shared']:>10} {totals['private']:>11}"
+    )
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="[%(process)d] %(message)s")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    args = parse_args(argv)
+    webapp.app.config["PROFILING"] = args.profiling
+    if not hasattr(os, "fork"):
+        print("serve.py krever os.fork (Linux/macOS).")
+        return 1
+    return Master(args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Precompiled dataset snapshots for fast cold starts.
+
+``compile`` writes one snapshot per ``Telefonnummer/*.json`` file to
+``build/snapshots/``. A snapshot holds the compiled bundle (entries with
+shared strings and the prebuilt code index) behind a small header with the
+format version, a hash of the modules whose classes end up in the pickle
+and the SHA-256 of the JSON it was built from. Loading maps the file and
+unpickles straight from the mapping. If anything does not match, or the
+pickle no longer loads (e.g. a class was renamed), the bundle is built from
+JSON and the stale snapshot is rewritten.
+
+    python src/snapshot.py compile [Land ...]
+    python src/snapshot.py bench [--repeat N] [--synthetic N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from bundle import BUNDLE_FORMAT, compile_bundle
+from compact import recompact
+from loader import available_countries, country_data_path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SNAPSHOT_DIR = PROJECT_ROOT / "build" / "snapshots"
+SNAPSHOT_VERSION = 1
+# Modulene som definerer det som ligger i en bundle. Endres kildekoden i en
+# av dem, blir gamle snapshots utdaterte uten at BUNDLE_FORMAT må økes.
+BUNDLE_MODULES = (
+    "bundle",
+    "code_index",
+    "code_utils",
+    "compact",
+    "matcher",
+    "region_images",
+    "reverse_index",
+    "sampler",
+    "suggest",
+)
+
+log = logging.getLogger(__name__)
+
+_MAGIC = b"GGSNAP\x00\x01"
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+def snapshot_path(country: str) -> Path:
+    return SNAPSHOT_DIR / f"{country}.snap"
+
+
+def load_compiled_bundle(country: str) -> dict:
+    """Return the bundle for ``country``, from its snapshot when it is current."""
+    source = country_data_path(country).read_bytes()
+    path = snapshot_path(country)
+    bundle = read_snapshot(path, source)
+    if bundle is not None:
+        return bundle
+    bundle = compile_bundle(json.loads(source), country)
+    if path.exists():
+        try:
+            write_snapshot(bundle, source, path)
+        except OSError:
+            log.warning("Kunne ikke skrive snapshot %s på nytt", path, exc_info=True)
+    return bundle
+
+
+def write_snapshot(bundle: dict, source: bytes, path: Path) -> int:
+    header = json.dumps(_expected_header(source)).encode("utf-8")
+    payload = pickle.dumps(bundle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        f.write(payload)
+    tmp_path.replace(path)
+    return path.stat().st_size
+
+
+def read_snapshot(path: Path, source: bytes) -> Optional[dict]:
+    """Load a snapshot if it was built from ``source`` by this code."""
+    try:
+        with open(path, "rb") as f:
+            return _read_mapped(f, source)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # alt en gammel pickle kan finne på: omdøpte klasser og moduler,
+        # endrede felt, avkuttet fil
+        log.warning("Snapshot %s kan ikke leses, bygger fra JSON", path, exc_info=True)
+        return None
+
+
+def _read_mapped(f, source: bytes) -> Optional[dict]:
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        offset = len(_MAGIC) + _HEADER_LENGTH.size
+        if mapped[: len(_MAGIC)] != _MAGIC:
+            return None
+        (header_length,) = _HEADER_LENGTH.unpack(mapped[len(_MAGIC) : offset])
+        header = json.loads(mapped[offset : offset + header_length])
+        if header != _expected_header(source):
+            log.info("Snapshot %s er utdatert, bygger fra JSON", f.name)
+            return None
+        with memoryview(mapped) as view:
+            bundle = pickle.loads(view[offset + header_length :])
+    recompact(bundle["entries"])
+    return bundle
+
+
+def _expected_header(source: bytes) -> dict:
+    return {
+        "snapshot_version": SNAPSHOT_VERSION,
+        "bundle_format": BUNDLE_FORMAT,
+        "code_sha256": code_fingerprint(),
+        "source_sha256": hashlib.sha256(source).hexdigest(),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint() -> str:
+    """SHA-256 over the source of ``BUNDLE_MODULES``."""
+    digest = hashlib.sha256()
+    for name in BUNDLE_MODULES:
+        digest.update((Path(__file__).parent / f"{name}.py").read_bytes())
+    return digest.hexdigest()
+
+
+def compile_all(countries: List[str]) -> None:
+    for country in countries:
+        source = country_data_path(country).read_bytes()
+        try:
+            data = json.loads(source)
+        except ValueError:
+            print(f"  {country}: hopper over (ugyldig eller tom JSON)")
+            continue
+        path = snapshot_path(country)
+        size = write_snapshot(compile_bundle(data, country), source, path)
+        print(f"  {country}: {size / 1024:.1f} KiB -> {path}")
+
+
+def _time_best(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _bench_source(label: str, source: bytes, path: Path, repeat: int):
+    def from_json():
+        return compile_bundle(json.loads(source), label)
+
+    def from_snapshot():
+        bundle = read_snapshot(path, source)
+        assert bundle is not None, "snapshot er utdatert"
+        return bundle
+
+    json_time = _time_best(from_json, repeat)
+    snap_time = _time_best(from_snapshot, repeat)
+    ratio = json_time / snap_time if snap_time else float("inf")
+    print(
+        f"  {label:<24} json {json_time * 1000:9.2f} ms   "
+        f"snapshot {snap_time * 1000:9.2f} ms   x{ratio:.1f}"
+    )
+    return json_time, snap_time
+
+
+def synthetic_source(count: int) -> bytes:
+    groups = ["North", "South", "East", "West", "Central"]
+    codes = [
+        {
+            # hver tiende oppføring er et område, resten enkeltkoder
+            "code": (
+                str(1000 + idx) if idx % 10
+                else f"{100000 + idx * 20}-{100000 + idx * 20 + 9}"
+            ),
+            "primary_cities": [f"City {idx}"],
+            "regions": [f"Region {idx % 500}"],
+            "region_group": groups[idx % len(groups)],
+            "difficulty": ("easy", "medium", "hard")[idx % 3],
+            "notes": f"Syntetisk oppføring {idx}.",
+        }
+        for idx in range(count)
+    ]
+    data = {"country": "Synthetic", "country_code": "+0", "codes": codes}
+    return json.dumps(data).encode("utf-8")
+
+
+def bench(repeat: int, synthetic: int) -> None:
+    print(f"--- Oppstart: JSON + bygging vs. snapshot (beste av {repeat}) ---")
+    total_json = total_snap = 0.0
+    for info in available_countries():
+        country = info["filename"]
+        source = country_data_path(country).read_bytes()
+        path = snapshot_path(country)
+        if read_snapshot(path, source) is None:
+            if not info["count"]:
+                continue
+            compile_all([country])
+        json_time, snap_time = _bench_source(country, source, path, repeat)
+        total_json += json_time
+        total_snap += snap_time
+    print(
+        f"  {'Totalt':<24} json {total_json * 1000:9.2f} ms   "
+        f"snapshot {total_snap * 1000:9.2f} ms"
+    )
+
+    if synthetic:
+        source = synthetic_source(synthetic)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "synthetic.snap"
+            write_snapshot(compile_bundle(json.loads(source), "Synthetic"), source, path)
+            _bench_source(f"Synthetic ({synthetic})", source, path, repeat)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Kompiler og mål datasett-snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compile_cmd = sub.add_parser("compile", help="skriv snapshots til build/snapshots/")
+    compile_cmd.add_argument("countries", nargs="*", help="standard: alle datasett")
+    bench_cmd = sub.add_parser("bench", help="sammenlign oppstart fra JSON og snapshot")
+    bench_cmd.add_argument("--repeat", type=int, default=20)
+    bench_cmd.add_argument("--synthetic", type=int, default=0, metavar="N",
+                           help="mål også et syntetisk datasett med N oppføringer")
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        countries = args.countries or [info["filename"] for info in available_countries()]
+        print("--- Kompilerer snapshots ---")
+        compile_all(countries)
+        return 0
+
+    bench(args.repeat, args.synthetic)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
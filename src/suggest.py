@@ -0,0 +1,171 @@
+"""Prefix suggestions over codes and place names for one bundle."""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from code_index import sweep_intervals
+from code_utils import split_search_keys
+from matcher import normalize
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 50
+
+_WORD = re.compile(r"[^\W_]+")
+_NAME_FIELDS = (
+    ("region", "regions"),
+    ("city", "primary_cities"),
+    ("alt_name", "alt_names"),
+)
+
+
+class _RangeTable(NamedTuple):
+    """The ranges of one key width, sorted by start, plus their sweep."""
+
+    starts: List[int]
+    refs: List[Tuple[int, int, str, int]]  # (start, end, code, idx)
+    cover_starts: List[int]
+    covers: List[Tuple[int, ...]]  # posisjoner i refs
+
+
+class SuggestIndex:
+    """
+    Sorted arrays for prefix search, built once per bundle.
+
+    Digit prefixes are matched against single-code keys with one bisect.
+    A digit prefix is also an interval of values per key width; the ranges
+    that cover its first value come from one bisect in a sweep of the
+    ranges, and the ones that start inside it from a bisect in the ranges
+    sorted by start, so neither expanding nor scanning every range is
+    needed. Other prefixes are matched against normalized place names and
+    each of their words (regions, cities and alt_names).
+    """
+
+    def __init__(self, entries: Sequence[dict]):
+        self.entries = entries
+        code_refs: List[Tuple[str, str, int]] = []
+        range_refs: Dict[int, List[Tuple[int, int, str, int]]] = {}
+        name_refs: List[Tuple[str, int, str, str, int]] = []
+
+        for idx, entry in enumerate(entries):
+            for code in entry.get("_codes") or []:
+                keys, ranges = split_search_keys([code])
+                for key in keys:
+                    code_refs.append((key, code, idx))
+                for width, start, end in ranges:
+                    range_refs.setdefault(width, []).append((start, end, code, idx))
+
+            for rank, (kind, field) in enumerate(_NAME_FIELDS):
+                for name in entry.get(field) or []:
+                    normalized = normalize(str(name))
+                    tokens = {normalized, *_WORD.findall(normalized)}
+                    for token in tokens:
+                        name_refs.append((token, rank, kind, str(name), idx))
+
+        self._ranges: Dict[int, _RangeTable] = {}
+        for width, refs in sorted(range_refs.items()):
+            refs.sort()
+            cover_starts, covers = sweep_intervals(
+                [(start, end, pos) for pos, (start, end, _, _) in enumerate(refs)]
+            )
+            self._ranges[width] = _RangeTable(
+                [ref[0] for ref in refs], refs, cover_starts, covers
+            )
+
+        code_refs.sort()
+        name_refs.sort()
+        self._code_keys = [ref[0] for ref in code_refs]
+        self._code_refs = code_refs
+        self._name_keys = [ref[0] for ref in name_refs]
+        self._name_refs = name_refs
+
+    def suggest(self, query: str, limit: int = DEFAULT_SUGGESTIONS) -> List[dict]:
+        query = query.strip()
+        if not query:
+            return []
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        if any(ch.isdigit() for ch in query):
+            digits = "".join(ch for ch in query if ch.isdigit())
+            return self._suggest_codes(digits, limit)
+        return self._suggest_names(normalize(query), limit)
+
+    def _suggest_codes(self, prefix: str, limit: int) -> List[dict]:
+        hits: List[Tuple[str, str, int]] = []
+        pos = bisect_left(self._code_keys, prefix)
+        while pos < len(self._code_refs) and len(hits) < limit:
+            key, code, idx = self._code_refs[pos]
+            if not key.startswith(prefix):
+                break
+            hits.append((key, code, idx))
+            pos += 1
+
+        if prefix.isascii():
+            for width, table in self._ranges.items():
+                if width >= len(prefix):
+                    hits.extend(_range_hits(table, width, prefix, limit))
+
+        hits.sort()
+        suggestions = []
+        seen = set()
+        for key, code, idx in hits:
+            if (code, idx) in seen:
+                continue
+            seen.add((code, idx))
+            suggestions.append(self._describe(idx, type="code", code=code, key=key))
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    def _suggest_names(self, prefix: str, limit: int) -> List[dict]:
+        suggestions = []
+        seen = set()
+        pos = bisect_left(self._name_keys, prefix)
+        while pos < len(self._name_refs) and len(suggestions) < limit:
+            token, _, kind, name, idx = self._name_refs[pos]
+            if not token.startswith(prefix):
+                break
+            pos += 1
+            if (name, idx) in seen:
+                continue
+            seen.add((name, idx))
+            suggestions.append(self._describe(idx, type=kind, name=name))
+        return suggestions
+
+    def _describe(self, idx: int, **fields) -> dict:
+        entry = self.entries[idx]
+        fields.setdefault("code", entry.get("_primary_code"))
+        fields["regions"] = entry.get("regions", [])
+        fields["primary_cities"] = entry.get("primary_cities", [])
+        return fields
+
+
+def _range_hits(table: _RangeTable, width: int, prefix: str, limit: int):
+    """
+    ``(key, code, idx)`` for the ranges of one width that share ``prefix``:
+    those covering its first value, then up to ``limit`` starting inside it
+    (more only while the start ties with the last one taken).
+    """
+    scale = 10 ** (width - len(prefix))
+    low = int(prefix) * scale
+    high = low + scale - 1
+
+    pos = bisect_right(table.cover_starts, low) - 1
+    if pos >= 0:
+        key = str(low).zfill(width)
+        for ref in table.covers[pos]:
+            _, _, code, idx = table.refs[ref]
+            yield key, code, idx
+
+    pos = bisect_right(table.starts, low)
+    taken = 0
+    last = None
+    while pos < len(table.refs):
+        start, _, code, idx = table.refs[pos]
+        if start > high or (taken >= limit and start != last):
+            break
+        yield str(start).zfill(width), code, idx
+        taken += 1
+        last = start
+        pos += 1
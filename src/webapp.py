@@ -2,98 +2,204 @@
 
 from __future__ import annotations
 
-import random
-from functools import lru_cache
+import json
+import mimetypes
+import threading
+import time
 from pathlib import Path
-from typing import Dict, List
-from flask import Flask, abort, jsonify, request, send_from_directory
+from typing import List
+from flask import (
+    Flask,
+    Response,
+    abort,
+    g,
+    jsonify,
+    request,
+    send_file,
+    send_from_directory,
+    stream_with_context,
+)
 
-from code_utils import expand_search_keys, merge_entries, normalize_code_list
-from loader import available_countries, load_country_data
-from quiz import matches_any
+from answer_stats import DEFAULT_HARDEST, WINDOWS, AnswerStats
+from assets import (
+    ASSET_BUILD_DIR,
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    AssetManifest,
+    stored_path,
+)
+from dataset_store import DatasetStore
+from event_log import EventLog
+from global_index import ALL_COUNTRIES, GlobalCodeIndex, load_bundles
+from images import IMAGE_BUILD_DIR, ImageManifest, pick_variant
+from loader import available_countries, catalog_response, country_data_path
+from matcher import AnswerMatcher
+from metrics import REGISTRY
+from profiler import RequestProfiler
+from region_images import RegionImages
+from reverse_index import DEFAULT_REVERSE_RESULTS
+from sampler import parse_weight_profile
+from scheduler import Scheduler, answer_quality, valid_learner
+from suggest import DEFAULT_SUGGESTIONS
+from snapshot import load_compiled_bundle
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 STATIC_DIR = PROJECT_ROOT / "static"
 DEFAULT_COUNTRY = "Russia"
-
-app = Flask(
-    __name__,
-    static_folder=str(STATIC_DIR),
-    static_url_path="/static",
+# Hvor ofte (sekunder) Telefonnummer/ sjekkes for endringer. 0 slår av.
+DATASET_POLL_SECONDS = 2.0
+MAX_BATCH_CODES = 100_000
+# Lokal tilstand som ikke skal i git (se .gitignore).
+STATE_DIR = PROJECT_ROOT / "var"
+
+# /static/ serveres av send_asset, som kjenner de hashede filene.
+app = Flask(__name__, static_folder=None)
+# Slås på av start_dev_server.py og `serve.py --profiling`.
+app.config["PROFILING"] = False
+assets = AssetManifest(ASSET_BUILD_DIR)
+map_images = ImageManifest(IMAGE_BUILD_DIR)
+region_images = RegionImages(map_images)
+scheduler = Scheduler(STATE_DIR / "scheduler.sqlite3")
+answer_log = EventLog(STATE_DIR / "events")
+answer_stats = AnswerStats(answer_log.directory)
+profiler = RequestProfiler(STATE_DIR / "profiles")
+
+
+datasets = DatasetStore(
+    load_compiled_bundle,
+    country_data_path,
+    poll_interval=DATASET_POLL_SECONDS,
 )
 
 
-class QuizEntry(Dict):
-    code: str
-    primary_cities: List[str]
-    regions: List[str]
-
-
-@lru_cache(maxsize=16)
 def get_country_bundle(country: str):
     try:
-        data = load_country_data(country)
+        return datasets.get(country)
     except FileNotFoundError:
         abort(404, description=f"Fant ikke landet {country} i Telefonnummer/-mappen.")
+    except ValueError:
+        # f.eks. de tomme plassholderfilene (Brasil, Turkey, USA)
+        abort(404, description=f"Datasettet {country} er tomt eller kan ikke leses.")
 
-    raw_entries: List[QuizEntry] = data.get("codes") or []
-    entries: List[QuizEntry] = []
-    index: Dict[str, List[QuizEntry]] = {}
-
-    for entry in raw_entries:
-        codes = normalize_code_list(entry.get("code"))
-        search_keys = expand_search_keys(codes)
-        working_entry = dict(entry)
-        working_entry.setdefault("primary_cities", entry.get("primary_cities", []))
-        working_entry.setdefault("regions", entry.get("regions", []))
-        working_entry["_codes"] = codes
-        working_entry["_search_keys"] = search_keys
-        working_entry["_primary_code"] = codes[0] if codes else ""
-        entries.append(working_entry)
-
-        for code in codes:
-            if code:
-                index.setdefault(code, []).append(working_entry)
-        for key in search_keys:
-            index.setdefault(key, []).append(working_entry)
 
-    return {
-        "metadata": {
-            "country": data.get("country", country),
-            "country_code": data.get("country_code", ""),
-        },
-        "entries": entries,
-        "by_code": index,
-    }
+_global_index: GlobalCodeIndex | None = None
+_global_index_lock = threading.Lock()
 
 
-def _resolve_entry(bundle, raw_code: str):
-    if not raw_code:
-        return None, None
+def _indexed_datasets() -> List[str]:
+    return [info["filename"] for info in available_countries() if info["count"]]
 
-    direct_matches = bundle["by_code"].get(raw_code)
-    if direct_matches:
-        return raw_code, _pick_or_merge(direct_matches)
 
-    candidate_keys = list(expand_search_keys([raw_code]))
-    digits_only = "".join(ch for ch in raw_code if ch.isdigit())
-    if digits_only and digits_only not in candidate_keys:
-        candidate_keys.append(digits_only)
+def flush_pending() -> None:
+    """Skriv det bakgrunnsskriverne har liggende; kalles før en prosess avslutter."""
+    scheduler.flush()
+    answer_log.flush()
 
-    for key in candidate_keys:
-        matches = bundle["by_code"].get(key)
-        if matches:
-            return key, _pick_or_merge(matches)
 
-    return digits_only or raw_code, None
+@app.before_request
+def _start_timer():
+    g.metrics_endpoint = request.endpoint or "unmatched"
+    g.metrics_started = time.perf_counter()
+    REGISTRY.inc("geo_http_requests_in_flight", (g.metrics_endpoint,))
 
 
-def _pick_or_merge(entries: List[QuizEntry]):
-    if not entries:
-        return None
-    if len(entries) == 1:
-        return entries[0]
-    return merge_entries(entries)
+@app.before_request
+def _start_profile():
+    if not app.config["PROFILING"]:
+        return
+    wanted = request.headers.get("X-Profile") or request.args.get("profile")
+    if wanted not in ("1", "true"):
+        return
+    g.profile = profiler.start(f"{request.method} {request.path}")
+    g.profile_busy = g.profile is None
+
+
+@app.after_request
+def _record_status(response):
+    g.metrics_status = response.status_code
+    if g.get("profile") is not None:
+        response.headers["X-Profile"] = g.profile.name
+    elif g.get("profile_busy"):
+        response.headers["X-Profile"] = "busy"
+    return response
+
+
+@app.teardown_request
+def _finish_profile(exc):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profiler.finish(
+            profile,
+            endpoint=request.endpoint,
+            query=request.query_string.decode("utf-8", "replace"),
+            status=500 if exc is not None else g.get("metrics_status"),
+        )
+
+
+@app.teardown_request
+def _stop_timer(exc):
+    # pop: et strømmet svar (stream_with_context) river ned konteksten to ganger
+    endpoint = g.pop("metrics_endpoint", None)
+    if endpoint is None:
+        return
+    elapsed = time.perf_counter() - g.pop("metrics_started")
+    status = "500" if exc is not None else str(g.get("metrics_status", 500))
+    REGISTRY.inc("geo_http_requests_in_flight", (endpoint,), -1)
+    REGISTRY.observe("geo_http_request_duration_seconds", (endpoint,), elapsed)
+    REGISTRY.inc("geo_http_requests_total", (endpoint, status))
+
+
+def warmup() -> None:
+    """Bygg alle datasett og den globale kodeindeksen."""
+    load_bundles(_indexed_datasets(), datasets.get)
+    get_global_index()
+
+
+def start_background() -> None:
+    """
+    Start trådene som hører til denne prosessen (innlesing av svarloggen).
+    Kalles i hver serve.py-arbeider etter fork, aldri i forelderen.
+    """
+    answer_stats.start()
+
+
+def get_global_index() -> GlobalCodeIndex:
+    """
+    Indeks over alle datasett for ``country=*``. Når et datasett er lagt
+    til, fjernet eller lastet inn på nytt av ``datasets``, byttes bare den
+    delen av indeksen ut.
+    """
+    global _global_index
+    names = _indexed_datasets()
+    if _global_index is None:
+        bundles = load_bundles(names, datasets.get)
+    else:
+        bundles = {}
+        for name in names:
+            try:
+                bundles[name] = datasets.get(name)
+            except (OSError, ValueError):
+                continue
+
+    current = _global_index
+    if current is not None and _same_bundles(current.bundles, bundles):
+        return current
+    with _global_index_lock:
+        if _global_index is None:
+            _global_index = GlobalCodeIndex(bundles)
+        elif not _same_bundles(_global_index.bundles, bundles):
+            _global_index.update(bundles)
+    return _global_index
+
+
+def _same_bundles(left: dict, right: dict) -> bool:
+    return list(left) == list(right) and all(
+        left[name] is right[name] for name in left
+    )
+
+
+def _resolve_entry(bundle, raw_code: str):
+    return bundle["by_code"].resolve(raw_code)
 
 
 def pick_question(
@@ -101,6 +207,8 @@ def pick_question(
     difficulty: str | None = None,
     region_group: str | None = None,
     force_code: str | None = None,
+    weight_by: str | None = None,
+    weights=None,
 ):
     bundle = get_country_bundle(country)
     entries = bundle["entries"]
@@ -115,30 +223,14 @@ def pick_question(
             abort(404, description=f"Fant ikke kode {force_code} for {country}.")
         entry = matches[0]
     else:
-        # filtrer på vanskelighet hvis valgt
-        if difficulty:
-            filtered = [
-                e
-                for e in entries
-                if (e.get("difficulty") or "").strip().lower()
-                == difficulty.strip().lower()
-            ]
-            if filtered:
-                entries = filtered
-
-        # filtrer på region_group hvis valgt
-        if region_group:
-            filtered = [
-                e
-                for e in entries
-                if (e.get("region_group") or "").strip().lower()
-                == region_group.strip().lower()
-            ]
-            if filtered:
-                entries = filtered
-
-        # velg tilfeldig blant gjenværende
-        entry = random.choice(entries)
+        # ferdigbygde bøtter per (vanskelighet, region_group); et filter som
+        # ikke treffer noe ignoreres, som før
+        entry = bundle["sampler"].pick(
+            difficulty=difficulty,
+            region_group=region_group,
+            weight_by=weight_by,
+            weights=weights,
+        )
 
     code = entry.get("_primary_code") or entry.get("code")
     return {
@@ -151,6 +243,7 @@ def pick_question(
         "difficulty": entry.get("difficulty"),
         "region_group": entry.get("region_group"),
         "images": entry.get("images", []),
+        "region_images": region_images.for_entry(country, entry),
     }
 
 
@@ -163,17 +256,27 @@ def evaluate_answer(country: str, code: str, guess: str):
     regions = entry.get("regions", [])
     cities = entry.get("primary_cities", [])
 
-    correct_region = matches_any(guess, regions)
-    correct_city = matches_any(guess, cities)
+    # sammenslåtte oppføringer (overlappende koder) har ingen ferdig matcher
+    matcher = entry.get("_matcher") or AnswerMatcher.from_entry(entry)
+    match = matcher.match(guess, known_names=bundle["answer_names"])
+    REGISTRY.inc(
+        "geo_answer_matches_total",
+        (country, match.match_type if match else ("skipped" if not guess else "none")),
+    )
 
     return {
-        "correct": bool(correct_region or correct_city),
-        "matched_on": "region" if correct_region else ("city" if correct_city else None),
+        "code": entry.get("_primary_code") or resolved_code,
+        "correct": match is not None,
+        "matched_on": match.matched_on if match else None,
+        "match_type": match.match_type if match else None,
+        "matched_name": match.matched_name if match else None,
         "regions": regions,
         "primary_cities": cities,
         "notes": entry.get("notes"),
         "region_group": entry.get("region_group"),
+        "difficulty": entry.get("difficulty"),
         "images": entry.get("images", []),
+        "region_images": region_images.for_entry(country, entry),
     }
 
 
@@ -183,15 +286,43 @@ def api_question():
     difficulty = request.args.get("difficulty") or None
     region_group = request.args.get("region_group") or None
     force_code = request.args.get("force_code") or None
-
-    return jsonify(pick_question(
+    weight_by = request.args.get("weight_by") or None
+    weights = None
+    if request.args.get("weights"):
+        try:
+            weights = parse_weight_profile(request.args["weights"])
+        except ValueError as exc:
+            abort(400, description=f"Ugyldig 'weights': {exc}")
+        weight_by = weight_by or "population_rank"
+
+    learner = _learner(request.args.get("learner"))
+    review = None
+    if learner and not (force_code or difficulty or region_group):
+        # Forfalte repetisjoner går foran nye spørsmål.
+        card = scheduler.next_due(learner, country)
+        if card is not None and get_country_bundle(country)["by_code"].get(card.code):
+            force_code = card.code
+            review = card.describe()
+
+    question = pick_question(
         country=country,
         difficulty=difficulty,
         region_group=region_group,
         force_code=force_code,
-    ))
+        weight_by=weight_by,
+        weights=weights,
+    )
+    if learner:
+        question["review"] = review
+    return jsonify(question)
 
 
+def _learner(value):
+    if not value:
+        return None
+    if not valid_learner(value):
+        abort(400, description="Ugyldig 'learner': bruk 1-64 bokstaver, tall, - eller _.")
+    return value
 
 
 @app.post("/api/answer")
@@ -204,14 +335,107 @@ def api_answer():
     if not code:
         abort(400, description="Body må inneholde 'code'.")
 
+    learner = _learner(payload.get("learner"))
+
     # Viktig endring: guess kan være tomt (= hopp over)
+    started = time.perf_counter()
     result = evaluate_answer(country, code, guess)
+    latency_ms = (time.perf_counter() - started) * 1000
+    answer_log.append(
+        {
+            "ts": time.time(),
+            "country": country,
+            "code": result["code"],
+            "guess": guess,
+            "correct": result["correct"],
+            "matched_on": result["matched_on"],
+            "match_type": result["match_type"],
+            "region_group": result["region_group"],
+            "difficulty": result["difficulty"],
+            "latency_ms": round(latency_ms, 3),
+            "learner": learner,
+        }
+    )
+    if learner:
+        quality = answer_quality(result["correct"], result["match_type"], skipped=not guess)
+        card = scheduler.record(learner, country, result["code"], quality)
+        result["review"] = card.describe()
     return jsonify(result)
 
 
+@app.get("/api/stats")
+def api_stats():
+    window = request.args.get("window") or None
+    if window is not None and window not in WINDOWS:
+        abort(400, description=f"Ugyldig 'window': bruk {', '.join(WINDOWS)}.")
+    hardest = request.args.get("hardest", type=int)
+    return jsonify(
+        answer_stats.view(
+            learner=_learner(request.args.get("learner")),
+            window=window,
+            country=request.args.get("country") or None,
+            hardest=DEFAULT_HARDEST if hardest is None else hardest,
+        )
+    )
+
+
 @app.get("/api/countries")
 def api_countries():
-    return jsonify(available_countries())
+    body, etag = catalog_response()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def lookup_result(bundle, country: str, raw_code: str) -> dict:
+    """Svar-objektet for ett oppslag; felles for /api/lookup og batch."""
+    if country == ALL_COUNTRIES:
+        return global_lookup_result(raw_code)
+
+    resolved_code, entry = _resolve_entry(bundle, raw_code)
+    if entry is None:
+        return {
+            "found": False,
+            "code": raw_code,
+            "message": f"Fant ikke kode {raw_code} i {country}.",
+        }
+    return _entry_result(bundle, country, resolved_code, entry)
+
+
+def global_lookup_result(raw_code: str) -> dict:
+    index = get_global_index()
+    matches = [
+        {"dataset": dataset, **_entry_result(index.bundles[dataset], dataset, key, entry)}
+        for dataset, key, entry in index.resolve(raw_code)
+    ]
+    if not matches:
+        return {
+            "found": False,
+            "code": raw_code,
+            "message": f"Fant ikke kode {raw_code} i noen datasett.",
+            "matches": [],
+        }
+    return {"found": True, "code": raw_code, "matches": matches}
+
+
+def _entry_result(bundle, dataset: str, resolved_code: str, entry) -> dict:
+    return {
+        "found": True,
+        "code": resolved_code,
+        "country": bundle["metadata"]["country"],
+        "country_code": bundle["metadata"]["country_code"],
+        "primary_cities": entry.get("primary_cities", []),
+        "regions": entry.get("regions", []),
+        "notes": entry.get("notes"),
+        "difficulty": entry.get("difficulty"),
+        "population_rank": entry.get("population_rank"),
+        "images": entry.get("images", []),
+        "region_images": region_images.for_entry(dataset, entry),
+    }
 
 
 @app.post("/api/lookup")
@@ -222,32 +446,129 @@ def api_lookup():
     if not raw_code:
         abort(400, description="Oppgi en telefonkode.")
 
-    bundle = get_country_bundle(country)
-    resolved_code, entry = _resolve_entry(bundle, raw_code)
-    if entry is None:
-        return (
-            jsonify(
-                {
+    bundle = None if country == ALL_COUNTRIES else get_country_bundle(country)
+    result = lookup_result(bundle, country, raw_code)
+    return jsonify(result), (200 if result["found"] else 404)
+
+
+def _batch_items(default_country: str):
+    """
+    Return the ``(country, code)`` pairs of a batch request. The body is
+    either JSON (``{"country": ..., "codes": [...]}``), which is parsed and
+    checked here so a bad body gives 400 before anything is streamed, or
+    NDJSON with one code or one ``{"country": ..., "code": ...}`` object per
+    line, which is read as a stream. An NDJSON line that is not JSON is
+    taken as a bare code, so reading it cannot fail halfway.
+    """
+    if request.mimetype == "application/x-ndjson":
+        return _ndjson_items(default_country)
+
+    payload = request.get_json(force=True, silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("codes") or [], list):
+        abort(400, description='Send {"country": ..., "codes": [...]} eller NDJSON.')
+    codes = payload.get("codes") or []
+    if len(codes) > MAX_BATCH_CODES:
+        abort(400, description=f"Maks {MAX_BATCH_CODES} koder per forespørsel.")
+    default_country = payload.get("country") or default_country
+    return [_batch_item(item, default_country) for item in codes]
+
+
+def _ndjson_items(default_country: str):
+    for line in request.stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield _batch_item(json.loads(line), default_country)
+        except ValueError:
+            yield default_country, line.decode("utf-8", "replace")
+
+
+def _batch_item(item, default_country: str):
+    if isinstance(item, dict):
+        country = item.get("country") or default_country
+        return country, str(item.get("code") or "").strip()
+    return default_country, str(item).strip()
+
+
+@app.post("/api/lookup/batch")
+def api_lookup_batch():
+    default_country = request.args.get("country") or DEFAULT_COUNTRY
+    items = _batch_items(default_country)
+
+    def generate():
+        bundles = {}
+        for count, (country, raw_code) in enumerate(items, start=1):
+            if count > MAX_BATCH_CODES:
+                message = f"Maks {MAX_BATCH_CODES} koder per forespørsel."
+                yield _ndjson({"error": message})
+                return
+            if not raw_code:
+                result = {
                     "found": False,
                     "code": raw_code,
-                    "message": f"Fant ikke kode {raw_code} i {country}.",
+                    "message": "Oppgi en telefonkode.",
                 }
-            ),
-            404,
-        )
+            else:
+                if country not in bundles:
+                    bundles[country] = _batch_bundle(country)
+                bundle = bundles[country]
+                if isinstance(bundle, str):
+                    result = {"found": False, "code": raw_code, "message": bundle}
+                else:
+                    result = lookup_result(bundle, country, raw_code)
+            yield _ndjson(result)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def _batch_bundle(country: str):
+    """The bundle for ``country``, or the message to send for its codes."""
+    if country == ALL_COUNTRIES:
+        return None
+    try:
+        return datasets.get(country)
+    except FileNotFoundError:
+        return f"Fant ikke landet {country} i Telefonnummer/-mappen."
+    except ValueError:
+        # f.eks. de tomme plassholderfilene (Brasil, Turkey, USA)
+        return f"Datasettet {country} kan ikke leses."
 
+
+def _ndjson(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+
+@app.get("/api/suggest")
+def api_suggest():
+    country = request.args.get("country") or DEFAULT_COUNTRY
+    query = request.args.get("q") or ""
+    limit = request.args.get("limit", type=int) or DEFAULT_SUGGESTIONS
+
+    bundle = get_country_bundle(country)
+    return jsonify(
+        {
+            "query": query,
+            "suggestions": bundle["suggest"].suggest(query, limit),
+        }
+    )
+
+
+@app.get("/api/reverse")
+def api_reverse():
+    country = request.args.get("country") or DEFAULT_COUNTRY
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        abort(400, description="Oppgi et stedsnavn i 'q'.")
+    limit = request.args.get("limit", type=int) or DEFAULT_REVERSE_RESULTS
+
+    bundle = get_country_bundle(country)
     return jsonify(
         {
-            "found": True,
-            "code": resolved_code,
+            "query": query,
             "country": bundle["metadata"]["country"],
             "country_code": bundle["metadata"]["country_code"],
-            "primary_cities": entry.get("primary_cities", []),
-            "regions": entry.get("regions", []),
-            "notes": entry.get("notes"),
-            "difficulty": entry.get("difficulty"),
-            "population_rank": entry.get("population_rank"),
-            "images": entry.get("images", []),
+            "results": bundle["reverse"].search(query, limit),
         }
     )
 
@@ -259,39 +580,174 @@ def _shutdown_server():
     func()
 
 
+@app.get("/api/dev/datasets")
+def api_dev_datasets():
+    return jsonify(datasets.stats())
+
+
+@app.get("/api/dev/metrics")
+def api_dev_metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/api/dev/profiles")
+def api_dev_profiles():
+    if not app.config["PROFILING"]:
+        abort(404, description="Profilering er slått av.")
+    limit = request.args.get("limit", type=int) or 20
+    return jsonify({"profiles": profiler.recent(limit)})
+
+
+@app.get("/api/dev/profiles/<name>")
+def api_dev_profile(name: str):
+    path = profiler.path(name) if app.config["PROFILING"] else None
+    if path is None:
+        abort(404, description=f"Fant ikke profilen {name}.")
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True)
+
+
 @app.post("/api/dev/shutdown")
 def api_dev_shutdown():
     _shutdown_server()
     return jsonify({"status": "stopping"})
 
 
+def _accepted_encoding(available) -> str | None:
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = request.accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def send_asset(filename: str):
+    """
+    Serve a file from ``static/``. Files from ``python src/assets.py build``
+    come precompressed when the client accepts it, hashed names are cached
+    for a year, and everything else must be revalidated (ETag / 304).
+    Unhashed names come from ``static/`` itself in debug mode, and when the
+    source file has been edited since the last build.
+    """
+    asset = assets.lookup(filename)
+    if asset is not None and not asset.immutable and _serve_source(filename):
+        asset = None
+    if asset is None:
+        response = send_from_directory(STATIC_DIR, filename)
+        response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        return response
+
+    encoding = _accepted_encoding(asset.encodings)
+    response = send_file(
+        stored_path(ASSET_BUILD_DIR, asset, encoding),
+        mimetype=mimetypes.guess_type(asset.logical)[0] or "application/octet-stream",
+        etag=f"{asset.sha256[:20]}-{encoding or 'identity'}",
+        conditional=True,
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if asset.encodings:
+        response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = (
+        IMMUTABLE_CACHE_CONTROL if asset.immutable else REVALIDATE_CACHE_CONTROL
+    )
+    return response
+
+
+def _serve_source(filename: str) -> bool:
+    if app.debug:
+        return True
+    if not assets.source_is_newer(filename, STATIC_DIR):
+        return False
+    if filename not in _stale_assets:
+        _stale_assets.add(filename)
+        app.logger.warning(
+            "static/%s er endret etter siste bygg; kjør python src/assets.py build", filename
+        )
+    return True
+
+
+_stale_assets: set = set()
+
+
+def _accepts_webp() -> bool:
+    # */* teller ikke: nettlesere som støtter WebP, sier det eksplisitt.
+    return any(
+        value == "image/webp" and quality > 0
+        for value, quality in request.accept_mimetypes
+    )
+
+
+def send_map_image(relative: str):
+    """
+    Serve ``static/maps/<relative>`` as the smallest variant from
+    ``python src/images.py build`` that is at least ``?w=`` pixels wide
+    (full size without ``w``), in WebP when the browser accepts it.
+    """
+    record = map_images.lookup(relative)
+    width = request.args.get("w", type=int)
+    variant = None
+    if record is not None:
+        variant = pick_variant(record, width if width and width > 0 else None, _accepts_webp())
+    if variant is None:
+        response = send_asset(f"maps/{relative}")
+        if record is not None and record["variants"]:
+            response.vary.add("Accept")
+        return response
+
+    response = send_file(
+        IMAGE_BUILD_DIR / variant["file"],
+        mimetype=f"image/{variant['format']}",
+        etag=Path(variant["file"]).name,
+        conditional=True,
+    )
+    response.vary.add("Accept")
+    response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+    return response
+
+
+@app.get("/static/map-variants/<path:filename>")
+def map_variant(filename: str):
+    # Variantnavnene har kildens hash i seg og endres aldri.
+    response = send_from_directory(IMAGE_BUILD_DIR, filename)
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+@app.get("/static/<path:filename>", endpoint="static")
+def static_file(filename: str):
+    if filename.startswith("maps/"):
+        return send_map_image(filename[len("maps/") :])
+    return send_asset(filename)
+
+
 @app.get("/")
 def main_screen():
-    return send_from_directory(STATIC_DIR, "main.html")
+    return send_asset("main.html")
 
 
 @app.get("/main")
 def main_alias():
-    return send_from_directory(STATIC_DIR, "main.html")
+    return send_asset("main.html")
 
 
 @app.get("/pinpoint")
 def pinpoint_page():
-    return send_from_directory(STATIC_DIR, "pinpoint.html")
+    return send_asset("pinpoint.html")
 
 
 @app.get("/quiz")
 def quiz_page():
-    return send_from_directory(STATIC_DIR, "quiz.html")
+    return send_asset("quiz.html")
 
 @app.get("/lookup")
 def lookup_page():
     # Nå vil http://127.0.0.1:5050/lookup vise lookup.html
-    return send_from_directory(STATIC_DIR, "lookup.html")
+    return send_asset("lookup.html")
 
 @app.get("/stats")
 def stats_page():
-    return send_from_directory(STATIC_DIR, "stats.html")
+    return send_asset("stats.html")
 
 @app.get("/sw.js")
 def service_worker():
@@ -300,10 +756,12 @@ def service_worker():
 
 @app.errorhandler(404)
 def not_found(e):
-    return send_from_directory(STATIC_DIR, "main.html")
+    return send_asset("main.html")
 
 
 def main():
+    warmup()
+    start_background()
     app.run(debug=True, port=5000)
 
 
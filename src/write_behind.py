@@ -0,0 +1,107 @@
+"""Batched background writes, so request handlers never wait for the disk."""
+
+from __future__ import annotations
+
+import atexit
+import itertools
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+log = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """
+    Collect items in memory and hand them to ``flush`` in batches.
+
+    A background thread calls ``flush(items)`` every ``interval`` seconds,
+    or as soon as ``max_batch`` items are pending. Items put with a ``key``
+    replace any pending item with the same key, so only the latest state
+    of a record is written. Pending items are also flushed at interpreter
+    exit. If ``flush`` raises, the batch is kept and retried next time
+    (unless newer items with the same keys arrived meanwhile). ``tick``, if
+    given, runs on the writer thread after every round, for housekeeping
+    that should stay off the request path.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], None],
+        interval: float = 1.0,
+        max_batch: int = 1000,
+        name: str = "write-behind",
+        tick: Optional[Callable[[], None]] = None,
+    ):
+        self._flush = flush
+        self._tick = tick
+        self.interval = interval
+        self.max_batch = max_batch
+        self.name = name
+        self._pending: Dict[Hashable, Any] = {}
+        self._serial = itertools.count()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer_pid: Optional[int] = None
+        atexit.register(self.flush_now)
+
+    def put(self, item: Any, key: Optional[Hashable] = None) -> None:
+        self._ensure_writer()
+        with self._lock:
+            self._pending[key if key is not None else ("#", next(self._serial))] = item
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def pending_keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._pending)
+
+    def flush_now(self) -> int:
+        """Write everything pending on the calling thread. Returns the count."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self._flush(list(batch.values()))
+            except Exception:
+                log.exception("%s: kunne ikke skrive %d elementer", self.name, len(batch))
+                with self._lock:
+                    for key, item in batch.items():
+                        self._pending.setdefault(key, item)
+                return 0
+            return len(batch)
+
+    def start(self) -> None:
+        """Start the writer thread now instead of at the first ``put``."""
+        self._ensure_writer()
+
+    def _ensure_writer(self) -> None:
+        # Tråder overlever ikke fork, så hver prosess starter sin egen skriver.
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+            # det en forelder hadde liggende, er forelderens ansvar
+            self._pending = {}
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush_now()
+            if self._tick is not None:
+                try:
+                    self._tick()
+                except Exception:
+                    log.exception("%s: feil i tick", self.name)
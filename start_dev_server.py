@@ -54,6 +54,10 @@ def main():
 
     app_module = import_module("src.webapp")
     flask_app = getattr(app_module, "app")
+    # lokal utvikling: X-Profile: 1 eller ?profile=1 profilerer én forespørsel
+    flask_app.config["PROFILING"] = True
+    getattr(app_module, "warmup")()
+    getattr(app_module, "start_background")()
 
     # 👇 demp request-logging ("GET /... 200 -")
     import logging
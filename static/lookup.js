@@ -19,6 +19,7 @@ const datasetPickerEl = document.getElementById("dataset-picker");
 const datasetSelectEl = document.getElementById("lookup-dataset-select");
 const form = document.getElementById("lookup-form");
 const codeInput = document.getElementById("lookup-code");
+const suggestionList = document.getElementById("lookup-suggestions");
 const statusEl = document.getElementById("lookup-status");
 const resultCard = document.getElementById("result");
 const resultTitle = document.getElementById("result-title");
@@ -35,6 +36,8 @@ const state = {
   datasetSelections: {},
   selectedDataset: "Russia",
   shutdownArmed: false,
+  suggestTimer: null,
+  suggestRequest: 0,
 };
 
 init();
@@ -156,6 +159,37 @@ form.addEventListener("submit", async (event) => {
   }
 });
 
+codeInput.addEventListener("input", () => {
+  clearTimeout(state.suggestTimer);
+  state.suggestTimer = setTimeout(loadSuggestions, 120);
+});
+
+async function loadSuggestions() {
+  const query = codeInput.value.trim();
+  const requestId = ++state.suggestRequest;
+  if (!query || !state.selectedDataset) {
+    suggestionList.innerHTML = "";
+    return;
+  }
+  const params = new URLSearchParams({ country: state.selectedDataset, q: query });
+  try {
+    const res = await fetch(`/api/suggest?${params.toString()}`);
+    if (!res.ok || requestId !== state.suggestRequest) return;
+    const data = await res.json();
+    if (requestId !== state.suggestRequest) return;
+    suggestionList.innerHTML = "";
+    for (const item of data.suggestions || []) {
+      const option = document.createElement("option");
+      option.value = item.code || "";
+      const place = item.name || item.regions.join(", ") || item.primary_cities.join(", ");
+      option.label = place ? `${item.code} – ${place}` : item.code;
+      suggestionList.appendChild(option);
+    }
+  } catch (error) {
+    console.warn("[lookup-suggest] Klarte ikke å hente forslag", error);
+  }
+}
+
 function renderResult(data) {
   statusEl.textContent = "Fant koden!";
   const prefix = data.country_code ? `${data.country_code} ` : "";
@@ -164,7 +198,7 @@ function renderResult(data) {
   resultCities.textContent = data.primary_cities.join(", ") || "Ingen info";
   resultNotes.textContent = data.notes || "Ingen notat.";
   resultDifficulty.textContent = data.difficulty || "Ukjent";
-  renderResultImages(data.images, data.regions);
+  renderResultImages(data.region_images || []);
   resultCard.classList.remove("hidden");
 }
 
@@ -328,142 +362,60 @@ function flagForGroup(group) {
   return renderFlag(label, group?.key);
 }
 
-function renderResultImages(images = [], regions = []) {
+// Serveren har allerede funnet bildene (region_images): én forespørsel per bilde.
+const RESULT_IMAGE_SIZES = "220px";
+
+function renderResultImages(images = []) {
   if (!resultImages) return;
   clearResultImages();
-
-  const candidates = gatherImageCandidates(images, regions);
-  if (!candidates.length) {
+  if (!images.length) {
     return;
   }
 
   const fragment = document.createDocumentFragment();
-  candidates.forEach((file, index) => {
-    const sources = buildImageSources(file);
-    if (!sources.length) {
-      return;
-    }
-    const img = document.createElement("img");
-    img.className = "result-images__img";
-    img.alt = regions[index] || regions[0] || "Region";
-    appendImageWithFallback(img, sources);
-    fragment.appendChild(img);
+  images.forEach((image) => {
+    fragment.appendChild(createResultImage(image));
   });
-
   resultImages.appendChild(fragment);
-  if (resultImages.children.length) {
-    resultImages.style.display = "flex";
-  }
+  resultImages.style.display = "flex";
 }
 
 function clearResultImages() {
   if (!resultImages) return;
-  resultImages.querySelectorAll("img").forEach((img) => {
-    img.dataset.cancelled = "true";
-  });
   resultImages.innerHTML = "";
   resultImages.style.display = "none";
 }
 
-function gatherImageCandidates(images, regions) {
-  const explicit = (images || [])
-    .map((name) => name && name.trim())
-    .filter(Boolean);
-  if (explicit.length) {
-    return Array.from(new Set(explicit));
+function createResultImage(image) {
+  const img = document.createElement("img");
+  img.className = "result-images__img";
+  img.alt = image.alt || "Region";
+  img.decoding = "async";
+  if (image.width && image.height) {
+    img.width = image.width;
+    img.height = image.height;
   }
-  return Array.from(
-    new Set(
-      (regions || [])
-        .map(regionNameToImage)
-        .filter(Boolean)
-    )
-  );
-}
-
-function regionNameToImage(regionName) {
-  if (!regionName) return "";
-  const slug = regionName
-    .toLowerCase()
-    .replace(/[()\s,.'-]+/g, "_")
-    .replace(/_+/g, "_")
-    .replace(/^_+|_+$/g, "");
-  return slug ? `${slug}.png` : "";
-}
-
-function buildImageSources(file) {
-  if (!file) return [];
-  const trimmed = file.trim();
-  if (!trimmed) return [];
-  if (/^https?:\/\//i.test(trimmed) || trimmed.startsWith("/")) {
-    return [trimmed];
-  }
-  const hasExtension = /\.[a-z0-9]{2,4}$/i.test(trimmed);
-  const filename = hasExtension ? trimmed : `${trimmed}.png`;
-  const sources = [];
-  const datasetFolder = state.selectedDataset;
-  const baseFolder = getCurrentGroup()?.key;
-
-  const pushFolder = (folder) => {
-    if (!folder) return;
-    sources.push(`/static/maps/${folder}/${filename}`);
-  };
-
-  pushFolder(datasetFolder);
-  if (baseFolder && baseFolder !== datasetFolder) {
-    pushFolder(baseFolder);
+  if (image.srcset) {
+    img.srcset = image.srcset;
+    img.sizes = RESULT_IMAGE_SIZES;
   }
-
-  return Array.from(new Set(sources));
-}
-
-function appendImageWithFallback(img, sources) {
-  const candidates = Array.from(new Set(sources.filter(Boolean)));
-  if (!candidates.length) return;
-
-  img.dataset.cancelled = "false";
-  let index = 0;
-  const debugLabel = img.alt || "ukjent region";
-  const tryNext = () => {
-    if (img.dataset.cancelled === "true") {
-      return;
-    }
-    if (index >= candidates.length) {
-      console.warn(
-        "[lookup-images] Finner ingen fungerende bilde-URL for",
-        debugLabel,
-        candidates
-      );
-      img.remove();
-      if (resultImages && !resultImages.children.length) {
-        resultImages.style.display = "none";
-      }
-      return;
-    }
-    const nextSrc = candidates[index];
-    index += 1;
-    if (nextSrc) {
-      img.src = nextSrc;
-    } else {
-      tryNext();
-    }
-  };
-
-  img.addEventListener(
-    "load",
-    () => {
-      if (img.dataset.cancelled === "true") return;
-      if (resultImages) {
-        resultImages.style.display = "flex";
-      }
-      console.info("[lookup-images] Lastet bilde for", debugLabel, img.src);
-    },
-    { once: true }
-  );
+  img.src = image.url;
   img.addEventListener("error", () => {
-    if (img.dataset.cancelled === "true") return;
-    tryNext();
+    console.warn("[lookup-images] Klarte ikke å laste", image.url);
+    (img.parentElement?.tagName === "PICTURE" ? img.parentElement : img).remove();
+    if (resultImages && !resultImages.children.length) {
+      resultImages.style.display = "none";
+    }
   });
 
-  tryNext();
+  if (!image.webp_srcset) {
+    return img;
+  }
+  const picture = document.createElement("picture");
+  const source = document.createElement("source");
+  source.type = "image/webp";
+  source.srcset = image.webp_srcset;
+  source.sizes = RESULT_IMAGE_SIZES;
+  picture.append(source, img);
+  return picture;
 }
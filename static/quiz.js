@@ -52,8 +52,26 @@ const state = {
   practiceRegionGroup: "",
 };
 
+const learnerId = resolveLearnerId();
+
 init();
 
+// Repetisjonsplanen ligger på serveren. Åpne /quiz?learner=<id> på en annen
+// enhet for å fortsette med samme plan.
+function resolveLearnerId() {
+  const fromUrl = new URLSearchParams(window.location.search).get("learner");
+  try {
+    const id =
+      fromUrl ||
+      localStorage.getItem("quizLearner") ||
+      (crypto.randomUUID ? crypto.randomUUID() : `l${Date.now()}${Math.random()}`.replace(".", ""));
+    localStorage.setItem("quizLearner", id);
+    return id;
+  } catch (e) {
+    return fromUrl || "";
+  }
+}
+
 function getFlagPath(label, fallback) {
   const normalized = label?.replace(/\s*\(.*\)$/, "");
   return (
@@ -240,6 +258,9 @@ async function fetchQuestion() {
 
   try {
     const params = new URLSearchParams({ country: state.country });
+    if (learnerId) {
+      params.set("learner", learnerId);
+    }
     if (state.practiceMode && !practiceToggleEl.disabled) {
       if (state.practiceDifficulty) {
         params.set("difficulty", state.practiceDifficulty);
@@ -316,6 +337,7 @@ async function submitGuess(guess) {
         country: state.country,
         code: state.question.dial_code,
         guess,
+        learner: learnerId || undefined,
       }),
     });
     if (!res.ok) throw new Error("Validering feilet");
@@ -352,10 +374,11 @@ async function submitGuess(guess) {
       lines.push("Notat: " + result.notes);
     }
     notesEl.textContent = lines.join("\n");
-    showRegionImages({
-      regions: result.regions,
-      images: result.images && result.images.length ? result.images : state.question?.images,
-    });
+    showRegionImages(
+      result.region_images && result.region_images.length
+        ? result.region_images
+        : state.question?.region_images || []
+    );
 
     inputEl.disabled = true;
     skipBtn.disabled = true;
@@ -610,146 +633,62 @@ function capitalize(word) {
   return word ? word.charAt(0).toUpperCase() + word.slice(1) : "";
 }
 
-function regionNameToImage(regionName) {
-  if (!regionName) return "";
-  const slug = regionName
-    .toLowerCase()
-    .replace(/[()\s,.'-]+/g, "_")
-    .replace(/_+/g, "_")
-    .replace(/^_+|_+$/g, "");
-  return slug ? `${slug}.png` : "";
-}
-
-function normalizeImageName(name) {
-  if (!name) return "";
-  return name.trim();
-}
-
-function buildImageSources(file) {
-  if (!file) return [];
-  const trimmed = file.trim();
-  if (!trimmed) return [];
-  if (/^https?:\/\//i.test(trimmed) || trimmed.startsWith("/")) {
-    return [trimmed];
-  }
-
-  const hasExtension = /\.[a-z0-9]{2,4}$/i.test(trimmed);
-  const filename = hasExtension ? trimmed : `${trimmed}.png`;
-
-  const sources = [];
-  const datasetFolder = state.country;
-  const baseFolder = getCurrentGroup()?.key;
-
-  const pushFolder = (folder) => {
-    if (!folder) return;
-    sources.push(`/static/maps/${folder}/${filename}`);
-  };
-
-  pushFolder(datasetFolder);
-  if (baseFolder && baseFolder !== datasetFolder) {
-    pushFolder(baseFolder);
-  }
-
-  return Array.from(new Set(sources));
-}
-
-function gatherImageCandidates(images, regions) {
-  const explicit = (images || [])
-    .map(normalizeImageName)
-    .filter(Boolean);
-  if (explicit.length) {
-    return Array.from(new Set(explicit));
-  }
-  const fromRegions = (regions || [])
-    .map(regionNameToImage)
-    .filter(Boolean);
-  return Array.from(new Set(fromRegions));
-}
+// Serveren har allerede funnet bildene (region_images): én forespørsel per bilde.
+const REGION_IMAGE_SIZES = "240px";
 
 function clearRegionGallery() {
   if (!regionGallery) return;
-  regionGallery.querySelectorAll("img").forEach((img) => {
-    img.dataset.cancelled = "true";
-  });
   regionGallery.innerHTML = "";
   regionGallery.style.display = "none";
 }
 
-function showRegionImages({ regions = [], images = [] } = {}) {
+function showRegionImages(images = []) {
   if (!regionGallery) return;
   clearRegionGallery();
-
-  const candidates = gatherImageCandidates(images, regions);
-  if (!candidates.length) {
+  if (!images.length) {
     return;
   }
 
   const fragment = document.createDocumentFragment();
-  candidates.forEach((file, index) => {
-    const sources = buildImageSources(file);
-    if (!sources.length) {
-      return;
-    }
-    const img = document.createElement("img");
-    img.className = "region-gallery__img";
-    img.alt = regions[index] || regions[0] || "Region";
-    appendImageWithFallback(img, sources);
-    fragment.appendChild(img);
+  images.forEach((image) => {
+    fragment.appendChild(createRegionImage(image));
   });
-
   regionGallery.appendChild(fragment);
-  if (regionGallery.children.length) {
-    regionGallery.style.display = "flex";
-  }
+  regionGallery.style.display = "flex";
 }
 
-function appendImageWithFallback(img, sources) {
-  const candidates = Array.from(new Set(sources.filter(Boolean)));
-  if (!candidates.length) return;
-
-  img.dataset.cancelled = "false";
-  let index = 0;
-  const debugLabel = img.alt || "ukjent region";
-  const tryNext = () => {
-    if (img.dataset.cancelled === "true") {
-      return;
-    }
-    if (index >= candidates.length) {
-      console.warn(
-        "[quiz-images] Finner ingen fungerende bilde-URL for",
-        debugLabel,
-        candidates
-      );
-      img.remove();
-      if (!regionGallery.children.length) {
-        regionGallery.style.display = "none";
-      }
-      return;
-    }
-    const nextSrc = candidates[index];
-    index += 1;
-    if (nextSrc) {
-      img.src = nextSrc;
-    } else {
-      tryNext();
-    }
-  };
-
-  img.addEventListener(
-    "load",
-    () => {
-      if (img.dataset.cancelled === "true") return;
-      regionGallery.style.display = "flex";
-      console.info("[quiz-images] Lastet bilde for", debugLabel, img.src);
-    },
-    { once: true }
-  );
+function createRegionImage(image) {
+  const img = document.createElement("img");
+  img.className = "region-gallery__img";
+  img.alt = image.alt || "Region";
+  img.decoding = "async";
+  if (image.width && image.height) {
+    img.width = image.width;
+    img.height = image.height;
+  }
+  if (image.srcset) {
+    img.srcset = image.srcset;
+    img.sizes = REGION_IMAGE_SIZES;
+  }
+  img.src = image.url;
   img.addEventListener("error", () => {
-    if (img.dataset.cancelled === "true") return;
-    tryNext();
+    console.warn("[quiz-images] Klarte ikke å laste", image.url);
+    (img.parentElement?.tagName === "PICTURE" ? img.parentElement : img).remove();
+    if (!regionGallery.children.length) {
+      regionGallery.style.display = "none";
+    }
   });
 
-  tryNext();
+  if (!image.webp_srcset) {
+    return img;
+  }
+  const picture = document.createElement("picture");
+  const source = document.createElement("source");
+  source.type = "image/webp";
+  source.srcset = image.webp_srcset;
+  source.sizes = REGION_IMAGE_SIZES;
+  picture.append(source, img);
+  return picture;
 }
 
 registerServiceWorker();
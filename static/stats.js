@@ -26,6 +26,47 @@ function loadStats() {
   }
 }
 
+// Serveren teller svarene fra svarloggen, så tallene følger learner-id-en
+// på tvers av enheter. Uten server brukes det som ligger i nettleseren.
+async function fetchServerStats(windowName) {
+  let learner = "";
+  try {
+    learner = localStorage.getItem("quizLearner") || "";
+  } catch (e) {
+    return null;
+  }
+  if (!learner) return null;
+
+  const params = new URLSearchParams({ learner });
+  if (windowName) params.set("window", windowName);
+  try {
+    const res = await fetch(`/api/stats?${params}`);
+    if (!res.ok) return null;
+    return await res.json();
+  } catch (e) {
+    return null;
+  }
+}
+
+// Samme form som quizStats i localStorage: { global, <land>: {...} }
+function fromServerStats(data) {
+  const stats = {
+    global: {
+      asked: data.global.asked,
+      correct: data.global.correct,
+      bestStreak: data.global.best_streak,
+    },
+  };
+  data.countries.forEach((country) => {
+    stats[country.country] = {
+      asked: country.asked,
+      correct: country.correct,
+      bestStreak: country.best_streak,
+    };
+  });
+  return stats;
+}
+
 function getFlagPath(label) {
   const normalized = label?.replace(/\s*\(.*\)$/, "");
   return FLAG_PATHS[label] || FLAG_PATHS[normalized] || null;
@@ -55,7 +96,23 @@ function renderGlobal(stats) {
     `${g.correct || 0} / ${g.asked || 0}`;
 
   document.getElementById("stat-global-streak").textContent =
-    g.bestStreak || 0;
+    g.bestStreak ?? "–";
+}
+
+function renderHardest(hardest) {
+  const titleEl = document.getElementById("stat-hardest-title");
+  const listEl = document.getElementById("stat-hardest-list");
+  listEl.innerHTML = "";
+  titleEl.hidden = listEl.hidden = !hardest || hardest.length === 0;
+  (hardest || []).forEach((item) => {
+    const li = document.createElement("li");
+    li.innerHTML = `
+      ${flagHTML(item.country)}
+      <strong>${item.code}</strong> (${item.country}):
+      ${item.correct} / ${item.asked} riktige
+    `;
+    listEl.appendChild(li);
+  });
 }
 
 function renderCountries(stats) {
@@ -69,7 +126,7 @@ function renderCountries(stats) {
       const data = stats[countryName];
       const asked = data.asked || 0;
       const correct = data.correct || 0;
-      const bestStreak = data.bestStreak || 0;
+      const bestStreak = data.bestStreak ?? "–";
       const flag = flagHTML(countryName);
 
       const item = document.createElement("div");
@@ -97,8 +154,17 @@ function renderCountries(stats) {
     });
 }
 
-(function init() {
-  const stats = loadStats();
+async function render(windowName) {
+  const data = await fetchServerStats(windowName);
+  const useServer = data && (data.global.asked > 0 || windowName);
+  const stats = useServer ? fromServerStats(data) : loadStats();
   renderGlobal(stats);
   renderCountries(stats);
+  renderHardest(useServer ? data.hardest : []);
+}
+
+(function init() {
+  const select = document.getElementById("stat-window");
+  select.addEventListener("change", () => render(select.value));
+  render(select.value);
 })();
@@ -1,4 +1,4 @@
-const CACHE_NAME = "telefonkoder-v5";
+const CACHE_NAME = "telefonkoder-v8";
 const APP_SHELL = [
   "/",
   "/main",
@@ -30,6 +30,9 @@ self.addEventListener("install", (event) => {
   );
 });
 
+// Filer fra `python src/assets.py build` har innholdshash i navnet og endres aldri.
+const HASHED_ASSET = /\/static\/.+\.[0-9a-f]{10}(\.w\d+)?\.[a-z0-9]+$/;
+
 const isSameOrigin = (request) => new URL(request.url).origin === self.location.origin;
 
 const networkFirst = (request) => {
@@ -86,8 +89,9 @@ self.addEventListener("fetch", (event) => {
   const assetDestinations = ["script", "style", "worker"];
   const isCriticalAsset = assetDestinations.includes(request.destination);
   const isMapAsset = request.url.includes("/static/maps/");
+  const isHashedAsset = HASHED_ASSET.test(new URL(request.url).pathname);
 
-  if (isHTMLRequest || isCriticalAsset || isMapAsset) {
+  if (!isHashedAsset && (isHTMLRequest || isCriticalAsset || isMapAsset)) {
     event.respondWith(networkFirst(request));
     return;
   }
@@ -0,0 +1,10 @@
+"""Make the flat ``src/`` modules importable, the way start_dev_server.py does."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+SRC_ROOT = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_ROOT) not in sys.path:
+    sys.path.insert(0, str(SRC_ROOT))
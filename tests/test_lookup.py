@@ -0,0 +1,124 @@
+"""
+Differential test for the shared lookup engine.
+
+For every non-empty file in ``Telefonnummer/`` the same queries go through
+``search.lookup_code``, ``webapp._resolve_entry`` and a reference built the
+old way (one dict key per expanded value), and all three must agree. The
+queries are every code and key in the dataset plus seeded random codes,
+numbers and ranges.
+
+    python -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import random
+from typing import Dict, Iterable, List
+
+import pytest
+
+from code_index import pick_or_merge
+from code_utils import expand_search_keys
+from loader import available_countries
+import search
+import webapp
+
+RANDOM_QUERIES = 3_000
+SEED = 1234
+DATASETS = [info["filename"] for info in available_countries() if info["count"]]
+
+
+def reference_index(entries: Iterable[dict]) -> Dict[str, List[dict]]:
+    index: Dict[str, List[dict]] = {}
+    for entry in entries:
+        codes = entry["_codes"]
+        for code in codes:
+            index.setdefault(code, []).append(entry)
+        for key in expand_search_keys(codes):
+            index.setdefault(key, []).append(entry)
+    return index
+
+
+def reference_resolve(index: Dict[str, List[dict]], raw_code: str):
+    if not raw_code:
+        return None, None
+    if index.get(raw_code):
+        return raw_code, pick_or_merge(index[raw_code])
+    candidate_keys = list(expand_search_keys([raw_code]))
+    digits_only = "".join(ch for ch in raw_code if ch.isdigit())
+    if digits_only and digits_only not in candidate_keys:
+        candidate_keys.append(digits_only)
+    for key in candidate_keys:
+        if index.get(key):
+            return key, pick_or_merge(index[key])
+    return digits_only or raw_code, None
+
+
+def dataset_queries(entries: List[dict], country_code: str) -> List[str]:
+    queries = set()
+    for entry in entries:
+        for code in entry["_codes"]:
+            queries.add(code)
+            queries.add(f"{country_code} {code}".strip())
+        for key in expand_search_keys(entry["_codes"]):
+            queries.add(key)
+            queries.add(f"R{key}")
+    for value in range(1000):
+        for width in range(1, 5):
+            queries.add(str(value).zfill(width))
+    queries.update({"", "abc", "+", "R300-R305", "350–369", "99999999"})
+    return sorted(queries)
+
+
+def random_queries(rng: random.Random) -> List[str]:
+    queries = []
+    for index in range(RANDOM_QUERIES):
+        width = rng.randint(1, 5)
+        start = rng.randrange(10 ** width)
+        if index % 3 == 0:
+            queries.append(str(start).zfill(width))
+        elif index % 3 == 1:
+            queries.append(str(start).zfill(width) + str(rng.randrange(10 ** 4)))
+        else:
+            # referansen utvider hele intervallet, så hold bredden nede
+            width = min(width, 4)
+            start, end = rng.randrange(10 ** width), rng.randrange(10 ** width)
+            queries.append(f"{str(start).zfill(rng.randint(1, width))}-{str(end).zfill(width)}")
+    return queries
+
+
+def _public(entry):
+    """Drop derived ``_`` fields; the two bundles build their own copies."""
+    if entry is None:
+        return None
+    return {key: value for key, value in entry.items() if not key.startswith("_")}
+
+
+def assert_same(filename: str, queries: Iterable[str]) -> None:
+    web_bundle = webapp.get_country_bundle(filename)
+    cli_bundle = search.load_bundle(filename)
+    index = reference_index(web_bundle["entries"])
+    for query in queries:
+        key, entry = reference_resolve(index, query)
+        expected = (key, _public(entry))
+        web_key, web_entry = webapp._resolve_entry(web_bundle, query)
+        assert (web_key, _public(web_entry)) == expected, query
+        assert _public(search.lookup_code(query, cli_bundle)) == expected[1], query
+
+
+@pytest.mark.parametrize("filename", DATASETS)
+def test_dataset_codes_match_reference(filename):
+    bundle = webapp.get_country_bundle(filename)
+    assert_same(filename, dataset_queries(bundle["entries"], bundle["metadata"]["country_code"]))
+
+
+@pytest.mark.parametrize("filename", DATASETS)
+def test_random_codes_match_reference(filename):
+    assert_same(filename, random_queries(random.Random(f"{SEED}-{filename}")))
+
+
+@pytest.mark.parametrize("filename", DATASETS)
+def test_range_keys_only_yield_hits(filename):
+    index = webapp.get_country_bundle(filename)["by_code"]
+    keys = list(index.range_keys(8, 0, 99_999_999)) + list(index.range_keys(3, 0, 999))
+    assert all(index.positions(key) for key in keys)
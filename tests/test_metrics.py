@@ -0,0 +1,40 @@
+"""Request metrics from ``webapp``'s hooks, read back from ``metrics.REGISTRY``."""
+
+from __future__ import annotations
+
+import threading
+
+from metrics import REGISTRY, Registry
+import webapp
+
+
+def _value(name, labels):
+    return REGISTRY.snapshot().get((name, labels), 0)
+
+
+def test_streamed_batch_is_counted_once():
+    in_flight = ("geo_http_requests_in_flight", ("api_lookup_batch",))
+    total = ("geo_http_requests_total", ("api_lookup_batch", "200"))
+    before = _value(*in_flight), _value(*total)
+
+    response = webapp.app.test_client().post(
+        "/api/lookup/batch", json={"country": "Russia", "codes": ["811", "812"]}
+    )
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).splitlines()) == 2
+
+    assert _value(*in_flight) - before[0] == 0
+    assert _value(*total) - before[1] == 1
+
+
+def test_finished_threads_are_folded_without_a_scrape():
+    registry = Registry()
+    for _ in range(200):
+        thread = threading.Thread(
+            target=registry.inc, args=("geo_bundle_requests_total", ("hit",))
+        )
+        thread.start()
+        thread.join()
+
+    assert len(registry._shards) <= 1
+    assert registry.snapshot()[("geo_bundle_requests_total", ("hit",))] == 200
@@ -0,0 +1,31 @@
+"""Reviews from several ``serve.py`` workers, simulated as schedulers on one database."""
+
+from __future__ import annotations
+
+from scheduler import Scheduler
+
+
+def _stored(path, code):
+    return Scheduler(path)._read_deck("ola", "Russia").cards[code]
+
+
+def test_reviews_from_two_workers_are_all_applied(tmp_path):
+    path = tmp_path / "scheduler.sqlite3"
+    first, second = Scheduler(path), Scheduler(path)
+
+    # begge har kortstokken lastet før noen av dem har skrevet
+    assert first.next_due("ola", "Russia", now=0) is None
+    assert second.next_due("ola", "Russia", now=0) is None
+    first.record("ola", "Russia", "812", 5, now=10)
+    second.record("ola", "Russia", "812", 5, now=20)
+    first.flush()
+    second.flush()
+
+    card = _stored(path, "812")
+    assert (card.repetitions, card.updated) == (2, 20)
+
+    # den bufrede kopien i første arbeider tar inn den lagrede før neste svar
+    first.record("ola", "Russia", "812", 1, now=30)
+    first.flush()
+    card = _stored(path, "812")
+    assert (card.repetitions, card.lapses, card.updated) == (0, 1, 30)